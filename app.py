@@ -1,28 +1,67 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response
-import pyodbc
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, g, has_request_context
 import base64
 from functools import wraps
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from werkzeug.utils import secure_filename
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import re
 import secrets
 from flask_cors import CORS
-from bs4 import BeautifulSoup
 import time
 
 from dotenv import load_dotenv
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = 'clave_super_secreta_1234'
+from db import (get_pool, conexion_bd, obtener_conexion, solo_lectura, marcar_replica_caida,
+                estadisticas_pools, en_paralelo, VENTANA_LEE_TUS_ESCRITURAS, ERRORES_BD)
+from repositorio import (Repositorio, PaqueteRepo, TableroRepo, filtro_paquetes,
+                         codificar_cursor, decodificar_cursor)
+from busqueda import asegurar_indice_paquetes, indice_paquetes, directorio_empleados
+from recuerdame import Recuerdame, NOMBRE_COOKIE
+from plantillas import RenderizadorPaginas, seccion_de
+from estaticos import ManifiestoEstaticos
+from compresion import CompresorRespuestas
+from imagenes import (generar_variantes, borrar_variantes, renombrar_variantes,
+                      nombre_variante, DENSIDADES, ManifiestoImagenes, BarredorHuerfanas,
+                      POR_DEFECTO)
+from correo import BuzonSalida
+from versiones import depende_de, calcular_etag, huella_archivos, VersionesObservadas
+from instrumentacion import (iniciar_registro, terminar_registro, presupuesto_consultas,
+                             PresupuestoExcedido, guardar_resumen, resumenes_recientes,
+                             registrar_consultas)
 
-# Configuración para desarrollo - deshabilitar cache
-app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
-app.config['TEMPLATES_AUTO_RELOAD'] = True
+app = Flask(__name__)
+# Firma la sesión y los tokens de "recuérdame": solo del entorno. Sin ella la
+# sesión usa una clave al azar del proceso (se pierde al reiniciar) y
+# "recuérdame" queda deshabilitado
+SECRET_KEY = os.environ.get('SECRET_KEY', '')
+if SECRET_KEY:
+    app.secret_key = SECRET_KEY
+else:
+    app.secret_key = secrets.token_hex(32)
+    print("SECRET_KEY no configurada: sesiones con clave temporal y 'recuérdame' deshabilitado")
+
+# En desarrollo (MODO_DESARROLLO=1) las plantillas se recargan al editarlas.
+# Los estáticos llevan huella de contenido y caché larga (estaticos.py)
+MODO_DESARROLLO = os.environ.get('MODO_DESARROLLO', '').lower() in ('1', 'true', 'si', 'sí')
+app.config['TEMPLATES_AUTO_RELOAD'] = MODO_DESARROLLO
+
+estaticos = ManifiestoEstaticos(app.static_folder).cargar()
+app.view_functions['static'] = estaticos.respuesta
+
+@app.url_defaults
+def url_estatico_con_huella(endpoint, values):
+    """url_for('static', filename=...) apunta a la versión con huella del archivo"""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = estaticos.url(values['filename'])
+
+# Compresión gzip/brotli de HTML y JSON (compresion.py). Flask ejecuta los
+# after_request en orden inverso al de registro: este, el primero, corre
+# último, sobre la respuesta ya terminada
+compresion = CompresorRespuestas()
+app.after_request(compresion.comprimir)
+# El JSON de la navegación AJAX va compacto también en modo debug
+app.json.compact = True
 
 CORS(app)  # Permite todas las solicitudes; ajusta para producción
 
@@ -47,130 +86,306 @@ def sanitize_filename(name):
     name = name.replace('/', '_').replace('\\', '_')
     return name
 
-def limpiar_imagenes_huerfanas():
-    """Elimina imágenes huérfanas que no corresponden a ningún producto activo"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT Descripcion FROM Paquete WHERE Papelera = 0')
-        descripciones_activas = {row[0] for row in cursor.fetchall()}
-        conn.close()
+# Imágenes de productos en memoria (imagenes.py): las vistas no listan la
+# carpeta y las URLs con huella de static/Paquetes salen de aquí sin stat
+imagenes_productos = ManifiestoImagenes(UPLOAD_FOLDER, lambda descripcion: f'{sanitize_filename(descripcion)}.png').cargar()
+estaticos.delegar('Paquetes/', imagenes_productos.huella)
 
-        archivos_esperados = {sanitize_filename(desc) + '.png' for desc in descripciones_activas}
-        archivos_en_carpeta = set(os.listdir(app.config['UPLOAD_FOLDER']))
-
-        for archivo in archivos_en_carpeta:
-            if archivo.endswith('.png') and archivo != 'PorDefecto.webp' and archivo not in archivos_esperados:
-                ruta_archivo = os.path.join(app.config['UPLOAD_FOLDER'], archivo)
-                try:
-                    os.remove(ruta_archivo)
-                    print(f"Imagen huérfana eliminada: {archivo}")
-                except OSError as e:
-                    print(f"Error al eliminar {archivo}: {e}")
-    except Exception as e:
-        print(f"Error en limpieza de imágenes huérfanas: {e}")
+def imagenes_esperadas():
+    """Archivos de imagen de los productos activos (para el barrido de huérfanas)"""
+    with registrar_consultas('barrido_imagenes'), conexion_bd() as conn:
+        descripciones_activas = Repositorio(conn).paquetes.descripciones_activas()
+    return {sanitize_filename(desc) + '.png' for desc in descripciones_activas}
+
+# Las imágenes huérfanas se borran en segundo plano (imagenes.py), no en cada
+# alta o edición de producto
+barredor_imagenes = BarredorHuerfanas(imagenes_productos, imagenes_esperadas)
 
 # Agregar filtro Jinja para sanitizar nombres de archivo
 app.jinja_env.filters['sanitize'] = sanitize_filename
 
+@app.template_global()
+def imagen_producto(descripcion, tamano='tarjeta'):
+    """
+    URLs para el <picture> de un producto: `src` (original), `avif`/`webp`
+    (srcset 1x/2x con las variantes que existan, ver imagenes.py),
+    `reducida` (la variante WebP del tamaño pedido, o el original), `propia`
+    (False si se usa la imagen por defecto) y `ancho`/`alto` del original.
+    Todo sale del manifiesto en memoria: no toca el disco.
+    """
+    nombre_archivo = imagenes_productos.archivo_de(descripcion)
+    original = imagenes_productos.imagen(nombre_archivo)
+    imagen = {
+        'src': url_for('static', filename=f'Paquetes/{nombre_archivo}'),
+        'propia': nombre_archivo != POR_DEFECTO,
+        'ancho': original.ancho if original else None,
+        'alto': original.alto if original else None,
+    }
+    for formato in ('avif', 'webp'):
+        srcset = []
+        for densidad, variante in zip(('1x', '2x'), DENSIDADES[tamano]):
+            relativo = nombre_variante(nombre_archivo, variante, formato)
+            if imagenes_productos.huella(relativo):
+                srcset.append(f"{url_for('static', filename=f'Paquetes/{relativo}')} {densidad}")
+        imagen[formato] = ', '.join(srcset)
+    imagen['reducida'] = imagen['webp'].split(' ', 1)[0] if imagen['webp'] else imagen['src']
+    return imagen
+
+# Páginas por bloques: AJAX recibe solo los bloques y las cargas completas
+# reutilizan el layout base.html ya renderizado (plantillas.py)
+paginas = RenderizadorPaginas(app)
+
+@app.context_processor
+def contexto_seccion():
+    return {'seccion': seccion_de(request.endpoint) if has_request_context() else ''}
+
+def render_pagina(template, **contexto):
+    """Como render_template, con el layout cacheado si la plantilla extiende base.html"""
+    return paginas.pagina(template, contexto)
+
 def is_ajax_request():
     """Detecta si la petición es AJAX desde nuestro sistema de navegación"""
     return request.headers.get('X-Custom-Ajax-Navigation') == 'true'
 
-def render_template_ajax(template, **kwargs):
+def respuesta_fragmentos(template, json_extra=None, **contexto):
+    """Respuesta JSON {content, modals} para la navegación AJAX"""
+    content, modals = paginas.fragmentos(template, contexto)
+    return jsonify({'content': content, 'modals': modals, **(json_extra or {})})
+
+def render_template_ajax(template, json_extra=None, **kwargs):
     if request.headers.get('X-Custom-Ajax-Navigation') == 'true':
-        # Devolver JSON con content y modals para AJAX
-        rendered = render_template(template, **kwargs)
-        soup = BeautifulSoup(rendered, 'html.parser')
-        content = rendered
-        modals = soup.find(attrs={'data-modals': True})
-
-        response_data = {
-            'content': content,
-            'modals': modals.prettify() if modals else ''
-        }
-        # Incluir kwargs adicionales en la respuesta JSON
-        response_data.update(kwargs)
-        response = jsonify(response_data)
-        # Agregar headers estrictos para evitar cache en respuestas AJAX
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0, private, must-revalidate'
+        # Devolver JSON con content y modals para AJAX (solo los bloques, sin base.html)
+        response = respuesta_fragmentos(template, json_extra, **kwargs)
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+    else:
+        response = make_response(paginas.pagina(template, kwargs))
+    # Las vistas con ETag (@depende_de) se revalidan con If-None-Match (ver
+    # agregar_etag); las demás no se guardan en el navegador
+    if not g.get('etag'):
+        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0, private'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
         response.headers['X-Accel-Expires'] = '0'
         response.headers['Surrogate-Control'] = 'no-store'
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        return response
-    response = make_response(render_template(template, **kwargs))
-    # Agregar headers para evitar cache en respuestas HTML también
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0, private, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    response.headers['X-Accel-Expires'] = '0'
-    response.headers['Surrogate-Control'] = 'no-store'
     return response
 
 def get_db_connection():
-    server = os.environ.get("AZURE_SQL_SERVER")
-    database = os.environ.get("AZURE_SQL_DB")
-    username = os.environ.get("AZURE_SQL_USER")
-    password = os.environ.get("AZURE_SQL_PASS")
-
-    conn_str = (
-        "DRIVER={ODBC Driver 17 for SQL Server};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "Encrypt=yes;"
-        "TrustServerCertificate=no;"
-        "Connection Timeout=30;"
-    )
+    """
+    Entrega una conexión del pool del worker. `conn.close()` la devuelve al
+    pool; si una ruta olvida cerrarla, se libera al terminar la petición.
+    También se puede usar como context manager: `with get_db_connection() as conn:`
+    """
+    if not has_request_context():
+        return obtener_conexion()
+    conn = obtener_conexion(lectura=lectura_en_replica())
+    g.setdefault('db_conexiones', []).append(conn)
+    return conn
 
-    return pyodbc.connect(conn_str)
+def lectura_en_replica():
+    """
+    Las peticiones GET a vistas marcadas con @solo_lectura leen de la réplica,
+    salvo que esta sesión haya escrito hace menos de VENTANA_LEE_TUS_ESCRITURAS
+    segundos (así ve sus propios cambios aunque la réplica vaya atrasada).
+    """
+    vista = app.view_functions.get(request.endpoint)
+    if request.method not in ('GET', 'HEAD') or not getattr(vista, 'solo_lectura', False):
+        return False
+    ultima_escritura = session.get('ultima_escritura')
+    return not ultima_escritura or time.time() - ultima_escritura > VENTANA_LEE_TUS_ESCRITURAS
+
+@app.after_request
+def recordar_escritura(response):
+    """Si la petición confirmó cambios en el primario, la sesión lee del primario un rato"""
+    if any(conn.escribio and not conn.lectura for conn in g.get('db_conexiones', [])):
+        session['ultima_escritura'] = time.time()
+    return response
 
-def verificar_sesion_recordada():
-    """Verifica si hay una cookie de sesión recordada y restaura la sesión"""
-    if 'usuario' not in session:
-        # Verificar cookie de sesión recordada
-        cookie_usuario = request.cookies.get('recuerdame_usuario')
-        cookie_tipo = request.cookies.get('recuerdame_tipo')
-        cookie_user_id = request.cookies.get('recuerdame_user_id')
-
-        if cookie_usuario and cookie_tipo and cookie_user_id:
-            # Verificar que el usuario aún existe en la base de datos
-            try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute('SELECT Id_Usuario, NUsuario, Tipo FROM Usuario WHERE NUsuario = ?', (cookie_usuario,))                
-                user_verificado = cursor.fetchone()
-                conn.close()
+@app.teardown_request
+def liberar_conexiones(exc):
+    """Devuelve al pool las conexiones que la petición dejó abiertas"""
+    for conn in g.pop('db_conexiones', []):
+        if exc is not None and get_pool().es_transitorio(exc):
+            conn.marcar_rota()
+            if conn.lectura:
+                marcar_replica_caida(exc)
+        conn.close()
+
+def indice_productos(repo=None):
+    """
+    Índice de búsqueda de productos del worker (busqueda.py). Se arma en el
+    primer uso, con la conexión de la petición si se pasa `repo`.
+    """
+    def cargar():
+        if repo is not None:
+            return repo.paquetes.para_indice()
+        with conexion_bd(lectura=True) as conn:
+            return Repositorio(conn).paquetes.para_indice()
+    return asegurar_indice_paquetes(cargar)
+
+def calentar_caches():
+    """
+    Carga el catálogo de paquetes y el índice de búsqueda antes de atender
+    peticiones, para que el primer usuario de cada worker no pague la carga.
+    """
+    try:
+        with conexion_bd(lectura=True) as conn:
+            repo = Repositorio(conn)
+            repo.paquetes.catalogo()
+            indice_productos(repo)
+    except ERRORES_BD as e:
+        print(f"No se pudieron precargar las cachés: {e}")
+
+def preparar_worker():
+    """
+    Lo llama gunicorn en cada worker recién creado (post_fork en
+    gunicorn.conf.py): con preload_app la app se importa en el master, así
+    que el pool, las cachés y los hilos de fondo se arman aquí, una vez por
+    worker y antes de la primera petición.
+    """
+    app.debug = False
+    app.config['TEMPLATES_AUTO_RELOAD'] = False
+    app.jinja_env.auto_reload = False
+    try:
+        get_pool().precalentar()
+    except ERRORES_BD as e:
+        print(f"No se pudo precalentar el pool de conexiones: {e}")
+    calentar_caches()
+    barredor_imagenes.asegurar_en_marcha()
+    buzon_correo.asegurar_en_marcha()
+
+def cerrar_worker():
+    """Al terminar un worker (reciclado o apagado): cierra sus conexiones"""
+    buzon_correo.sesion.cerrar()
+    get_pool().cerrar_todas()
+
+def cargar_usuarios_recuerdame():
+    """
+    Usuarios y tokens revocados para verificar "recuérdame" en memoria
+    (siempre del primario). Es una recarga periódica del worker: se registra
+    aparte para no contar en el presupuesto de la vista que la dispara.
+    """
+    with registrar_consultas('recuerdame'), conexion_bd() as conn:
+        repo = Repositorio(conn)
+        return repo.usuarios.para_recuerdame(), repo.usuarios.recuerdame_revocados()
+
+tokens_recuerdame = Recuerdame(SECRET_KEY, cargar_usuarios_recuerdame)
+
+# Cachés en memoria que se descartan cuando cambia la versión de su tabla
+# (p. ej. porque escribió otro worker), ver versiones.py
+versiones_observadas = VersionesObservadas()
+versiones_observadas.al_cambiar('Paquete', PaqueteRepo.invalidar_conteos, PaqueteRepo.invalidar_catalogo,
+                                TableroRepo.invalidar, indice_paquetes.vencer)
+versiones_observadas.al_cambiar('Venta', TableroRepo.invalidar)
+versiones_observadas.al_cambiar('Empleado', directorio_empleados.invalidar)
+
+_huella_plantillas = None
+
+def huella_plantillas():
+    """Un deploy o una plantilla editada (con TEMPLATES_AUTO_RELOAD) cambian los ETags"""
+    global _huella_plantillas
+    if _huella_plantillas is None or app.config.get('TEMPLATES_AUTO_RELOAD'):
+        _huella_plantillas = huella_archivos(os.path.join(app.root_path, app.template_folder), __file__)
+    return _huella_plantillas
+
+def etag_de_la_peticion():
+    """
+    ETag de una vista @depende_de para este usuario, URL y tipo de respuesta
+    (JSON o página completa), o None si no aplica. Cuesta una consulta: las
+    versiones de VersionDatos, leídas de la misma base que usará la vista.
+    """
+    vista = app.view_functions.get(request.endpoint)
+    tablas = getattr(vista, 'depende_de', None)
+    if not tablas or request.method not in ('GET', 'HEAD') or 'usuario' not in session:
+        return None
+    try:
+        with get_db_connection() as conn:
+            versiones = Repositorio(conn).versiones.todas()
+    except ERRORES_BD as e:
+        print(f"No se pudieron leer las versiones de datos: {e}")
+        return None
+    versiones_observadas.observar(versiones)
+    return calcular_etag(tablas, versiones, session.get('user_id'), session.get('tipo'), request.full_path,
+                         is_ajax_request(), date.today(), huella_plantillas())
+
+def cabeceras_revalidar(response):
+    """El navegador puede guardar la respuesta, pero la revalida en cada uso"""
+    response.set_etag(g.etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.update(('Cookie', 'X-Custom-Ajax-Navigation'))
+    return response
 
-                if user_verificado:
-                    # CORRECCIÓN: Usar los valores correctos de la BD en lugar de las cookies
-                    session['usuario'] = user_verificado[1]  # NUsuario de BD
-                    session['tipo'] = user_verificado[2]     # Tipo de BD
-                    session['user_id'] = user_verificado[0]  # Id_Usuario de BD
-                    print(f"Sesion restaurada automaticamente para usuario: {user_verificado[1]}")
-                else:
-                    # Usuario no válido, eliminar cookies
-                    print("⚠️ Cookies inválidas detectadas, eliminando...")
-                    # Las cookies se eliminarán automáticamente al expirar
-            except Exception as e:
-                print(f"Error al verificar usuario en cookies: {e}")
+def verificar_sesion_recordada():
+    """
+    Si no hay sesión pero sí un token de "recuérdame" válido, restaura la
+    sesión. El token se verifica en memoria (recuerdame.py): sin consultas
+    salvo la recarga periódica de usuarios y revocados.
+    """
+    if 'usuario' in session:
+        return
+    token = request.cookies.get(NOMBRE_COOKIE)
+    if not token:
+        return
+    usuario = tokens_recuerdame.verificar(token)
+    if usuario:
+        # Los datos vienen de la tabla Usuario, no del token
+        session['user_id'], session['usuario'], session['tipo'] = usuario
+        print(f"Sesion restaurada automaticamente para usuario: {usuario[1]}")
 
 @app.before_request
 def before_request():
     """Se ejecuta antes de cada petición para verificar sesión recordada"""
+    barredor_imagenes.asegurar_en_marcha()
+    buzon_correo.asegurar_en_marcha()
+    if request.endpoint != 'static':
+        g.registro_consultas, g.registro_token = iniciar_registro(request.endpoint or request.path)
     # Solo verificar en rutas que no sean login, logout o archivos estáticos
     if request.endpoint and not request.endpoint.startswith(('login', 'logout', 'static')):
         verificar_sesion_recordada()
+        # Si el navegador ya tiene esta versión de los datos, 304 sin ejecutar la vista
+        g.etag = etag_de_la_peticion()
+        if g.etag and request.if_none_match.contains_weak(g.etag):
+            return cabeceras_revalidar(make_response('', 304))
+
+@app.after_request
+def agregar_etag(response):
+    if g.get('etag') and response.status_code == 200:
+        cabeceras_revalidar(response)
+    return response
+
+@app.after_request
+def revisar_consultas(response):
+    """Cierra el registro de consultas de la petición: N+1, presupuesto y cabeceras"""
+    registro = g.get('registro_consultas')
+    if registro is None:
+        return response
+    resumen = registro.resumen()
+    guardar_resumen(resumen)
+    if resumen['n_mas_1']:
+        print(f"Posible N+1 en {registro.etiqueta}: {resumen['n_mas_1']}")
+
+    vista = app.view_functions.get(request.endpoint)
+    maximo = getattr(vista, 'presupuesto_consultas', None)
+    if maximo is not None and registro.cantidad > maximo:
+        mensaje = f"{registro.etiqueta} ejecutó {registro.cantidad} consultas (presupuesto: {maximo})"
+        print(f"Presupuesto de consultas excedido: {mensaje}")
+        if app.config.get('PRESUPUESTO_CONSULTAS_ESTRICTO'):
+            raise PresupuestoExcedido(mensaje)
+
+    if app.debug or app.testing:
+        response.headers['X-DB-Consultas'] = str(registro.cantidad)
+        response.headers['X-DB-Tiempo-Ms'] = str(resumen['tiempo_ms'])
+    return response
+
+@app.teardown_request
+def cerrar_registro_consultas(exc):
+    token = g.pop('registro_token', None)
+    if token is not None:
+        terminar_registro(token)
 
 def login_requerido(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # Verificar sesión recordada antes de requerir login
-        verificar_sesion_recordada()
-
+        # La sesión recordada ya se restauró en before_request
         if 'usuario' not in session:
             return redirect(url_for('login'))
         return f(*args, **kwargs)
@@ -206,12 +421,22 @@ def manejar_imagen_producto(descripcion, imagen=None):
             raise ValueError(f'Error al guardar la imagen: {str(e)}')
     else:
         # Si no hay imagen subida y no existe una para el producto, copiar por defecto
-        if not os.path.exists(ruta_imagen):
-            ruta_por_defecto = os.path.join(app.config['UPLOAD_FOLDER'], 'PorDefecto.webp')
-            if os.path.exists(ruta_por_defecto):
-                import shutil
-                shutil.copy2(ruta_por_defecto, ruta_imagen)
-    
+        if os.path.exists(ruta_imagen):
+            return nombre_archivo
+        ruta_por_defecto = os.path.join(app.config['UPLOAD_FOLDER'], POR_DEFECTO)
+        if not os.path.exists(ruta_por_defecto):
+            return nombre_archivo
+        import shutil
+        shutil.copy2(ruta_por_defecto, ruta_imagen)
+
+    # Copias reducidas para tarjetas y vistas de detalle (imagenes.py). Si
+    # fallan, las plantillas usan el original
+    try:
+        generar_variantes(app.config['UPLOAD_FOLDER'], nombre_archivo)
+    except (OSError, ValueError) as e:
+        print(f"Error al generar variantes de {nombre_archivo}: {e}")
+    imagenes_productos.actualizar(nombre_archivo)
+
     return nombre_archivo
 
 def validar_email(email):
@@ -219,20 +444,9 @@ def validar_email(email):
     patron = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(patron, email) is not None
 
-def enviar_email_gmail(destinatario, codigo):
-    """Envía un email con el código de verificación usando Gmail"""
-    remitente = 'soportedebodega.cocacola@gmail.com'  # Email de soporte
-    password = 'haan gkbx pchr zlvs'  # Reemplazar con el App Password de soportedebodega.cocacola@gmail.com
-
-    if remitente == 'tu_email@gmail.com':
-        print("Error: Configura las credenciales de Gmail en la función enviar_email_gmail")
-        return False
-
-    msg = MIMEMultipart()
-    msg['From'] = remitente
-    msg['To'] = destinatario
-    msg['Subject'] = 'Código de Verificación para Recuperar Contraseña'
-
+def correo_codigo_verificacion(codigo):
+    """(asunto, cuerpo) del correo con el código para recuperar la contraseña"""
+    asunto = 'Código de Verificación para Recuperar Contraseña'
     cuerpo = f'''
     Hola,
 
@@ -246,23 +460,11 @@ def enviar_email_gmail(destinatario, codigo):
     Equipo de Soporte CocaCola
     soporte.cocacola@gmail.com
     '''
-    msg.attach(MIMEText(cuerpo, 'plain'))
+    return asunto, cuerpo
 
-    try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(remitente, password)
-        text = msg.as_string()
-        server.sendmail(remitente, destinatario, text)
-        server.quit()
-        print(f"Email enviado a {destinatario}")
-        return True
-    except smtplib.SMTPAuthenticationError as e:
-        print(f"Error de autenticación: {e}. Verifica el email y App Password.")
-        return False
-    except Exception as e:
-        print(f"Error al enviar email: {e}")
-        return False
+# Los correos se guardan en CorreosPendientes y los envía un hilo por worker
+# con una conexión SMTP reutilizada (correo.py)
+buzon_correo = BuzonSalida()
 
 #Login con funcionalidad de "Recuérdame"
 # ====================================
@@ -270,16 +472,18 @@ def enviar_email_gmail(destinatario, codigo):
 # cuando el usuario marca el checkbox "recuérdame".
 #
 # Funcionamiento:
-# 1. Si el usuario marca "recuérdame", se crean cookies que duran 30 días
-# 2. Las cookies contienen: usuario, tipo y user_id
-# 3. Antes de cada petición, se verifica si hay cookies válidas
-# 4. Si hay cookies válidas, se restaura la sesión automáticamente
-# 5. Al hacer logout, se eliminan las cookies
+# 1. Si el usuario marca "recuérdame", se crea una cookie que dura 30 días
+# 2. La cookie contiene un token firmado (id de usuario, huella de la
+#    contraseña y un identificador único), no el nombre de usuario
+# 3. Antes de cada petición sin sesión, se verifica el token en memoria
+# 4. Si el token es válido, se restaura la sesión automáticamente
+# 5. Al hacer logout, se revoca el token y se elimina la cookie
 #
 # Seguridad:
-# - Las cookies tienen httponly=True para prevenir acceso desde JavaScript
-# - Se verifica que el usuario aún existe en la BD antes de restaurar sesión
-# - Las cookies expiran automáticamente después de 30 días
+# - La cookie tiene httponly=True para prevenir acceso desde JavaScript
+# - La firma impide fabricar o modificar tokens
+# - Se verifica que el usuario aún existe y que su contraseña no cambió
+# - El token vence después de 30 días
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     # Verificar si ya hay una sesión recordada
@@ -295,12 +499,9 @@ def login():
         recuerdame = request.form.get('recuerdame')  # Checkbox "recuérdame"
         contrasena_codificada = base64.b64encode(contrasena.encode('utf-16le')).decode()
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM Usuario WHERE NUsuario = ? AND Contraseña = ?', (nusuario, contrasena_codificada))
+        with get_db_connection() as conn:
+            user = Repositorio(conn).usuarios.autenticar(nusuario, contrasena_codificada)
         print(f"Usuario: {nusuario}, Contraseña: {contrasena_codificada}")
-        user = cursor.fetchone()
-        conn.close()
 
         if user:
             # Crear sesión normal - CORREGIDOS LOS ÍNDICES SEGÚN ESTRUCTURA DE TABLA
@@ -309,22 +510,20 @@ def login():
             session['user_id'] = user[0]  # Id_Usuario (índice 0)
 
             # Si se marcó "recuérdame", crear cookies persistentes
-            if recuerdame:
+            if recuerdame and tokens_recuerdame.habilitado:
                 # Crear respuesta con cookies
                 resp = make_response(redirect(url_for('index')))
 
-                # Cookies que duran 30 días
-                expires = datetime.now() + timedelta(days=30)
+                # Token firmado que dura 30 días
+                token, expires = tokens_recuerdame.emitir(user[0], user.VersionContrasena)
+                resp.set_cookie(NOMBRE_COOKIE, token, expires=expires, httponly=True, secure=False, samesite='Lax')
 
-                # CORREGIDOS LOS ÍNDICES PARA LAS COOKIES
-                resp.set_cookie('recuerdame_usuario', user[2], expires=expires, httponly=True, secure=False)  # NUsuario
-                resp.set_cookie('recuerdame_tipo', user[5], expires=expires, httponly=True, secure=False)    # Tipo
-                resp.set_cookie('recuerdame_user_id', str(user[0]), expires=expires, httponly=True, secure=False)  # Id_Usuario
-
-                print(f"Cookies de 'recordame' creadas para usuario: {user[2]}")
+                print(f"Cookie de 'recordame' creada para usuario: {user[2]}")
                 return resp
             else:
                 # Sin cookies, solo sesión normal
+                if recuerdame:
+                    flash('"Recuérdame" no está disponible; la sesión dura hasta cerrar el navegador.', 'warning')
                 return redirect(url_for('index'))
         else:
             flash('Nombre de usuario o contraseña incorrectos')
@@ -340,42 +539,40 @@ def recuperar_contrasena():
             return redirect(url_for('recuperar_contrasena'))
 
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT Email FROM Usuario WHERE Email = ?', (email,))
-        user = cursor.fetchone()
+        repo = Repositorio(conn)
 
-        if not user:
+        if not repo.usuarios.existe_email(email):
             conn.close()
             flash('Email no registrado.', 'danger')
             return redirect(url_for('recuperar_contrasena'))
 
+        if not buzon_correo.habilitado:
+            conn.close()
+            flash('El envío de correos no está configurado. Contacta al administrador.', 'danger')
+            return redirect(url_for('recuperar_contrasena'))
+
         # Generar código de 6 dígitos
         codigo = ''.join(secrets.choice('0123456789') for _ in range(6))
         expiry = datetime.now() + timedelta(minutes=10)
         """ flash(f'Debug: Código generado: {codigo}', 'info') """
 
-        # Guardar en BD (asumiendo tabla ResetTokens)
+        # Guardar en BD el código y el correo que lo envía (misma transacción):
+        # el buzón lo manda en segundo plano y la petición no espera al SMTP
         try:
-            cursor.execute('INSERT INTO ResetTokens (Email, Token, Expiry) VALUES (?, ?, ?)', (email, codigo, expiry))
+            repo.usuarios.guardar_token(email, codigo, expiry)
+            repo.correos.encolar(email, *correo_codigo_verificacion(codigo))
+            usuario_nombre = repo.usuarios.nombre_por_email(email) or 'Usuario'
             conn.commit()
         except Exception as e:
             conn.close()
             flash(f'Error al guardar en BD: {str(e)}', 'danger')
             return redirect(url_for('recuperar_contrasena'))
+        conn.close()
+        buzon_correo.despertar()
 
-        # Enviar email
-        if enviar_email_gmail(email, codigo):
-            session['reset_email'] = email
-
-            cursor.execute('SELECT NombreCompleto FROM Usuario WHERE Email = ?', (email,))
-            usuario = cursor.fetchone()
-            usuario_nombre = usuario[0] if usuario else 'Usuario'
-            conn.close()
-            flash(f'Código de verificación enviado a tu email, {usuario_nombre}', 'success')
-            return redirect(url_for('verificar_codigo'))
-        else:
-            conn.close()
-            flash('Error al enviar el email. Verifica credenciales de Gmail.', 'danger')
+        session['reset_email'] = email
+        flash(f'Código de verificación enviado a tu email, {usuario_nombre}', 'success')
+        return redirect(url_for('verificar_codigo'))
 
     return render_template('Login/recuperar_contrasena.html')
 
@@ -388,11 +585,8 @@ def verificar_codigo():
             flash('Sesión expirada. Intenta de nuevo.', 'danger')
             return redirect(url_for('recuperar_contrasena'))
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT Token, Expiry FROM ResetTokens WHERE Email = ? ORDER BY Expiry DESC', (email,))
-        token_data = cursor.fetchone()
-        conn.close()
+        with get_db_connection() as conn:
+            token_data = Repositorio(conn).usuarios.ultimo_token(email)
 
         if not token_data or token_data[0] != codigo or datetime.now() > token_data[1]:
             flash('Código inválido o expirado.', 'danger')
@@ -426,11 +620,11 @@ def reset_contrasena():
         email = session.get('reset_email')
         contrasena_codificada = base64.b64encode(nueva_contrasena.encode('utf-16le')).decode()
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE Usuario SET Contraseña = ? WHERE Email = ?', (contrasena_codificada, email))
-        conn.commit()
-        conn.close()
+        with get_db_connection() as conn:
+            Repositorio(conn).usuarios.cambiar_contrasena(email, contrasena_codificada)
+            conn.commit()
+        # Los tokens de "recuérdame" emitidos con la versión anterior dejan de valer
+        tokens_recuerdame.invalidar()
 
         # Limpiar sesión
         session.pop('reset_email', None)
@@ -449,162 +643,62 @@ def logout():
     # Crear respuesta que elimina las cookies de "recuérdame"
     resp = make_response(redirect(url_for('login')))
 
-    # Eliminar cookies configurándolas con fecha de expiración pasada
-    resp.set_cookie('recuerdame_usuario', '', expires=0)
-    resp.set_cookie('recuerdame_tipo', '', expires=0)
-    resp.set_cookie('recuerdame_user_id', '', expires=0)
-
-    print("Sesion cerrada y cookies de 'recordame' eliminadas")
+    # Revocar el token (este worker de inmediato, los demás en su próxima
+    # recarga) y eliminar la cookie
+    token = request.cookies.get(NOMBRE_COOKIE)
+    if token:
+        try:
+            with conexion_bd() as conn:
+                repo = Repositorio(conn)
+                tokens_recuerdame.revocar(token, repo.usuarios.revocar_recuerdame)
+                conn.commit()
+        except ERRORES_BD as e:
+            print(f"No se pudo revocar el token de 'recordame': {e}")
+    resp.set_cookie(NOMBRE_COOKIE, '', expires=0)
+    # Cookies del formato anterior (usuario en texto plano)
+    for nombre in ('recuerdame_usuario', 'recuerdame_tipo', 'recuerdame_user_id'):
+        if nombre in request.cookies:
+            resp.set_cookie(nombre, '', expires=0)
+
+    print("Sesion cerrada y cookie de 'recordame' eliminada")
     return resp
 
 # Ruta: Página principal con bienvenida
 @app.route('/')
 @login_requerido
+@solo_lectura
+@presupuesto_consultas(3)
 def index():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Resumen cacheado (stock bajo, últimas ventas, totales); sin consultas
+    # mientras esté vigente
+    resumen = TableroRepo.vigente()
+    if resumen is None:
+        with get_db_connection() as conn:
+            resumen = Repositorio(conn).tablero.resumen()
+    alertas_stock = resumen['stock_bajo']
 
-    # Obtener productos con inventario bajo (ejemplo: menos de 10 unidades)
-    cursor.execute('''
-        SELECT Descripcion, Inventario
-        FROM Paquete
-        WHERE Inventario < 30
-        ORDER BY Inventario ASC
-    ''')
-    alertas_stock = cursor.fetchall()
-
-    # Obtener lista de ventas recientes
-    cursor.execute('''
-        SELECT Id_Venta, Fecha, TotalVenta
-        FROM Venta
-        WHERE Papelera = 0
-        ORDER BY Fecha ASC
-    ''')
-    ventas = cursor.fetchall()
-
-    cursor.execute('SELECT Id_Paquete, Descripcion, PaquetesCompletos, ' \
-    'UnidadesSobrantes, Inventario, TipoPaquete FROM Paquete WHERE Papelera = 0')
-    paquetes = cursor.fetchall()
+    return render_template_ajax('bienvenida.html', alertas_stock=alertas_stock, resumen=resumen)
 
-    conn.close()
-
-    if is_ajax_request():
-        rendered = render_template('bienvenida.html', alertas_stock=alertas_stock, paquetes=paquetes, ventas=ventas)
-        soup = BeautifulSoup(rendered, 'html.parser')
-        content = soup.find('div', class_='content')
-        modals = soup.find(attrs={'data-modals': True})
-
-        return jsonify({
-            'content': content.prettify() if content else '',
-            'modals': modals.prettify() if modals else ''
-        })
-    else:
-        return render_template('bienvenida.html', alertas_stock=alertas_stock, paquetes=paquetes, ventas=ventas)
 
 
+# Tamaño de página del listado de detalles de venta y ventas del modal "Ver Ventas"
+POR_PAGINA_DETALLES = 50
+VENTAS_RECIENTES_MODAL = 100
 
 # Paquetes
 @app.route('/paquetes', methods=['GET', 'POST'])
 @login_requerido
+@solo_lectura
+@depende_de('Paquete')
+@presupuesto_consultas(6)
 def ver_paquetes():
     busqueda = request.args.get('busqueda', '').strip()
     filtro = request.args.get('Filtros', 'Nombre')  # 'Nombre' por defecto
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    cursor = decodificar_cursor(request.args.get('cursor', ''))
     limit = 12
-    offset = (page - 1) * limit
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Obtener total de paquetes para paginación
-    if busqueda:
-        if filtro == 'Nombre':
-            cursor.execute('SELECT COUNT(*) FROM Paquete WHERE Descripcion LIKE ? AND Papelera = 0', (f'%{busqueda}%',))
-        elif filtro == 'Inventario':
-            try:
-                if busqueda.startswith('='):
-                    valor = float(busqueda[1:])
-                    cursor.execute('SELECT COUNT(*) FROM Paquete WHERE Inventario = ? AND Papelera = 0', (valor,))
-                elif busqueda.startswith('>'):
-                    valor = float(busqueda[1:])
-                    cursor.execute('SELECT COUNT(*) FROM Paquete WHERE Inventario > ? AND Papelera = 0', (valor,))
-                elif busqueda.startswith('<'):
-                    valor = float(busqueda[1:])
-                    cursor.execute('SELECT COUNT(*) FROM Paquete WHERE Inventario < ? AND Papelera = 0', (valor,))
-                elif '-' in busqueda:
-                    min_val, max_val = map(int, busqueda.split('-'))
-                    cursor.execute('SELECT COUNT(*) FROM Paquete WHERE Inventario BETWEEN ? AND ? AND Papelera = 0', (min_val, max_val))
-                else:
-                    valor = float(busqueda)
-                    cursor.execute('SELECT COUNT(*) FROM Paquete WHERE Inventario BETWEEN ? AND (? + 5) AND Papelera = 0', (valor, valor))
-            except ValueError:
-                total = 0
-                paquetes = []
-        elif filtro == 'TipoPaquete':
-            cursor.execute('SELECT COUNT(*) FROM Paquete WHERE TipoPaquete LIKE ? AND Papelera = 0', (f'%{busqueda}%',))
-        else:
-            cursor.execute('SELECT COUNT(*) FROM Paquete WHERE Papelera = 0')
-    else:
-        cursor.execute('SELECT COUNT(*) FROM Paquete WHERE Papelera = 0')
-
-    total_result = cursor.fetchone()
-    total = total_result[0] if total_result else 0
-    total_pages = (total + limit - 1) // limit
-
-    # Buscar paquetes con paginación
-    if busqueda:
-        if filtro == 'Nombre':
-            cursor.execute('''
-                SELECT *
-                FROM Paquete
-                WHERE Descripcion LIKE ? AND Papelera = 0
-                ORDER BY Id_Paquete DESC
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            ''', (f'%{busqueda}%', offset, limit))
-        elif filtro == 'Inventario':
-            try:
-                if busqueda.startswith('='):
-                    valor = float(busqueda[1:])
-                    cursor.execute('SELECT * FROM Paquete WHERE Inventario = ? AND Papelera = 0 ORDER BY Id_Paquete DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY', (valor, offset, limit))
-                elif busqueda.startswith('>'):
-                    valor = float(busqueda[1:])
-                    cursor.execute('SELECT * FROM Paquete WHERE Inventario > ? AND Papelera = 0 ORDER BY Id_Paquete DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY', (valor, offset, limit))
-                elif busqueda.startswith('<'):
-                    valor = float(busqueda[1:])
-                    cursor.execute('SELECT * FROM Paquete WHERE Inventario < ? AND Papelera = 0 ORDER BY Id_Paquete DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY', (valor, offset, limit))
-                elif '-' in busqueda:
-                    min_val, max_val = map(int, busqueda.split('-'))
-                    cursor.execute('SELECT * FROM Paquete WHERE Inventario BETWEEN ? AND ? AND Papelera = 0 ORDER BY Id_Paquete DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY', (min_val, max_val, offset, limit))
-                else:
-                    valor = float(busqueda)
-                    cursor.execute('SELECT * FROM Paquete WHERE Inventario BETWEEN ? AND (? + 5) AND Papelera = 0 ORDER BY Id_Paquete DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY', (valor, valor, offset, limit))
-            except ValueError:
-                paquetes = []
-        elif filtro == 'TipoPaquete':
-            cursor.execute('''
-                SELECT *
-                FROM Paquete
-                WHERE TipoPaquete LIKE ? AND Papelera = 0
-                ORDER BY Id_Paquete DESC
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            ''', (f'%{busqueda}%', offset, limit))
-        else:
-            cursor.execute('''
-                SELECT *
-                FROM Paquete
-                WHERE Papelera = 0
-                ORDER BY Id_Paquete DESC
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            ''', (offset, limit))
-    else:
-        cursor.execute('''
-            SELECT *
-            FROM Paquete
-            WHERE Papelera = 0
-            ORDER BY Id_Paquete DESC
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-        ''', (offset, limit))
-
-    paquetes = cursor.fetchall()
+    repo = Repositorio(conn)
 
     # Crear paquete (si POST)
     if request.method == 'POST':
@@ -630,61 +724,95 @@ def ver_paquetes():
             return redirect(url_for('ver_paquetes'))
 
         # Inserción en la BD (NO incluye imagen, como pediste)
-        cursor.execute('''
-            INSERT INTO Paquete (Descripcion, TipoPaquete, Inventario, UnidadesSobrantes, PaquetesCompletos, PrecioVenta_Paq, PrecioCompra_Paq)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (descripcion, tipo, inventario, unidadessobrantes, paquetescompletos, precio_venta, precio_compra))
+        repo.paquetes.crear(descripcion, tipo, inventario, unidadessobrantes, paquetescompletos, precio_venta, precio_compra)
 
         conn.commit()
-        conn.close()
 
-        # Limpiar imágenes huérfanas después de crear el producto
-        limpiar_imagenes_huerfanas()
+        # Agregar al índice de búsqueda solo los productos nuevos
+        indice = indice_productos(repo)
+        for id_paquete, desc, activo in repo.paquetes.para_indice(desde_id=indice.max_id):
+            indice.actualizar(id_paquete, desc, activo)
+        conn.close()
         return redirect(url_for('ver_paquetes'))
 
-    archivos_disponibles = set(os.listdir(app.config['UPLOAD_FOLDER']))
+    try:
+        ids_nombre = indice_productos(repo).ids(busqueda) if filtro == 'Nombre' and busqueda else None
+        where, params = filtro_paquetes(filtro, busqueda, ids_nombre)
+    except ValueError:
+        where, params = None, ()
+
+    # Paginación: los botones Anterior/Siguiente usan un cursor por llave
+    # (Id_Paquete); los números de página siguen funcionando con ?page=N
+    siguiente = anterior = None
+    if where is None:
+        total = 0
+        paquetes = []
+    elif cursor:
+        direccion, id_limite, page = cursor
+        paquetes, hay_mas = repo.paquetes.pagina_llave(where, params, limit, direccion, id_limite)
+        total = repo.paquetes.contar_cacheado(where, params)
+        hay_siguiente = hay_mas if direccion == 's' else bool(paquetes)
+        hay_anterior = hay_mas if direccion == 'a' else True
+        if not paquetes:
+            page = 1
+    else:
+        paquetes = repo.paquetes.pagina(where, params, (page - 1) * limit, limit)
+        if paquetes:
+            total = paquetes[0].TotalFiltrado
+        else:
+            # Página fuera de rango (o sin resultados): contar para la barra
+            total = repo.paquetes.contar_cacheado(where, params) if page > 1 else 0
+        hay_siguiente = page * limit < total
+        hay_anterior = page > 1
+    total_pages = (total + limit - 1) // limit
+    if paquetes:
+        if hay_siguiente:
+            siguiente = codificar_cursor('s', paquetes[-1].Id_Paquete, page + 1)
+            # El conteo cacheado es aproximado: que nunca oculte la página siguiente
+            total_pages = max(total_pages, page + 1)
+        if hay_anterior and page > 1:
+            anterior = codificar_cursor('a', paquetes[0].Id_Paquete, page - 1)
+
     conn.close()
 
-    # Timestamp para evitar cache de imágenes
-    timestamp = int(time.time())
-
-    if is_ajax_request():
-        rendered = render_template(
-            'Productos/paquetes.html',
-            paquetes=paquetes,
-            busqueda=busqueda,
-            lookup_files=archivos_disponibles,
-            filtro=filtro,
-            timestamp=timestamp,
-            page=page,
-            total_pages=total_pages
-        )
-        soup = BeautifulSoup(rendered, 'html.parser')
-        content = rendered
-        modals = soup.find(attrs={'data-modals': True})
-
-        return jsonify({
-            'content': content,
-            'modals': modals.prettify() if modals else ''
-        })
-    else:
-        return render_template(
-            'Productos/paquetes.html',
-            paquetes=paquetes,
-            busqueda=busqueda,
-            lookup_files=archivos_disponibles,
-            filtro=filtro,
-            timestamp=timestamp,
-            page=page,
-            total_pages=total_pages
-        )
+    # Las imágenes salen del manifiesto en memoria (imagen_producto) con
+    # huella de contenido en la URL: sin listar la carpeta ni ?t=
+    return render_template_ajax(
+        'Productos/paquetes.html',
+        paquetes=paquetes,
+        busqueda=busqueda,
+        filtro=filtro,
+        page=page,
+        total_pages=total_pages,
+        cursor_siguiente=siguiente,
+        cursor_anterior=anterior
+    )
+
+# Sugerencias para el buscador de productos (typeahead): responde desde el
+# índice en memoria, sin consultar la base salvo la primera vez
+@app.route('/paquetes/sugerencias')
+@login_requerido
+@solo_lectura
+@presupuesto_consultas(2)
+def sugerencias_paquetes():
+    consulta = request.args.get('q', '').strip()
+    limite = min(max(request.args.get('n', 8, type=int), 1), 50)
+    resultados = indice_productos().buscar(consulta, limite=limite) if consulta else []
+    return jsonify({
+        'consulta': consulta,
+        'resultados': [
+            {'id': id_paquete, 'descripcion': descripcion, 'puntaje': puntaje}
+            for id_paquete, descripcion, puntaje in resultados
+        ]
+    })
 
 #Edicion de paquetes
 @app.route('/editar_paquete/<int:id>', methods=['GET', 'POST'])
 @login_requerido
+@presupuesto_consultas(4)
 def editar_paquete(id):
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
     if request.method == 'POST':
         descripcion = request.form['Descripcion']
@@ -706,9 +834,7 @@ def editar_paquete(id):
             return redirect(url_for('editar_paquete', id=id))
 
         # Obtener descripción anterior para comparar
-        cursor.execute('SELECT Descripcion FROM Paquete WHERE Id_Paquete = ? AND Papelera = 0', (id,))
-        paquete_anterior = cursor.fetchone()
-        descripcion_anterior = paquete_anterior[0] if paquete_anterior else None
+        descripcion_anterior = repo.paquetes.descripcion(id)
 
         # Eliminar la imagen anterior si hay nueva imagen
         if imagen and imagen.filename != '':
@@ -717,6 +843,8 @@ def editar_paquete(id):
                 if os.path.exists(ruta_anterior):
                     try:
                         os.remove(ruta_anterior)
+                        borrar_variantes(app.config['UPLOAD_FOLDER'], os.path.basename(ruta_anterior))
+                        imagenes_productos.quitar(os.path.basename(ruta_anterior))
                     except Exception as e:
                         print(f"Error al eliminar imagen anterior: {e}")
 
@@ -732,6 +860,8 @@ def editar_paquete(id):
             if not (imagen and imagen.filename != ''):
                 if os.path.exists(ruta_anterior) and not os.path.exists(ruta_nueva):
                     os.rename(ruta_anterior, ruta_nueva)
+                    renombrar_variantes(app.config['UPLOAD_FOLDER'], nombre_archivo_anterior, nombre_archivo_nuevo)
+                    imagenes_productos.renombrar(nombre_archivo_anterior, nombre_archivo_nuevo)
 
         try:
             nombre_archivo = manejar_imagen_producto(descripcion, imagen)
@@ -743,18 +873,12 @@ def editar_paquete(id):
 
             return redirect(url_for('editar_paquete', id=id))
 
-        cursor.execute('''
-            UPDATE Paquete
-            SET Descripcion = ?, TipoPaquete = ?, Inventario = ?, UnidadesSobrantes = ?, PaquetesCompletos = ?, PrecioVenta_Paq = ?, PrecioCompra_Paq = ?
-            WHERE Id_Paquete = ?
-        ''', (descripcion, tipo, inventario, unidadessobrantes, paquetescompletos, precio_venta, precio_compra, id))
+        repo.paquetes.actualizar(id, descripcion, tipo, inventario, unidadessobrantes, paquetescompletos, precio_venta, precio_compra)
 
         conn.commit()
+        indice_productos(repo).actualizar(id, descripcion)
         conn.close()
 
-        # Limpiar imágenes huérfanas después de editar el producto
-        limpiar_imagenes_huerfanas()
-
         # 🚀 Si es AJAX, regresamos JSON limpio → JS hace navigateTo()
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({"redirect": url_for('ver_paquetes')})
@@ -763,108 +887,42 @@ def editar_paquete(id):
 
 
     # Obtener paquetes para el combo
-    cursor.execute('SELECT * FROM Paquete WHERE Id_Paquete = ? AND Papelera = 0', (id,))
-    paquete = cursor.fetchone() 
-
-    # Obtener lista de archivos disponibles
-    archivos_disponibles = set(os.listdir(app.config['UPLOAD_FOLDER']))
+    paquete = repo.paquetes.obtener(id)
 
     conn.close()
 
-    # Timestamp para evitar cache de imágenes
-    timestamp = int(time.time())
-
-    if is_ajax_request():
-        rendered = render_template('Productos/editar_paquetes.html', paquete=paquete, archivos_disponibles=archivos_disponibles, timestamp=timestamp)
-        soup = BeautifulSoup(rendered, 'html.parser')
-        content = soup.find('div', class_='content')
-        modals = soup.find(attrs={'data-modals': True})
-
-        return jsonify({
-            'content': content.prettify() if content else '',
-            'modals': modals.prettify() if modals else ''
-        })
-    else:
-        return render_template('Productos/editar_paquetes.html', paquete=paquete, archivos_disponibles=archivos_disponibles, timestamp=timestamp)
+    return render_template_ajax('Productos/editar_paquetes.html', paquete=paquete)
 
 
 
 #Detalle Venta
 @app.route('/detalles_ventas', methods=['GET', 'POST'])
 @login_requerido
+@solo_lectura
+@depende_de('DetalleVenta', 'Venta', 'Paquete')
+@presupuesto_consultas(8)
 def ver_detalles_ventas():
     producto = request.args.get('producto', '').strip()
     id_venta = request.args.get('id_venta', '').strip()
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
     error = None
 
-    # Buscar detalles de ventas (por nombre de paquete si hay búsqueda)
-    if producto:
-        cursor.execute('''
-            SELECT 
-                dv.Id_DetalleVenta,
-                dv.Id_Venta,
-                p.Descripcion AS DescripcionPaquete,
-                dv.CantidadPaquetes,
-                dv.CantidadUnidades,
-                dv.CantidadVendidaTotal,
-                dv.PrecioUnitario,
-                dv.Subtotal
-            FROM DetalleVenta dv
-            JOIN Paquete p ON dv.Id_Paquete = p.Id_Paquete
-            WHERE p.Descripcion LIKE ? AND dv.Papelera = 0
-            ORDER BY dv.Id_Venta ASC
-        ''', (f'%{producto}%',))
-    elif id_venta:
-        cursor.execute('''
-            SELECT 
-                dv.Id_DetalleVenta,
-                dv.Id_Venta,
-                p.Descripcion AS DescripcionPaquete,
-                dv.CantidadPaquetes,
-                dv.CantidadUnidades,
-                dv.CantidadVendidaTotal,
-                dv.PrecioUnitario,
-                dv.Subtotal
-            FROM DetalleVenta dv
-            JOIN Paquete p ON dv.Id_Paquete = p.Id_Paquete
-            WHERE dv.Id_Venta LIKE ? AND dv.Papelera = 0
-            ORDER BY dv.Id_Venta ASC
-        ''', (f'%{id_venta}%',))
-    else:
-        cursor.execute('''
-            SELECT 
-                dv.Id_DetalleVenta,
-                dv.Id_Venta,
-                p.Descripcion AS DescripcionPaquete,
-                dv.CantidadPaquetes,
-                dv.CantidadUnidades,
-                dv.CantidadVendidaTotal,
-                dv.PrecioUnitario,
-                dv.Subtotal
-            FROM DetalleVenta dv
-            JOIN Paquete p ON dv.Id_Paquete = p.Id_Paquete
-            WHERE dv.Papelera = 0
-            ORDER BY dv.Id_Venta ASC
-        ''')
-    detalles_ventas = cursor.fetchall()
-
-
-    # Agregar Detalle Venta
+    # Agregar Detalle Venta (no necesita cargar el listado)
     if request.method == 'POST':
         is_htmx = request.headers.get('HX-Request')
         print(f"HTMX Request: {is_htmx}")
         try:
-            id_venta = int(request.form['dv_id_venta'])
+            # Variable aparte: si el alta falla, el listado sigue filtrando por
+            # el id_venta de la URL (texto), no por el del formulario
+            id_venta_form = int(request.form['dv_id_venta'])
             id_paquete = int(request.form['dv_paquete_id'])
             paquetes_finales = int(request.form['dv_paquetes_finales'])
             unidades_finales = int(request.form['dv_unidades_finales'])
 
             # Obtener inventario actual del paquete
-            cursor.execute('SELECT Inventario, TipoPaquete, PrecioVenta_Paq, Descripcion FROM Paquete WHERE Id_Paquete = ?', (id_paquete,))
-            paquete = cursor.fetchone()
+            paquete = repo.paquetes.datos_venta(id_paquete)
             if not paquete:
                 raise ValueError('Paquete no encontrado')
             inventario_actual = paquete[0]
@@ -873,28 +931,11 @@ def ver_detalles_ventas():
             descripcion_paquete = paquete[3]
 
 
-            cursor.execute('''
-                INSERT INTO DetalleVenta (Id_Paquete, CantidadPaquetes, CantidadUnidades, Id_Venta)
-                VALUES (?, ?, ?, ?)
-            ''', (id_paquete, paquetes_finales, unidades_finales, id_venta))
+            repo.detalles_venta.insertar(id_paquete, paquetes_finales, unidades_finales, id_venta_form)
 
             conn.commit()
 
-            cursor.execute(
-                '''
-                SELECT TOP 1 
-                    CantidadVendidaTotal,
-                    PrecioUnitario,
-                    Subtotal,
-                    CantidadPaquetes,
-                    CantidadUnidades,
-                    Id_DetalleVenta
-                FROM DetalleVenta
-                WHERE Papelera = 0
-                ORDER BY Id_DetalleVenta DESC;
-            '''
-            )
-            detalle_insertado = cursor.fetchone()
+            detalle_insertado = repo.detalles_venta.ultimo()
 
             cantidad_vendida_total = detalle_insertado[0]
             precio_unitario = detalle_insertado[1]
@@ -909,7 +950,7 @@ def ver_detalles_ventas():
                 # Devolver HTML de la nueva fila
                 nueva_fila_html = f'''
                 <tr>
-                    <td class="text-center">{id_venta}</td>
+                    <td class="text-center">{id_venta_form}</td>
                     <td>{descripcion_paquete}</td>
                     <td class="text-center">{cantidad_paquetes}</td>
                     <td class="text-center">{cantidad_unidades}</td>
@@ -931,77 +972,78 @@ def ver_detalles_ventas():
             error = str(e)
             if is_htmx:
                 return f'<div class="alert alert-danger">{error}</div>'
-        except pyodbc.Error as e:
+        except ERRORES_BD as e:
+            conn.rollback()
             error = f'Error de base de datos: {str(e)}'
             if is_htmx:
                 return f'<div class="alert alert-danger">{error}</div>'
 
 
-    # Cargar combos: Paquetes y ventas
-    cursor.execute('SELECT Id_Paquete, Descripcion, PaquetesCompletos, UnidadesSobrantes, Inventario, TipoPaquete FROM Paquete WHERE Papelera = 0')
-    paquetes = cursor.fetchall()
-
-    cursor.execute('SELECT MAX(Id_Venta) FROM Venta WHERE Papelera = 0')
-    max_id_venta_result = cursor.fetchone()
-    max_id_venta = max_id_venta_result[0] if max_id_venta_result and max_id_venta_result[0] is not None else 1
-
-    cursor.execute('SELECT Id_Venta, Fecha, TotalVenta FROM Venta WHERE Papelera = 0 ORDER BY Fecha ASC')
-    ventas = cursor.fetchall()
+    # Listado paginado por llave (más recientes primero): cada página lee
+    # solo sus filas, sin importar cuánto historial haya
+    por_pagina = min(max(request.args.get('por_pagina', POR_PAGINA_DETALLES, type=int), 10), 200)
+    cursor = decodificar_cursor(request.args.get('cursor', ''))
+    direccion, id_limite, page = cursor or ('s', None, 1)
+    try:
+        # Las ventas históricas pueden ser de productos ya eliminados
+        ids_producto = indice_productos(repo).ids(producto, solo_activos=False) if producto else None
+        where, params = repo.detalles_venta.filtro(producto=producto, id_venta=id_venta, ids_producto=ids_producto)
+    except ValueError as e:
+        error = str(e)
+        where, params = '1 = 0', ()
+    # La página y los combos (paquetes, ventas recientes) no dependen entre
+    # sí: se consultan a la vez, cada uno con su conexión (db.en_paralelo)
+    datos = en_paralelo(conn, {
+        'paquetes': lambda c: Repositorio(c).paquetes.combo(),
+        'pagina': lambda c: Repositorio(c).detalles_venta.pagina(where, params, por_pagina, direccion, id_limite),
+        'max_id_venta': lambda c: Repositorio(c).ventas.max_id(),
+        'ventas': lambda c: Repositorio(c).ventas.recientes(VENTAS_RECIENTES_MODAL),
+    })
+    detalles_ventas, hay_mas = datos['pagina']
+    hay_siguiente = hay_mas if direccion == 's' else bool(cursor)
+    hay_anterior = page > 1 and (hay_mas if direccion == 'a' else True)
+    cursor_siguiente = cursor_anterior = None
+    if detalles_ventas:
+        if hay_siguiente:
+            cursor_siguiente = codificar_cursor('s', detalles_ventas[-1].Id_DetalleVenta, page + 1)
+        if hay_anterior:
+            cursor_anterior = codificar_cursor('a', detalles_ventas[0].Id_DetalleVenta, page - 1)
+
+    paquetes = datos['paquetes']
+    max_id_venta = datos['max_id_venta']
+    ventas = datos['ventas']
 
     tiene_detalles = len(detalles_ventas) > 0
     conn.close()
 
-    if is_ajax_request():
-        rendered = render_template(
-            'Ventas/detalles_ventas.html',
-            detalles_ventas=detalles_ventas,
-            producto=producto,
-            id_venta=id_venta,
-            paquetes=paquetes,
-            ventas=ventas,
-            max_id_venta=max_id_venta,
-            error=error,
-            tiene_detalles=tiene_detalles
-        )
-        soup = BeautifulSoup(rendered, 'html.parser')
-        content = soup.find('div', class_='content')
-        modals = soup.find(attrs={'data-modals': True})
-
-        return jsonify({
-            'content': content.prettify() if content else '',
-            'modals': modals.prettify() if modals else ''
-        })
-    else:
-        return render_template(
-            'Ventas/detalles_ventas.html',
-            detalles_ventas=detalles_ventas,
-            producto=producto,
-            id_venta=id_venta,
-            paquetes=paquetes,
-            ventas=ventas,
-            max_id_venta=max_id_venta,
-            error=error,
-            tiene_detalles=tiene_detalles
-        )
+    return render_template_ajax(
+        'Ventas/detalles_ventas.html',
+        detalles_ventas=detalles_ventas,
+        producto=producto,
+        id_venta=id_venta,
+        paquetes=paquetes,
+        ventas=ventas,
+        max_id_venta=max_id_venta,
+        error=error,
+        tiene_detalles=tiene_detalles,
+        page=page,
+        por_pagina=por_pagina,
+        cursor_siguiente=cursor_siguiente,
+        cursor_anterior=cursor_anterior
+    )
 
 
 
 @app.route('/crear_venta', methods=['POST'])
 @login_requerido
+@presupuesto_consultas(4)
 def crear_venta():
     is_htmx = request.headers.get('HX-Request')
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('INSERT INTO Venta DEFAULT VALUES;')
-        cursor.execute('SELECT Top 1 Id_Venta from Venta order by Id_Venta desc')
-        nueva_venta_result = cursor.fetchone()
-        nueva_venta_id = int(nueva_venta_result[0]) if nueva_venta_result and nueva_venta_result[0] is not None else 1
-
-        # Obtener la venta insertada para la fila
-        cursor.execute('SELECT Id_Venta, Fecha, TotalVenta FROM Venta WHERE Id_Venta = ?', (nueva_venta_id,))
-        venta = cursor.fetchone()
+        # Insertar la venta y obtener la fila para la tabla
+        venta = Repositorio(conn).ventas.crear()
+        nueva_venta_id = venta[0]
 
         conn.commit()
 
@@ -1030,50 +1072,30 @@ def crear_venta():
             return redirect(url_for('ver_detalles_ventas'))
 
     finally:
-        cursor.close()
         conn.close()
 
 
 
 @app.route('/editar_detalle_venta/<int:id>', methods=['GET', 'POST'])
 @login_requerido
+@presupuesto_consultas(5)
 def editar_detalle_venta(id):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''SELECT
-                    dv.Id_DetalleVenta,
-                    dv.Id_Paquete,
-                    dv.Id_Venta,
-                    p.TipoPaquete AS TipoPaquete,
-                    p.PaquetesCompletos AS PaquetesCompletos,
-                    p.UnidadesSobrantes AS UnidadesSobrantes,
-                    p.Inventario AS Inventario,
-                    p.Descripcion AS Descripcion,
-                    dv.CantidadPaquetes,
-                    dv.CantidadUnidades
-                    FROM DetalleVenta dv
-                    inner join Paquete p on dv.Id_Paquete = p.Id_Paquete
-                    WHERE Id_DetalleVenta = ? AND dv.Papelera = 0''', (id,))
-    detalle = cursor.fetchone()
-
-    # Convertir detalle a dict para serialización JSON
-    if detalle:
-        detalle = dict(zip([col[0] for col in cursor.description], detalle))
-
-    # Obtener paquetes para el combo
-    cursor.execute('SELECT Id_Paquete, Descripcion, PaquetesCompletos, UnidadesSobrantes, Inventario FROM Paquete WHERE Papelera = 0')
-    paquetes = cursor.fetchall()
-
-    # Convertir paquetes a lista de dicts para serialización JSON
-    paquetes = [dict(zip([col[0] for col in cursor.description], row)) for row in paquetes]
+    repo = Repositorio(conn)
 
-    cursor.execute('SELECT MAX(Id_Venta) FROM Venta WHERE Papelera = 0')
-    max_id_venta_result = cursor.fetchone()
-    max_id_venta = max_id_venta_result[0] if max_id_venta_result and max_id_venta_result[0] is not None else 1
+    # Detalle y paquetes como dicts para serialización JSON; las tres
+    # consultas son independientes y van en paralelo (db.en_paralelo)
+    datos = en_paralelo(conn, {
+        'paquetes': lambda c: Repositorio(c).paquetes.combo_dicts(),
+        'detalle': lambda c: Repositorio(c).detalles_venta.obtener_para_editar(id),
+        'max_id_venta': lambda c: Repositorio(c).ventas.max_id(),
+    })
+    detalle = datos['detalle']
+    paquetes = datos['paquetes']
+    max_id_venta = datos['max_id_venta']
 
 
     if not detalle:
-        cursor.close()
         conn.close()
         flash('Detalle de venta no encontrado.', 'danger')
         return redirect(url_for('ver_detalles_ventas'))
@@ -1087,11 +1109,7 @@ def editar_detalle_venta(id):
             # Si quieres actualizar precio unitario y subtotal, también agregar aquí y en el form
 
             # Actualizamos solo los campos que sí están en DetalleVenta
-            cursor.execute('''
-                UPDATE DetalleVenta
-                SET Id_Venta = ?, Id_Paquete = ?, CantidadPaquetes = ?, CantidadUnidades = ?
-                WHERE Id_DetalleVenta = ?
-            ''', (id_venta, id_paquete, cantidad_paquetes, cantidad_unidades, id))
+            repo.detalles_venta.actualizar(id, id_venta, id_paquete, cantidad_paquetes, cantidad_unidades)
 
             conn.commit()
             flash('Detalle de venta actualizado correctamente.', 'success')
@@ -1101,7 +1119,6 @@ def editar_detalle_venta(id):
             flash(f'Error al actualizar el detalle: {str(e)}', 'danger')
 
 
-    cursor.close()
     conn.close()
 
     return render_template_ajax(
@@ -1126,40 +1143,26 @@ def eliminar_detalle_venta(id):
 #Compras
 @app.route("/compras")
 @login_requerido
+@solo_lectura
+@depende_de('Compras', 'DetallesDeCompras', 'Proveedor')
+@presupuesto_consultas(4)
 def ver_compras():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Traer compras con proveedor y fecha
-    cursor.execute("""
-        SELECT C.Id_Compra, C.FechaDeCompra, P.NombreProveedor
-        FROM Compras C
-        LEFT JOIN Proveedor P ON C.Id_Proveedor = P.Id_Proveedor
-        ORDER BY C.Id_Compra DESC
-    """)
-    compras = cursor.fetchall()
-
-    lista_compras = []
-    for compra in compras:
-        id_compra = compra[0]
-        fecha = compra[1]
-        proveedor = compra[2] if compra[2] else "Sin proveedor"
-
-        # Ejecutar el procedimiento almacenado para calcular el total
-        cursor.execute("EXEC ObtenerTotalFactura @Id_Compra = ?", id_compra)
-        resultado = cursor.fetchone()
-
-        if resultado and resultado[1] is not None:
-            total = float(resultado[1])  # Convertir Decimal a float
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = 20
+
+    with get_db_connection() as conn:
+        repo = Repositorio(conn)
+        # Compras con proveedor, fecha y total en una sola consulta
+        compras = repo.compras.pagina((page - 1) * limit, limit)
+        if compras:
+            total = compras[0].TotalFiltrado
         else:
-            total = 0.0
-
-        lista_compras.append((id_compra, fecha, proveedor, total))
+            total = repo.compras.contar() if page > 1 else 0
 
-    cursor.close()
-    conn.close()
+    lista_compras = [(c.Id_Compra, c.FechaDeCompra, c.NombreProveedor, float(c.Total)) for c in compras]
+    total_pages = (total + limit - 1) // limit
 
-    return render_template_ajax("Compras/compras.html", compras=lista_compras)
+    return render_template_ajax("Compras/compras.html", compras=lista_compras, page=page, total_pages=total_pages)
 
 
 # -----------------------
@@ -1177,15 +1180,9 @@ def crear_compra():
 @app.route('/crear_compra/confirmar', methods=['POST'])
 @login_requerido
 def confirmar_crear_compra():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("INSERT INTO Compras (Id_Proveedor) OUTPUT INSERTED.Id_Compra VALUES (1)")
-    nueva_compra_id = cursor.fetchone()[0]
-    conn.commit()
-
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn:
+        nueva_compra_id = Repositorio(conn).compras.crear(1)
+        conn.commit()
 
     flash('Compra iniciada, agregue productos al carrito')
     return redirect(url_for('carrito', id_compra=nueva_compra_id))
@@ -1195,93 +1192,71 @@ def confirmar_crear_compra():
 # -----------------------
 @app.route('/carrito/<int:id_compra>', methods=['GET'])
 @login_requerido
+@presupuesto_consultas(4)
 def carrito(id_compra):
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
     # Obtener la compra
-    cursor.execute("SELECT Id_Compra, FechaDeCompra, Id_Proveedor FROM Compras WHERE Id_Compra = ?", (id_compra,))
-    compra = cursor.fetchone()
+    compra = repo.compras.obtener(id_compra)
     if not compra:
         flash('Compra no encontrada')
-        cursor.close()
         conn.close()
         return redirect(url_for('ver_compras'))
 
     # Buscar productos
     buscar = request.args.get('buscar', '').strip()
     if buscar:
-        cursor.execute("""
-            SELECT Id_Paquete, Descripcion, PrecioCompra_Paq
-            FROM Paquete
-            WHERE Papelera = 0 AND Descripcion LIKE ?
-        """, (f"%{buscar}%",))
+        paquetes = repo.paquetes.para_compra(ids=indice_productos(repo).ids(buscar))
     else:
-        cursor.execute("""
-            SELECT Id_Paquete, Descripcion, PrecioCompra_Paq
-            FROM Paquete
-            WHERE Papelera = 0
-        """)
-    paquetes = cursor.fetchall()
+        paquetes = repo.paquetes.para_compra()
 
     # Obtener detalles del carrito
-    cursor.execute('''
-        SELECT 
-            dc.Id_DetalleDeCompra, p.Descripcion AS Producto, dc.Cantidad, dc.TotalConIVA
-        FROM DetallesDeCompras dc
-        JOIN Paquete p ON dc.Id_Paquete = p.Id_Paquete
-        WHERE dc.Id_Compra = ?
-    ''', (id_compra,))
-    carrito = cursor.fetchall()
-
-    cursor.close()
+    carrito = repo.detalles_compra.carrito(id_compra)
+
     conn.close()
 
-    return render_template('Compras/carrito.html', compra=compra, paquetes=paquetes, carrito=carrito, buscar=buscar)
+    return render_pagina('Compras/carrito.html', compra=compra, paquetes=paquetes, carrito=carrito, buscar=buscar)
 
 # -----------------------
-# 4. Agregar producto al carrito
+# 4. Agregar producto(s) al carrito
 # -----------------------
 @app.route('/carrito/<int:id_compra>/agregar', methods=['POST'])
 @login_requerido
+@presupuesto_consultas(4)
 def agregar_al_carrito(id_compra):
-    id_paquete = request.form.get('id_paquete')
-    cantidad = int(request.form.get('cantidad', 1))
+    # El formulario envía un producto, pero se aceptan varios pares
+    # id_paquete/cantidad para agregarlos todos en un solo lote
+    ids_paquete = request.form.getlist('id_paquete')
+    cantidades = request.form.getlist('cantidad') or ['1'] * len(ids_paquete)
+
+    try:
+        items = [(int(id_paquete), int(cantidad)) for id_paquete, cantidad in zip(ids_paquete, cantidades)]
+    except ValueError:
+        flash('Producto no encontrado')
+        return redirect(url_for('carrito', id_compra=id_compra))
+
+    if not items:
+        flash('Producto no encontrado')
+        return redirect(url_for('carrito', id_compra=id_compra))
 
-    if cantidad < 1:
+    if any(cantidad < 1 for _, cantidad in items):
         flash('La cantidad debe ser al menos 1')
         return redirect(url_for('carrito', id_compra=id_compra))
 
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
-    # Verificar que existe
-    cursor.execute("SELECT PrecioCompra_Paq FROM Paquete WHERE Id_Paquete = ?", (id_paquete,))
-    paquete = cursor.fetchone()
-    if not paquete:
+    # Verificar que existen
+    if repo.paquetes.existentes({id_paquete for id_paquete, _ in items}) != {id_paquete for id_paquete, _ in items}:
         flash('Producto no encontrado')
-        cursor.close()
         conn.close()
         return redirect(url_for('carrito', id_compra=id_compra))
 
-    # Revisar si ya existe en carrito
-    cursor.execute("""
-        SELECT Id_DetalleDeCompra, Cantidad 
-        FROM DetallesDeCompras 
-        WHERE Id_Compra = ? AND Id_Paquete = ?
-    """, (id_compra, id_paquete))
-    detalle = cursor.fetchone()
-    if detalle:
-        nueva_cantidad = detalle[1] + cantidad
-        cursor.execute("UPDATE DetallesDeCompras SET Cantidad = ? WHERE Id_DetalleDeCompra = ?", (nueva_cantidad, detalle[0]))
-    else:
-        cursor.execute("""
-            INSERT INTO DetallesDeCompras (Id_Compra, Id_Paquete, Cantidad)
-            VALUES (?, ?, ?)
-        """, (id_compra, id_paquete, cantidad))
+    # Los que ya están en el carrito suman cantidad, el resto se inserta
+    repo.detalles_compra.agregar_lote(id_compra, items)
 
     conn.commit()
-    cursor.close()
     conn.close()
 
     flash('Producto agregado al carrito')
@@ -1293,12 +1268,9 @@ def agregar_al_carrito(id_compra):
 @app.route('/carrito/<int:id_compra>/eliminar/<int:id_detalle>', methods=['GET'])
 @login_requerido
 def eliminar_detalle(id_compra, id_detalle):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM DetallesDeCompras WHERE Id_DetalleDeCompra = ?", (id_detalle,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn:
+        Repositorio(conn).detalles_compra.eliminar(id_detalle)
+        conn.commit()
 
     flash('Producto eliminado del carrito')
     return redirect(url_for('carrito', id_compra=id_compra))
@@ -1307,52 +1279,27 @@ def eliminar_detalle(id_compra, id_detalle):
 # -----------------------
 @app.route('/carrito/<int:id_compra>/finalizar', methods=['GET'])
 @login_requerido
+@presupuesto_consultas(4)
 def finalizar_compra(id_compra):
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
     try:
         # Ejecutar el procedimiento para obtener el total
-        cursor.execute("EXEC ObtenerTotalFactura @Id_Compra = ?", (id_compra,))
-        resultado = cursor.fetchone()
+        total = repo.compras.total(id_compra)
 
-        if resultado is None or resultado[1] is None:
+        if total is None:
             flash('No se puede finalizar una compra sin productos')
             return redirect(url_for('carrito', id_compra=id_compra))
 
-        total = float(resultado[1])  # resultado[1] es el total
-
         # Verificar que hay productos
-        cursor.execute("SELECT COUNT(*) FROM DetallesDeCompras WHERE Id_Compra = ?", (id_compra,))
-        count_detalles = cursor.fetchone()[0]
+        count_detalles = repo.detalles_compra.contar(id_compra)
         if count_detalles == 0:
             flash('No hay productos en el carrito')
             return redirect(url_for('carrito', id_compra=id_compra))
 
-        # Depuración: Ver PaquetesCompletos e Inventario antes
-        cursor.execute("SELECT p.Id_Paquete, p.Descripcion, p.PaquetesCompletos, p.Inventario FROM Paquete p INNER JOIN DetallesDeCompras dc ON p.Id_Paquete = dc.Id_Paquete WHERE dc.Id_Compra = ?", (id_compra,))
-        estado_antes = cursor.fetchall()
-        print(f"Estado ANTES de finalizar compra {id_compra}: {estado_antes}")
-
         # Llamar al SP para actualizar PaquetesCompletos (trigger recalculará Inventario)
-        cursor.execute("EXEC FinalizarCompraSumarInventario @Id_Compra = ?", (id_compra,))
-        print(f"SP ejecutado para compra {id_compra} (actualizó PaquetesCompletos)")
-
-        # Depuración: Ver PaquetesCompletos e Inventario después
-        cursor.execute("SELECT p.Id_Paquete, p.Descripcion, p.PaquetesCompletos, p.Inventario FROM Paquete p INNER JOIN DetallesDeCompras dc ON p.Id_Paquete = dc.Id_Paquete WHERE dc.Id_Compra = ?", (id_compra,))
-        estado_despues = cursor.fetchall()
-        print(f"Estado DESPUÉS de finalizar compra {id_compra}: {estado_despues}")
-
-        # Comparar para confirmar cambios
-        cambios = []
-        for antes, despues in zip(estado_antes, estado_despues):
-            if antes[2] != despues[2] or antes[3] != despues[3]:  # PaquetesCompletos o Inventario cambió
-                cambios.append(f"Paquete {despues[0]} ({despues[1]}): PaquetesCompletos {antes[2]} -> {despues[2]}, Inventario {antes[3]} -> {despues[3]}")
-        if cambios:
-            print(f"Cambios detectados: {cambios}")
-        else:
-            print("No se detectaron cambios")
-
+        repo.compras.finalizar(id_compra, total)
         conn.commit()  # Confirmar cambios
 
         flash(f'Compra finalizada correctamente. Total: C${total:.2f}')
@@ -1364,7 +1311,6 @@ def finalizar_compra(id_compra):
         flash('Error al finalizar la compra')
         return redirect(url_for('carrito', id_compra=id_compra))
     finally:
-        cursor.close()
         conn.close()
 
 # -----------------------
@@ -1374,20 +1320,18 @@ def finalizar_compra(id_compra):
 @login_requerido
 def cancelar_compra(id_compra):
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
     # Verificar si tiene detalles
-    cursor.execute("SELECT COUNT(*) FROM DetallesDeCompras WHERE Id_Compra = ?", (id_compra,))
-    tiene_detalles = cursor.fetchone()[0]
+    tiene_detalles = repo.detalles_compra.contar(id_compra)
 
     if tiene_detalles > 0:
         flash('No se puede cancelar, la compra ya tiene productos')
     else:
-        cursor.execute("DELETE FROM Compras WHERE Id_Compra = ?", (id_compra,))
+        repo.compras.eliminar(id_compra)
         conn.commit()
         flash('Compra cancelada correctamente')
 
-    cursor.close()
     conn.close()
     return redirect(url_for('ver_compras'))
 
@@ -1397,18 +1341,13 @@ def cancelar_compra(id_compra):
 @app.route('/carrito/<int:id_compra>/cancelar_exit', methods=['POST'])
 def cancelar_compra_exit(id_compra):
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Verificar si la compra tiene productos
-    cursor.execute("SELECT COUNT(*) FROM DetallesDeCompras WHERE Id_Compra = ?", (id_compra,))
-    tiene_detalles = cursor.fetchone()[0]
+    repo = Repositorio(conn)
 
-    # Solo borrar si está vacía
-    if tiene_detalles == 0:
-        cursor.execute("DELETE FROM Compras WHERE Id_Compra = ?", (id_compra,))
+    # Solo borrar si la compra está vacía
+    if repo.detalles_compra.contar(id_compra) == 0:
+        repo.compras.eliminar(id_compra)
         conn.commit()
 
-    cursor.close()
     conn.close()
     return ('', 204)  # Sin contenido (no rompe la navegación)
 
@@ -1418,78 +1357,46 @@ def cancelar_compra_exit(id_compra):
 # -----------------------
 @app.route('/detalles_compras/<int:id_compra>', methods=['GET'])
 @login_requerido
+@solo_lectura
+@depende_de('Compras', 'DetallesDeCompras', 'Paquete')
+@presupuesto_consultas(4)
 def detalles_compras(id_compra):
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
     # Traer la compra
-    cursor.execute("""
-        SELECT Id_Compra, FechaDeCompra, Id_Proveedor
-        FROM Compras 
-        WHERE Id_Compra = ?
-    """, (id_compra,))
-    compra = cursor.fetchone()
+    compra = repo.compras.obtener(id_compra)
 
     if not compra:
         flash('Compra no encontrada', 'error')
-        cursor.close()
         conn.close()
         return redirect(url_for('ver_compras'))
 
     # Traer detalles de la compra
-    cursor.execute('''
-        SELECT 
-            p.Descripcion AS Producto, 
-            dc.Cantidad, 
-            dc.PrecioAntDes, 
-            dc.TotalAntDes, 
-            dc.DescuentoTotal, 
-            dc.TotalConDes, 
-            dc.TotalConIva
-        FROM DetallesDeCompras dc
-        JOIN Paquete p ON dc.Id_Paquete = p.Id_Paquete
-        WHERE dc.Id_Compra = ?
-    ''', (id_compra,))
-    detalles = cursor.fetchall()
-
-    cursor.close()
+    detalles = repo.detalles_compra.detalles(id_compra)
+
     conn.close()
 
-    return render_template('Compras/detalles_compra.html', compra=compra, detalles=detalles)
+    return render_pagina('Compras/detalles_compra.html', compra=compra, detalles=detalles)
 
 
 # Nomina
 @app.route('/ver_nomina', methods=['GET', 'POST'])
 @login_requerido
+@solo_lectura
+@presupuesto_consultas(2)
 def ver_nomina():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # Obtener todos los empleados activos para el select
-    cursor.execute('''
-        SELECT 
-            Id_Empleado,
-            PNombre, SNombre, PApellido, SApellido,
-            Estado
-        FROM Empleado 
-        WHERE Papelera = 0 AND Estado = 'Activo'
-        ORDER BY PNombre, PApellido
-    ''')
-    
-    columnas = [col[0] for col in cursor.description]
-    empleados_raw = cursor.fetchall()
-    empleados = []
-    
-    for emp_raw in empleados_raw:
-        emp = dict(zip(columnas, emp_raw))
+    with get_db_connection() as conn:
+        empleados = Repositorio(conn).empleados.activos()
+
+    for emp in empleados:
         # Combinar nombres y apellidos
         nombres = f"{emp.get('PNombre', '')} {emp.get('SNombre', '')}".strip()
         apellidos = f"{emp.get('PApellido', '')} {emp.get('SApellido', '')}".strip()
         emp['Nombres'] = nombres
         emp['Apellidos'] = apellidos
-        empleados.append(emp)
 
-    conn.close()
     return render_template_ajax('Empleados/ver_nomina.html', empleados=empleados)
 
 
@@ -1508,13 +1415,9 @@ def crear_nota(id):
             return redirect(url_for('crear_nota'))
         
         conn = get_db_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO Notas (Asunto, FechaDelAsunto, Id_Empleado)
-                VALUES (?, ?, ?)
-            ''', (asunto, fecha, id))
+            Repositorio(conn).notas.crear(asunto, fecha, id)
             
             conn.commit()
             conn.close()
@@ -1527,34 +1430,15 @@ def crear_nota(id):
             return redirect(url_for('crear_nota', id=id))
     
     # GET - Mostrar página con notas existentes
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-
-    
     # Obtener todas las notas del empleado actual
-    cursor.execute('''
-        SELECT n.Id_Nota, n.Asunto, n.FechaDelAsunto, n.Id_Empleado,
-               e.PNombre, e.SNombre, e.PApellido, e.SApellido, n.Estado
-        FROM Notas n
-        LEFT JOIN Empleado e ON n.Id_Empleado = e.Id_Empleado
-        WHERE n.Id_Empleado = ?
-        ORDER BY n.FechaDelAsunto DESC, n.Id_Nota DESC
-    ''', (id,))
-    
-    columnas = [col[0] for col in cursor.description]
-    notas_raw = cursor.fetchall()
-    notas = []
-    
-    for nota_raw in notas_raw:
-        nota = dict(zip(columnas, nota_raw))
+    with get_db_connection() as conn:
+        notas = Repositorio(conn).notas.de_empleado(id)
+
+    for nota in notas:
         # Combinar nombre del empleado
         nombres = f"{nota.get('PNombre', '')} {nota.get('SNombre', '')}".strip()
         apellidos = f"{nota.get('PApellido', '')} {nota.get('SApellido', '')}".strip()
         nota['nombre_empleado'] = f"{nombres} {apellidos}".strip()
-        notas.append(nota)
-    
-    conn.close()
     
     # Fecha actual para el formulario
     from datetime import date
@@ -1570,20 +1454,17 @@ def marcar_nota():
     completada = data.get('completada', False)
     
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
     
     try:
         # Verificar que la nota existe
-        cursor.execute('SELECT Id_Empleado FROM Notas WHERE Id_Nota = ?', (nota_id,))
-        nota = cursor.fetchone()
-        
-        if not nota:
+        if not repo.notas.existe(nota_id):
             conn.close()
             return jsonify({'success': False, 'message': 'Nota no encontrada'})
         
         # Actualizar el estado en la columna Estado
         nuevo_estado = 'Completada' if completada else 'Pendiente'
-        cursor.execute('UPDATE Notas SET Estado = ? WHERE Id_Nota = ?', (nuevo_estado, nota_id))
+        repo.notas.cambiar_estado(nota_id, nuevo_estado)
         
         conn.commit()
         conn.close()
@@ -1600,19 +1481,16 @@ def eliminar_nota():
     nota_id = data.get('nota_id')
     
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
     
     try:
         # Verificar que la nota existe
-        cursor.execute('SELECT Id_Empleado FROM Notas WHERE Id_Nota = ?', (nota_id,))
-        nota = cursor.fetchone()
-        
-        if not nota:
+        if not repo.notas.existe(nota_id):
             conn.close()
             return jsonify({'success': False, 'message': 'Nota no encontrada'})
         
         # Eliminar la nota
-        cursor.execute('DELETE FROM Notas WHERE Id_Nota = ?', (nota_id,))
+        repo.notas.eliminar(nota_id)
         conn.commit()
         conn.close()
         
@@ -1626,7 +1504,7 @@ def eliminar_nota():
 @login_requerido
 def crear_empleado():
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
     if request.method == 'POST':
         primer_nombre = request.form['primer_nombre']
@@ -1651,22 +1529,17 @@ def crear_empleado():
         salarioBase = request.form['salarioBase'] or 0
         supervisor = request.form['supervisor'] or None
 
-        cursor.execute('''
-            INSERT INTO Empleado (PNombre, SNombre, PApellido, SApellido, NumCedula, EstadoCivil, Sexo, 
-                                 FechaDeNacimiento, FechaDeInicioContrato, FechaDeFinContrato, Direccion, 
-                                 NumInss, RUC, SalarioBase, Supervisor, Estado)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (primer_nombre, segundo_nombre, primer_apellido, segundo_apellido, cedula, estado_civil, sexo,
+        repo.empleados.crear((primer_nombre, segundo_nombre, primer_apellido, segundo_apellido, cedula, estado_civil, sexo,
               fecha_nacimiento, fecha_inicontrato, fecha_fincontrato, direccion, num_inss, num_ruc, salarioBase, supervisor, estado))
         conn.commit()
         conn.close()
+        directorio_empleados.invalidar()
         
         flash('Empleado creado exitosamente.', 'success')
         return redirect(url_for('ver_empleados'))
 
     # Obtener supervisores para el combo
-    cursor.execute('SELECT Id_Empleado, PNombre, SNombre, PApellido, SApellido FROM Empleado WHERE Papelera = 0')
-    supervisores_raw = cursor.fetchall()
+    supervisores_raw = repo.empleados.supervisores()
     
     # Procesar supervisores
     supervisores = []
@@ -1688,71 +1561,28 @@ def crear_empleado():
 
 @app.route('/empleados', methods=['GET'])
 @login_requerido
+@solo_lectura
+@depende_de('Empleado')
+@presupuesto_consultas(3)
 def ver_empleados():
     busqueda = request.args.get('busqueda', '').strip()
-    conn = get_db_connection()
-    cursor = conn.cursor()
 
-    # Buscar empleados
-    if busqueda:
-        cursor.execute('''
-            SELECT 
-                e.Id_Empleado,
-                e.PNombre,
-                e.SNombre,
-                e.PApellido,
-                e.SApellido,
-                e.FechaDeNacimiento,
-                e.FechaDeInicioContrato,
-                e.FechaDeFinContrato AS FechaDeFinContrato,
-                e.Direccion,
-                e.Estado,
-                s.PNombre AS SupervisorPNombre,
-                s.SNombre AS SupervisorSNombre,
-                s.PApellido AS SupervisorPApellido,
-                s.SApellido AS SupervisorSApellido,
-                e.NumCedula,
-                e.EstadoCivil,
-                e.Sexo,
-                e.NumInss,
-                e.RUC,
-                e.SalarioBase
-            FROM Empleado e
-            LEFT JOIN Empleado s ON e.Supervisor = s.Id_Empleado
-            WHERE (e.PNombre LIKE ? OR e.SNombre LIKE ? OR e.PApellido LIKE ? OR e.SApellido LIKE ? OR e.Direccion LIKE ?) AND e.Papelera = 0
-            ORDER BY e.Id_Empleado ASC
-        ''', (f'%{busqueda}%', f'%{busqueda}%', f'%{busqueda}%', f'%{busqueda}%', f'%{busqueda}%'))
-    else:
-        cursor.execute('''
-            SELECT 
-                e.Id_Empleado,
-                e.PNombre,
-                e.SNombre,
-                e.PApellido,
-                e.SApellido,
-                e.FechaDeNacimiento,
-                e.FechaDeInicioContrato,
-                e.FechaDeFinContrato AS FechaDeFinContrato,
-                e.Direccion,
-                e.Estado,
-                s.PNombre AS SupervisorPNombre,
-                s.SNombre AS SupervisorSNombre,
-                s.PApellido AS SupervisorPApellido,
-                s.SApellido AS SupervisorSApellido,
-                e.NumCedula,
-                e.EstadoCivil,
-                e.Sexo,
-                e.NumInss,
-                e.RUC,
-                e.SalarioBase
-            FROM Empleado e
-            LEFT JOIN Empleado s ON e.Supervisor = s.Id_Empleado
-            WHERE e.Papelera = 0
-            ORDER BY e.Id_Empleado ASC
-        ''')
-
-    columnas = [col[0] for col in cursor.description]
-    empleados = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+    # Buscar empleados en el directorio en memoria (solo va a la base si no
+    # está cargado)
+    empleados = directorio_empleados.listar(cargar_empleados, busqueda)
+
+    return render_template_ajax(
+        'Empleados/empleados.html',
+        empleados=empleados,
+        busqueda=busqueda
+    )
+
+
+def cargar_empleados():
+    """Lista de empleados ya proyectada para el directorio (nombres, supervisor, edad)"""
+    with get_db_connection() as conn:
+        empleados = Repositorio(conn).empleados.listar()
+
     for emp in empleados:
         # Combinar nombres y apellidos
         nombres = f"{emp.get('PNombre', '')} {emp.get('SNombre', '')}".strip()
@@ -1771,44 +1601,26 @@ def ver_empleados():
         emp['FechaDeContrato'] = emp.get('FechaDeInicioContrato', '')
         emp['FechaDeFinContrato'] = emp.get('FechaDeFinContrato', '')
 
-    conn.close()
-    return render_template_ajax(
-        'Empleados/empleados.html',
-        empleados=empleados,
-        busqueda=busqueda
-    )
+    return empleados
 
 
 @app.route('/editar_empleado/<int:id>', methods=['GET', 'POST'])
 @login_requerido
+@presupuesto_consultas(4)
 def editar_empleado(id):
     conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = Repositorio(conn)
 
-    # Obtener el empleado usando consulta explícita para asegurar todas las columnas
-    cursor.execute('''
-        SELECT Id_Empleado, PNombre, SNombre, PApellido, SApellido, EstadoCivil, Sexo, 
-               FechaDeNacimiento, FechaDeInicioContrato, FechaDeFinContrato, RUC, SalarioBase,
-               NumCedula, NumInss, Estado, Direccion, Supervisor, Papelera
-        FROM Empleado 
-        WHERE Id_Empleado = ? AND Papelera = 0
-    ''', (id,))
-    empleado_raw = cursor.fetchone()
+    # Obtener el empleado como diccionario con nombres de columna explícitos
+    empleado = repo.empleados.obtener(id)
 
     # Obtener supervisores para el combo (excluyendo el mismo empleado)
-    cursor.execute('SELECT Id_Empleado, PNombre, SNombre, PApellido, SApellido FROM Empleado WHERE Id_Empleado != ? AND Papelera = 0', (id,))
-    supervisores_raw = cursor.fetchall()
+    supervisores_raw = repo.empleados.supervisores(excluir=id)
 
-    if not empleado_raw:
+    if not empleado:
         conn.close()
         flash('Empleado no encontrado.', 'danger')
         return redirect(url_for('ver_empleados'))
-
-    # Convertir empleado a diccionario usando nombres de columna explícitos
-    columnas = ['Id_Empleado', 'PNombre', 'SNombre', 'PApellido', 'SApellido', 'EstadoCivil', 'Sexo', 
-                'FechaDeNacimiento', 'FechaDeInicioContrato', 'FechaDeFinContrato', 'RUC', 'SalarioBase',
-                'NumCedula', 'NumInss', 'Estado', 'Direccion', 'Supervisor', 'Papelera']
-    empleado = dict(zip(columnas, empleado_raw))
     
     # Combinar nombres y apellidos para el empleado
     empleado['Nombres'] = f"{empleado.get('PNombre', '')} {empleado.get('SNombre', '')}".strip()
@@ -1845,16 +1657,11 @@ def editar_empleado(id):
         num_ruc = request.form['num2']
         salarioBase = request.form['salarioBase'] or 0
         supervisor = request.form['supervisor'] or None
-        cursor.execute('''
-            UPDATE Empleado
-            SET PNombre=?, SNombre=?, PApellido=?, SApellido=?, NumCedula=?, EstadoCivil=?, Sexo=?, 
-                FechaDeNacimiento=?, FechaDeInicioContrato=?, FechaDeFinContrato=?, Direccion=?, 
-                NumInss=?, RUC=?, SalarioBase=?, Supervisor=?, Estado=?
-            WHERE Id_Empleado=?
-        ''', (primer_nombre, segundo_nombre, primer_apellido, segundo_apellido, cedula, estado_civil, sexo,
-              fecha_nacimiento, fecha_inicontrato, fecha_fincontrato, direccion, num_inss, num_ruc, salarioBase, supervisor, estado, id))
+        repo.empleados.actualizar(id, (primer_nombre, segundo_nombre, primer_apellido, segundo_apellido, cedula, estado_civil, sexo,
+              fecha_nacimiento, fecha_inicontrato, fecha_fincontrato, direccion, num_inss, num_ruc, salarioBase, supervisor, estado))
         conn.commit()
         conn.close()
+        directorio_empleados.invalidar()
         flash('Empleado actualizado exitosamente.', 'success')
         return redirect(url_for('ver_empleados'))
 
@@ -1865,51 +1672,31 @@ def editar_empleado(id):
 #Ganancia Diaria
 @app.route('/ganancia_diaria')
 @login_requerido
+@solo_lectura
+@depende_de('GananciaDiaria', 'Venta')
+@presupuesto_consultas(4)
 def ganancia_diaria():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Traer todas las ganancias
-    cursor.execute('''
-        SELECT gd.Id_Venta, gd.Fecha, gd.TotalVenta, gd.GananciaCalculada
-        FROM GananciaDiaria gd
-        WHERE gd.Papelera = 0
-        ORDER BY gd.Id_Venta ASC
-    ''')
-    ganancias = cursor.fetchall()
-
-    # Obtener ventas disponibles para mostrar o calcular
-    cursor.execute('SELECT Id_Venta FROM Venta WHERE Papelera = 0 ORDER BY Id_Venta ASC')
-    ventas = cursor.fetchall()
+    with get_db_connection() as conn:
+        repo = Repositorio(conn)
+        # Traer todas las ganancias
+        ganancias = repo.ganancias.listar()
+        # Obtener ventas disponibles para mostrar o calcular
+        ventas = repo.ventas.ids()
 
     fechas = [row.Fecha.strftime('%Y-%m-%d') for row in ganancias if row.GananciaCalculada is not None]
     valores = [float(row.GananciaCalculada) for row in ganancias if row.GananciaCalculada is not None]
 
-    conn.close()
-
-    if is_ajax_request():
-        rendered = render_template('Ventas/ganancia_diaria.html', ganancias=ganancias, ventas=ventas, fechas=fechas, valores=valores)
-        soup = BeautifulSoup(rendered, 'html.parser')
-        content = soup.find('div', class_='content')
-        modals = soup.find(attrs={'data-modals': True})
-
-        return jsonify({
-            'content': content.prettify() if content else '',
-            'modals': modals.prettify() if modals else '',
-            'fechas': fechas,
-            'valores': valores
-        })
-    else:
-        return render_template('Ventas/ganancia_diaria.html', ganancias=ganancias, ventas=ventas, fechas=fechas, valores=valores)
+    # En AJAX fechas y valores también van aparte: el gráfico los lee del JSON
+    return render_template_ajax('Ventas/ganancia_diaria.html', {'fechas': fechas, 'valores': valores},
+                                ganancias=ganancias, ventas=ventas, fechas=fechas, valores=valores)
 
 
 @app.route('/calcular_ganancia/<int:id_venta>', methods=['POST'])
 @login_requerido
 def calcular_ganancia(id_venta):
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('EXEC CalcularGananciaDiaria ?', (id_venta,))
+        Repositorio(conn).ganancias.calcular(id_venta)
         conn.commit()
         flash(f'Ganancia calculada para venta #{id_venta}', 'success')
     except Exception as e:
@@ -1931,11 +1718,11 @@ def debug_recuerdame():
     for cookie_name in request.cookies:
         all_cookies[cookie_name] = request.cookies[cookie_name]
 
-    # Información específica de cookies de recuerdame
+    # Información específica de la cookie de recuerdame
+    token = request.cookies.get(NOMBRE_COOKIE)
     cookies_info = {
-        'recuerdame_usuario': request.cookies.get('recuerdame_usuario', 'NO EXISTE'),
-        'recuerdame_tipo': request.cookies.get('recuerdame_tipo', 'NO EXISTE'),
-        'recuerdame_user_id': request.cookies.get('recuerdame_user_id', 'NO EXISTE'),
+        NOMBRE_COOKIE: token or 'NO EXISTE',
+        'verificacion': tokens_recuerdame.estadisticas(),
     }
 
     # Información de sesión
@@ -1946,26 +1733,17 @@ def debug_recuerdame():
         'session_keys': list(session.keys()),
     }
 
-    # Verificar usuario en BD si hay cookies
+    # Verificar el token (en memoria, contra la copia de la tabla Usuario)
     db_status = "No hay cookies para verificar"
-    if cookies_info['recuerdame_usuario'] != 'NO EXISTE':
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT Id_Usuario, NUsuario, Tipo FROM Usuario WHERE NUsuario = ?',
-                         (cookies_info['recuerdame_usuario'],))
-            user_from_db = cursor.fetchone()
-            conn.close()
-
-            if user_from_db:
-                db_status = f"✅ Usuario encontrado en BD: ID={user_from_db[0]}, Usuario={user_from_db[1]}, Tipo={user_from_db[2]}"
-            else:
-                db_status = "❌ Usuario NO encontrado en base de datos"
-        except Exception as e:
-            db_status = f"❌ Error al consultar BD: {e}"
+    user_from_token = tokens_recuerdame.verificar(token) if token else None
+    if token:
+        if user_from_token:
+            db_status = f"✅ Token válido: ID={user_from_token[0]}, Usuario={user_from_token[1]}, Tipo={user_from_token[2]}"
+        else:
+            db_status = "❌ Token inválido, vencido o revocado"
 
     # Estado general
-    has_valid_cookies = all(cookie != 'NO EXISTE' for cookie in cookies_info.values())
+    has_valid_cookies = user_from_token is not None
     has_session = session_info['usuario'] != 'NO EXISTE'
 
     status_message = ""
@@ -2004,7 +1782,7 @@ def debug_recuerdame():
             <div class="section info">
                 <h2>🍪 Cookies de "Recuérdame"</h2>
                 <pre>{cookies_info}</pre>
-                <p><strong>Estado:</strong> {'✅ Cookies completas' if has_valid_cookies else '❌ Cookies incompletas'}</p>
+                <p><strong>Estado:</strong> {'✅ Token válido' if has_valid_cookies else '❌ Sin token válido'}</p>
             </div>
 
             <div class="section info">
@@ -2014,7 +1792,7 @@ def debug_recuerdame():
             </div>
 
             <div class="section info">
-                <h2>🗄️ Verificación en Base de Datos</h2>
+                <h2>🗄️ Verificación del Token</h2>
                 <p>{db_status}</p>
             </div>
 
@@ -2048,6 +1826,52 @@ def debug_recuerdame():
     </html>
     """
 
+# Estadísticas del pool de conexiones del worker actual
+@app.route('/debug_pool')
+@login_requerido
+def debug_pool():
+    return jsonify(estadisticas_pools())
+
+# Aciertos/fallos de las cachés en memoria de este worker
+@app.route('/debug_caches')
+@login_requerido
+def debug_caches():
+    return jsonify({
+        'catalogo_paquetes': PaqueteRepo.estadisticas_catalogo(),
+        'layout_base': paginas.estadisticas(),
+        'versiones_datos': versiones_observadas.estadisticas(),
+        'estaticos': estaticos.estadisticas(),
+        'imagenes_productos': imagenes_productos.estadisticas(),
+        'compresion': compresion.estadisticas(),
+    })
+
+# Último barrido de imágenes huérfanas; ?simular=1 hace uno ahora sin borrar
+@app.route('/debug_imagenes_huerfanas')
+@login_requerido
+def debug_imagenes_huerfanas():
+    if request.args.get('simular'):
+        try:
+            reporte = barredor_imagenes.barrer(simular=True)
+        except ERRORES_BD as e:
+            return jsonify({'error': str(e)}), 503
+    else:
+        reporte = barredor_imagenes.ultimo_reporte
+    return jsonify({'estadisticas': barredor_imagenes.estadisticas(), 'reporte': reporte})
+
+# Buzón de salida de correos: envíos de este worker y pendientes en la tabla
+@app.route('/debug_correos')
+@login_requerido
+def debug_correos():
+    with conexion_bd() as conn:
+        estados = Repositorio(conn).correos.conteo_por_estado()
+    return jsonify({'worker': buzon_correo.estadisticas(), 'tabla': estados})
+
+# Consultas de las últimas peticiones atendidas por este worker
+@app.route('/debug_consultas')
+@login_requerido
+def debug_consultas():
+    return jsonify(resumenes_recientes())
+
 #Ejecucion
 
 if __name__ == '__main__':
@@ -2060,4 +1884,5 @@ if __name__ == '__main__':
     print("   5. Vuelve a abrir y ve directamente a cualquier pagina")
     print("   6. Deberias estar logueado automaticamente")
     print("   7. Ve a /debug_recuerdame para verificar el estado detallado")
+    calentar_caches()
     app.run(host='0.0.0.0', debug=True)
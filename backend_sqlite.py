@@ -0,0 +1,418 @@
+"""
+Backend SQLite para correr MiniBodega sin Azure SQL.
+
+Sirve para desarrollo sin conexión, pruebas de carga y perfilado con datos
+reproducibles. Se activa con:
+
+    DB_BACKEND=sqlite SQLITE_PATH=minibodega.db python app.py
+
+La capa de datos (repositorio.py) sigue escribiendo T-SQL; la conexión de
+este módulo traduce las pocas construcciones propias de SQL Server que usa
+(`TOP n`, `OFFSET ... FETCH NEXT`, `OUTPUT INSERTED`) y emula en Python los
+procedimientos almacenados que se invocan con `EXEC`. Los triggers de
+schema_sqlite.sql replican los campos calculados por la base real.
+
+Crear y poblar una base de prueba:
+
+    python backend_sqlite.py minibodega.db --sembrar
+"""
+import argparse
+import base64
+import os
+import random
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+RUTA_ESQUEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_sqlite.sql')
+
+
+# -----------------------
+# Tipos: fechas como en pyodbc (datetime / date), no como texto
+# -----------------------
+def _convertir_datetime(valor):
+    texto = valor.decode()
+    for formato in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    return texto
+
+
+def _convertir_date(valor):
+    texto = valor.decode()
+    try:
+        return datetime.strptime(texto[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return texto or None
+
+
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(' '))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter('DATETIME', _convertir_datetime)
+sqlite3.register_converter('DATE', _convertir_date)
+
+
+# -----------------------
+# Filas con acceso por atributo, como pyodbc.Row
+# -----------------------
+class Fila(tuple):
+    """Tupla con acceso `fila.Columna` (sin distinguir mayúsculas, como SQL Server)"""
+    __slots__ = ()
+    _indices = {}
+    cursor_description = ()
+
+    def __getattr__(self, nombre):
+        try:
+            return self[self._indices[nombre.lower()]]
+        except KeyError:
+            raise AttributeError(nombre) from None
+
+
+@lru_cache(maxsize=512)
+def _clase_fila(columnas):
+    indices = {nombre.lower(): i for i, nombre in enumerate(columnas)}
+    description = tuple((nombre, None, None, None, None, None, None) for nombre in columnas)
+    return type('Fila', (Fila,), {'__slots__': (), '_indices': indices, 'cursor_description': description})
+
+
+def _fabrica_filas(cursor, fila):
+    return _clase_fila(tuple(col[0] for col in cursor.description))(fila)
+
+
+# -----------------------
+# Traducción de T-SQL
+# -----------------------
+_RE_TOP = re.compile(r'^(\s*SELECT\s+)TOP\s*\(?\s*(\d+)\s*\)?\s+', re.I)
+_RE_OFFSET = re.compile(r'\bOFFSET\s+\?\s+ROWS\s+FETCH\s+NEXT\s+\?\s+ROWS\s+ONLY\s*;?\s*$', re.I)
+_RE_OUTPUT = re.compile(r'\s+OUTPUT\s+INSERTED\.(\w+)\s+', re.I)
+_RE_EXEC = re.compile(r'^\s*EXEC(?:UTE)?\s+(\w+)\s*(.*?)\s*;?\s*$', re.I | re.S)
+
+
+@lru_cache(maxsize=1024)
+def traducir(sql):
+    """
+    Devuelve (sql_sqlite, invertir_paginacion). Si `invertir_paginacion` es
+    True los dos últimos parámetros (offset, limit) deben pasarse como
+    (limit, offset).
+    """
+    invertir = False
+    m = _RE_TOP.match(sql)
+    if m:
+        sql = m.group(1) + sql[m.end():]
+        sql = sql.rstrip().rstrip(';') + f' LIMIT {m.group(2)}'
+    if _RE_OFFSET.search(sql):
+        sql = _RE_OFFSET.sub('LIMIT ? OFFSET ?', sql)
+        invertir = True
+    m = _RE_OUTPUT.search(sql)
+    if m:
+        sql = sql[:m.start()] + ' ' + sql[m.end():]
+        sql = sql.rstrip().rstrip(';') + f' RETURNING {m.group(1)}'
+    return sql, invertir
+
+
+# -----------------------
+# Procedimientos almacenados emulados
+# -----------------------
+def crear_compra(conn, id_proveedor):
+    """CrearCompra: inserta una compra abierta y devuelve su Id_Compra"""
+    id_compra = conn.execute('INSERT INTO Compras (Id_Proveedor) VALUES (?)', (id_proveedor,)).lastrowid
+    return ('Id_Compra',), [(id_compra,)]
+
+
+def obtener_total_factura(conn, id_compra):
+    """ObtenerTotalFactura: (Id_Compra, Total con IVA) o Total NULL si no hay productos"""
+    total = conn.execute('SELECT SUM(TotalConIVA) FROM DetallesDeCompras WHERE Id_Compra = ?', (id_compra,)).fetchone()[0]
+    return ('Id_Compra', 'Total'), [(id_compra, total)]
+
+
+def finalizar_compra_sumar_inventario(conn, id_compra):
+    """FinalizarCompraSumarInventario: suma lo comprado a PaquetesCompletos (el trigger recalcula Inventario)"""
+    conn.execute('''
+        UPDATE Paquete
+        SET PaquetesCompletos = PaquetesCompletos + (
+            SELECT SUM(dc.Cantidad) FROM DetallesDeCompras dc
+            WHERE dc.Id_Compra = ? AND dc.Id_Paquete = Paquete.Id_Paquete
+        )
+        WHERE Id_Paquete IN (SELECT Id_Paquete FROM DetallesDeCompras WHERE Id_Compra = ?)
+    ''', (id_compra, id_compra))
+    return None, None
+
+
+def calcular_ganancia_diaria(conn, id_venta):
+    """CalcularGananciaDiaria: (re)calcula la fila de GananciaDiaria de una venta"""
+    conn.execute('DELETE FROM GananciaDiaria WHERE Id_Venta = ?', (id_venta,))
+    conn.execute('''
+        INSERT INTO GananciaDiaria (Id_Venta, Fecha, TotalVenta, GananciaCalculada)
+        SELECT v.Id_Venta, v.Fecha, v.TotalVenta,
+               COALESCE((SELECT SUM(dv.CantidadVendidaTotal * (p.PrecioVenta_Paq - p.PrecioCompra_Paq))
+                         FROM DetalleVenta dv JOIN Paquete p ON p.Id_Paquete = dv.Id_Paquete
+                         WHERE dv.Id_Venta = v.Id_Venta AND dv.Papelera = 0), 0)
+        FROM Venta v
+        WHERE v.Id_Venta = ? AND v.Papelera = 0
+    ''', (id_venta,))
+    return None, None
+
+
+PROCEDIMIENTOS = {
+    'crearcompra': crear_compra,
+    'obtenertotalfactura': obtener_total_factura,
+    'finalizarcomprasumarinventario': finalizar_compra_sumar_inventario,
+    'calculargananciadiaria': calcular_ganancia_diaria,
+}
+
+
+# -----------------------
+# Conexión y cursor compatibles con la interfaz usada de pyodbc
+# -----------------------
+class CursorSQLite:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn.cursor()
+        self._resultado = None
+        self.description = None
+
+    def execute(self, sql, *params):
+        # pyodbc acepta execute(sql, (a, b)) y execute(sql, a, b)
+        if len(params) == 1 and isinstance(params[0], (tuple, list)):
+            params = tuple(params[0])
+        m = _RE_EXEC.match(sql)
+        if m:
+            return self._exec(m.group(1), params)
+        sql, invertir = traducir(sql)
+        if invertir:
+            params = (*params[:-2], params[-1], params[-2])
+        self._resultado = None
+        self._cursor.execute(sql, params)
+        self.description = self._cursor.description
+        return self
+
+    def executemany(self, sql, filas):
+        sql, _ = traducir(sql)
+        self._resultado = None
+        self._cursor.executemany(sql, filas)
+        self.description = None
+        return self
+
+    def _exec(self, nombre, params):
+        procedimiento = PROCEDIMIENTOS.get(nombre.lower())
+        if procedimiento is None:
+            raise sqlite3.OperationalError(f'Procedimiento no emulado: {nombre}')
+        columnas, filas = procedimiento(self._conn, *params)
+        if columnas is None:
+            self._resultado = []
+            self.description = None
+        else:
+            clase = _clase_fila(tuple(columnas))
+            self._resultado = [clase(f) for f in filas]
+            self.description = clase.cursor_description
+        return self
+
+    def fetchone(self):
+        if self._resultado is not None:
+            return self._resultado.pop(0) if self._resultado else None
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        if self._resultado is not None:
+            filas, self._resultado = self._resultado, []
+            return filas
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def nextset(self):
+        """SQLite devuelve un solo conjunto de resultados: descarta lo pendiente"""
+        if self._resultado is not None:
+            self._resultado = []
+        return False
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionSQLite:
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self):
+        return CursorSQLite(self._raw)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+
+def conectar(ruta):
+    uri = ruta.startswith('file:')
+    raw = sqlite3.connect(ruta, uri=uri, timeout=30, check_same_thread=False,
+                          detect_types=sqlite3.PARSE_DECLTYPES)
+    raw.row_factory = _fabrica_filas
+    raw.execute('PRAGMA foreign_keys = ON')
+    raw.execute('PRAGMA busy_timeout = 30000')
+    if not uri and ruta != ':memory:':
+        raw.execute('PRAGMA journal_mode = WAL')
+        raw.execute('PRAGMA synchronous = NORMAL')
+    return ConexionSQLite(raw)
+
+
+# Columnas agregadas después de crear el esquema: (tabla, columna, definición).
+# Equivalen a los scripts de migraciones/ para bases SQLite ya existentes.
+COLUMNAS_AGREGADAS = [
+    ('Compras', 'TotalFactura', 'REAL'),
+    ('Usuario', 'VersionContrasena', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+
+def crear_esquema(conn):
+    with open(RUTA_ESQUEMA, encoding='utf-8') as f:
+        conn._raw.executescript(f.read())
+    for tabla, columna, definicion in COLUMNAS_AGREGADAS:
+        existentes = {fila[1] for fila in conn._raw.execute(f'PRAGMA table_info({tabla})')}
+        if columna not in existentes:
+            conn._raw.execute(f'ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}')
+    conn.commit()
+
+
+class BackendSQLite:
+    """Backend para el pool de db.py: misma interfaz que BackendAzure"""
+    nombre = 'sqlite'
+    sql_ping = 'SELECT 1'
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._esquema_listo = False
+
+    def conectar(self):
+        conn = conectar(self.ruta)
+        if not self._esquema_listo:
+            crear_esquema(conn)
+            self._esquema_listo = True
+        return conn
+
+    @staticmethod
+    def es_transitorio(error):
+        return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+    @staticmethod
+    def es_en_pausa(error):
+        return False
+
+
+# -----------------------
+# Datos de prueba reproducibles
+# -----------------------
+# Descripciones que coinciden con las imágenes de static/Paquetes, para que
+# la limpieza de imágenes huérfanas no las borre al usar una base sembrada
+PRODUCTOS_BASE = [
+    ('355ml', 12), ('500ml', 12), ('Litro', 12), ('1.25 Litros', 12), ('2Litros cc', 6), ('3Litros cc', 6),
+    ('1/2Litro', 12), ('2Litros Sabor', 6), ('3Litros Sabor', 6), ('Té', 12), ('Té Litro', 12), ('2Litros Té', 6),
+    ('355ml Hic Té', 24), ('Hic', 24), ('Valle 500ml', 12), ('Valle 12 Onza', 24), ('3Litros Valle', 6),
+    ('500ml Fuze', 12), ('Power', 12), ('Fury Energy', 24), ('Alpina Litro', 12), ('Alpina 600ml', 12),
+    ('Alpina 2Litros', 6), ('Mini latas', 24), ('Lata', 24), ('Retornable', 24), ('12 Onzas', 24),
+    ('6.5 Onzas', 24), ('Litro Termo', 12),
+]
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carlos', 'Lucía', 'Pedro', 'Sofía', 'Jorge', 'Elena', 'Raúl', 'Marta']
+APELLIDOS = ['López', 'García', 'Martínez', 'Hernández', 'Pérez', 'Rodríguez', 'Gómez', 'Díaz', 'Ruiz', 'Castillo']
+
+
+def codificar_contrasena(contrasena):
+    """Misma codificación que login(): base64 de UTF-16LE"""
+    return base64.b64encode(contrasena.encode('utf-16le')).decode()
+
+
+def sembrar(conn, semilla=1234, paquetes=None, ventas=300, lineas_por_venta=4, compras=60, empleados=25, hoy=None):
+    """Pobla la base con datos deterministas para pruebas de carga"""
+    rnd = random.Random(semilla)
+    hoy = hoy or datetime.now().replace(microsecond=0)
+    raw = conn._raw
+
+    raw.execute("INSERT OR IGNORE INTO Usuario (NombreCompleto, NUsuario, Contraseña, Email, Tipo) VALUES (?, ?, ?, ?, ?)",
+                ('Administrador', 'admin', codificar_contrasena('admin'), 'admin@minibodega.local', 'Administrador'))
+    raw.execute("INSERT INTO Proveedor (NombreProveedor) VALUES ('Coca Cola FEMSA')")
+
+    productos = PRODUCTOS_BASE if paquetes is None else [
+        (PRODUCTOS_BASE[i % len(PRODUCTOS_BASE)][0] + (f' #{i // len(PRODUCTOS_BASE)}' if i >= len(PRODUCTOS_BASE) else ''),
+         PRODUCTOS_BASE[i % len(PRODUCTOS_BASE)][1])
+        for i in range(paquetes)
+    ]
+    for descripcion, tipo in productos:
+        compra = round(rnd.uniform(80, 600), 2)
+        raw.execute('''
+            INSERT INTO Paquete (Descripcion, TipoPaquete, UnidadesSobrantes, PaquetesCompletos, PrecioVenta_Paq, PrecioCompra_Paq)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (descripcion, tipo, rnd.randrange(tipo), rnd.randint(200, 2000), round(compra * 1.25, 2), compra))
+    ids_paquete = [f[0] for f in raw.execute('SELECT Id_Paquete FROM Paquete')]
+
+    for i in range(ventas):
+        fecha = hoy - timedelta(days=(ventas - i) * 90 // max(ventas, 1), minutes=rnd.randint(0, 600))
+        id_venta = raw.execute('INSERT INTO Venta (Fecha) VALUES (?) RETURNING Id_Venta', (fecha,)).fetchone()[0]
+        for id_paquete in rnd.sample(ids_paquete, min(lineas_por_venta, len(ids_paquete))):
+            raw.execute('INSERT INTO DetalleVenta (Id_Paquete, CantidadPaquetes, CantidadUnidades, Id_Venta) VALUES (?, ?, ?, ?)',
+                        (id_paquete, rnd.randint(0, 3), rnd.randint(0, 5), id_venta))
+
+    for i in range(compras):
+        fecha = hoy - timedelta(days=(compras - i) * 90 // max(compras, 1))
+        id_compra = raw.execute('INSERT INTO Compras (FechaDeCompra, Id_Proveedor) VALUES (?, 1) RETURNING Id_Compra', (fecha,)).fetchone()[0]
+        for id_paquete in rnd.sample(ids_paquete, min(3, len(ids_paquete))):
+            raw.execute('INSERT INTO DetallesDeCompras (Id_Compra, Id_Paquete, Cantidad) VALUES (?, ?, ?)',
+                        (id_compra, id_paquete, rnd.randint(1, 20)))
+
+    for i in range(empleados):
+        nacimiento = date(1970 + rnd.randint(0, 35), rnd.randint(1, 12), rnd.randint(1, 28))
+        inicio = date(2015 + rnd.randint(0, 9), rnd.randint(1, 12), 1)
+        raw.execute('''
+            INSERT INTO Empleado (PNombre, SNombre, PApellido, SApellido, NumCedula, EstadoCivil, Sexo,
+                                  FechaDeNacimiento, FechaDeInicioContrato, FechaDeFinContrato, Direccion,
+                                  NumInss, RUC, SalarioBase, Supervisor, Estado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (rnd.choice(NOMBRES), rnd.choice(NOMBRES), rnd.choice(APELLIDOS), rnd.choice(APELLIDOS),
+              f'001-{rnd.randint(100000, 999999)}-{rnd.randint(1000, 9999)}X', rnd.choice(['Soltero', 'Casado']),
+              rnd.choice(['M', 'F']), nacimiento, inicio, inicio + timedelta(days=730),
+              f'Barrio {rnd.choice(APELLIDOS)}, casa {rnd.randint(1, 300)}', str(rnd.randint(10 ** 7, 10 ** 8)),
+              f'J{rnd.randint(10 ** 9, 10 ** 10)}', round(rnd.uniform(8000, 25000), 2),
+              1 if i else None, rnd.choice(['Activo', 'Activo', 'Inactivo'])))
+        raw.execute('INSERT INTO Notas (Asunto, FechaDelAsunto, Id_Empleado) VALUES (?, ?, ?)',
+                    ('Revisar inventario', hoy.date(), i + 1))
+
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crea (y opcionalmente puebla) una base SQLite de MiniBodega')
+    parser.add_argument('ruta', nargs='?', default=os.environ.get('SQLITE_PATH', 'minibodega.db'))
+    parser.add_argument('--sembrar', action='store_true', help='insertar datos de prueba')
+    parser.add_argument('--semilla', type=int, default=1234)
+    parser.add_argument('--paquetes', type=int, default=None)
+    parser.add_argument('--ventas', type=int, default=300)
+    parser.add_argument('--compras', type=int, default=60)
+    parser.add_argument('--empleados', type=int, default=25)
+    args = parser.parse_args()
+
+    conn = conectar(args.ruta)
+    crear_esquema(conn)
+    if args.sembrar:
+        sembrar(conn, semilla=args.semilla, paquetes=args.paquetes, ventas=args.ventas,
+                compras=args.compras, empleados=args.empleados)
+    conn.close()
+    print(f"Base SQLite lista en {args.ruta}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""
+Índices de búsqueda en memoria.
+
+Paquetes: índice de trigramas sobre las descripciones.
+
+Reemplaza los `Descripcion LIKE '%texto%'` (recorrido completo de la tabla y
+sensibles a tildes según la intercalación) por un índice de trigramas por
+proceso:
+
+- sin tildes ni mayúsculas: "te lit" encuentra "Té Litro"
+- nunca pierde lo que encontraba el LIKE: toda descripción que contiene el
+  texto buscado ("ml" -> "355ml") está en el resultado, antes que el resto
+- tolerante a errores de tipeo: además se suman las que comparten la mayoría
+  de trigramas
+- con ranking: cobertura de trigramas + coincidencia exacta/prefijos
+- incremental: crear o editar un producto actualiza solo esa entrada
+
+Cada worker arma su índice la primera vez que se usa y lo vuelve a leer
+completo cada `TTL_INDICE` segundos para recoger cambios hechos en otros
+workers.
+
+Empleados: `DirectorioEmpleados` guarda la lista ya proyectada (nombre
+completo, supervisor, edad) y un índice de palabras sobre nombres, cédula y
+dirección. Con el directorio cargado, listar y buscar no tocan la base.
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import date
+
+TTL_INDICE = 300
+# Cobertura mínima de trigramas: el typeahead tolera errores de tipeo; los
+# filtros de los listados son más estrictos para no traer productos que solo
+# comparten una palabra ("te litro" no debe listar "Alpina Litro")
+UMBRAL_COBERTURA = 0.5
+UMBRAL_FILTRO = 0.7
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y solo letras/números separados por un espacio"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in texto).split())
+
+
+def trigramas(texto, prefijo_final=False):
+    """
+    Trigramas de cada palabra con relleno ('  te ', '  litro '). Con
+    `prefijo_final` la última palabra no lleva relleno al final, así lo que
+    se está escribiendo coincide como prefijo ("lit" -> "litro").
+    """
+    palabras = texto.split()
+    gramas = []
+    for i, palabra in enumerate(palabras):
+        final = '' if prefijo_final and i == len(palabras) - 1 else ' '
+        relleno = f'  {palabra}{final}'
+        gramas.extend(relleno[j:j + 3] for j in range(len(relleno) - 2))
+    return gramas
+
+
+class IndiceTrigramas:
+    def __init__(self):
+        self._textos = {}
+        self._originales = {}
+        self._activos = set()
+        self._postings = defaultdict(set)
+        self._lock = threading.RLock()
+        self.cargado_en = None
+
+    def __len__(self):
+        return len(self._textos)
+
+    @property
+    def max_id(self):
+        with self._lock:
+            return max(self._textos, default=0)
+
+    def construir(self, filas):
+        """Reemplaza el contenido con filas (id, descripcion, activo)"""
+        with self._lock:
+            self._textos.clear()
+            self._originales.clear()
+            self._activos.clear()
+            self._postings.clear()
+            for id_doc, descripcion, activo in filas:
+                self._agregar(id_doc, descripcion, activo)
+            self.cargado_en = time.monotonic()
+
+    def vencer(self):
+        """La próxima búsqueda vuelve a leer el índice completo"""
+        self.cargado_en = None
+
+    def actualizar(self, id_doc, descripcion, activo=True):
+        with self._lock:
+            self._quitar(id_doc)
+            self._agregar(id_doc, descripcion, activo)
+
+    def quitar(self, id_doc):
+        with self._lock:
+            self._quitar(id_doc)
+
+    def _agregar(self, id_doc, descripcion, activo):
+        texto = normalizar(descripcion)
+        self._textos[id_doc] = texto
+        self._originales[id_doc] = descripcion
+        if activo:
+            self._activos.add(id_doc)
+        for grama in set(trigramas(texto)):
+            self._postings[grama].add(id_doc)
+
+    def _quitar(self, id_doc):
+        texto = self._textos.pop(id_doc, None)
+        if texto is None:
+            return
+        self._originales.pop(id_doc, None)
+        self._activos.discard(id_doc)
+        for grama in set(trigramas(texto)):
+            ids = self._postings.get(grama)
+            if ids is not None:
+                ids.discard(id_doc)
+                if not ids:
+                    del self._postings[grama]
+
+    def buscar(self, consulta, limite=10, solo_activos=True, umbral=UMBRAL_COBERTURA):
+        """
+        Lista de (id, descripcion, puntaje): primero las descripciones que
+        contienen la consulta (como el LIKE '%texto%'), después las que solo
+        se parecen por trigramas; cada grupo de mejor a peor puntaje.
+        """
+        consulta = normalizar(consulta)
+        if not consulta:
+            return []
+        gramas = set(trigramas(consulta, prefijo_final=True))
+        palabras = consulta.split()
+        with self._lock:
+            coincidencias = Counter()
+            for grama in gramas:
+                for id_doc in self._postings.get(grama, ()):
+                    coincidencias[id_doc] += 1
+            # Las subcadenas que no empiezan palabra ("ml" en "355ml") no
+            # comparten trigramas con relleno: se buscan recorriendo los textos
+            for id_doc, texto in self._textos.items():
+                if consulta in texto and id_doc not in coincidencias:
+                    coincidencias[id_doc] = 0
+            resultados = []
+            for id_doc, cantidad in coincidencias.items():
+                if solo_activos and id_doc not in self._activos:
+                    continue
+                texto = self._textos[id_doc]
+                contiene = consulta in texto
+                cobertura = cantidad / len(gramas)
+                if cobertura < umbral and not contiene:
+                    continue
+                palabras_doc = texto.split()
+                prefijos = sum(1 for p in palabras if any(d.startswith(p) for d in palabras_doc)) / len(palabras)
+                puntaje = cobertura + 0.5 * prefijos + (0.5 if contiene else 0) - 0.002 * len(texto)
+                resultados.append((id_doc, self._originales[id_doc], round(puntaje, 4), contiene))
+        resultados.sort(key=lambda r: (not r[3], -r[2], r[1]))
+        resultados = [r[:3] for r in resultados]
+        return resultados[:limite] if limite else resultados
+
+    def ids(self, consulta, limite=500, solo_activos=True, umbral=UMBRAL_FILTRO):
+        """Ids que coinciden con la consulta, para filtrar un listado"""
+        return [r[0] for r in self.buscar(consulta, limite=limite, solo_activos=solo_activos, umbral=umbral)]
+
+
+# Índice de paquetes del proceso
+indice_paquetes = IndiceTrigramas()
+_carga_lock = threading.Lock()
+
+
+def asegurar_indice_paquetes(cargar):
+    """
+    Devuelve el índice de paquetes, armándolo con `cargar()` (filas id,
+    descripcion, activo) si aún no existe o si venció su TTL.
+    """
+    cargado_en = indice_paquetes.cargado_en
+    if cargado_en is None or time.monotonic() - cargado_en > TTL_INDICE:
+        with _carga_lock:
+            cargado_en = indice_paquetes.cargado_en
+            if cargado_en is None or time.monotonic() - cargado_en > TTL_INDICE:
+                indice_paquetes.construir(cargar())
+    return indice_paquetes
+
+
+class IndicePalabras:
+    """
+    Índice invertido de palabras normalizadas. Una consulta coincide con un
+    documento si cada una de sus palabras es prefijo de alguna palabra del
+    documento ("mar lop" -> "María López").
+    """
+
+    def __init__(self, documentos=()):
+        postings = defaultdict(set)
+        for id_doc, texto in documentos:
+            for palabra in set(normalizar(texto).split()):
+                postings[palabra].add(id_doc)
+        self._postings = dict(postings)
+        self._palabras = sorted(postings)
+
+    def _con_prefijo(self, prefijo):
+        ids = set()
+        i = bisect_left(self._palabras, prefijo)
+        while i < len(self._palabras) and self._palabras[i].startswith(prefijo):
+            ids |= self._postings[self._palabras[i]]
+            i += 1
+        return ids
+
+    def buscar(self, consulta):
+        """Conjunto de ids que coinciden con todas las palabras de la consulta"""
+        resultado = None
+        # Las palabras más largas primero: son las que más filtran
+        for palabra in sorted(set(normalizar(consulta).split()), key=len, reverse=True):
+            ids = self._con_prefijo(palabra)
+            resultado = ids if resultado is None else resultado & ids
+            if not resultado:
+                return set()
+        return resultado if resultado is not None else set()
+
+
+def _texto_empleado(emp):
+    cedula = emp.get('NumCedula') or ''
+    # La cédula se indexa por partes (001 010190 0001a) y completa sin guiones
+    return ' '.join(str(v or '') for v in (
+        emp.get('Nombres'), emp.get('Apellidos'), cedula,
+        ''.join(c for c in cedula if c.isalnum()), emp.get('Direccion'),
+    ))
+
+
+class DirectorioEmpleados:
+    """
+    Lista proyectada de empleados y su índice de búsqueda. Se recarga si se
+    invalida (crear/editar empleado), si vence el TTL o si cambia el día
+    (la edad va precalculada).
+    """
+
+    def __init__(self, ttl=TTL_INDICE):
+        self.ttl = ttl
+        self._estado = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        with self._lock:
+            self._version += 1
+            self._estado = None
+
+    def _vigente(self):
+        estado = self._estado
+        if estado is None:
+            return None
+        cargado_en, dia, _, _ = estado
+        if time.monotonic() - cargado_en > self.ttl or dia != date.today():
+            return None
+        return estado
+
+    def _asegurar(self, cargar):
+        estado = self._vigente()
+        if estado is not None:
+            return estado
+        version = self._version
+        empleados = cargar()
+        indice = IndicePalabras((emp['Id_Empleado'], _texto_empleado(emp)) for emp in empleados)
+        estado = (time.monotonic(), date.today(), empleados, indice)
+        with self._lock:
+            # Si alguien invalidó mientras se cargaba, esta carga puede traer
+            # datos viejos: se usa para esta petición pero no se guarda
+            if self._version == version:
+                self._estado = estado
+        return estado
+
+    def listar(self, cargar, busqueda=''):
+        """Empleados proyectados (dicts), filtrados por `busqueda` si se indica"""
+        _, _, empleados, indice = self._asegurar(cargar)
+        if not busqueda:
+            return empleados
+        ids = indice.buscar(busqueda)
+        return [emp for emp in empleados if emp['Id_Empleado'] in ids]
+
+
+# Directorio de empleados del proceso
+directorio_empleados = DirectorioEmpleados()
@@ -0,0 +1,169 @@
+"""
+Compresión de las respuestas dinámicas (HTML y JSON de la navegación AJAX).
+
+Las páginas de tablas (detalles de ventas, empleados...) salían sin comprimir:
+cientos de KB de HTML, o de HTML dentro de JSON, con mucho espacio en blanco.
+`CompresorRespuestas.comprimir` (un after_request) las comprime con brotli o
+gzip según Accept-Encoding:
+
+- solo tipos de texto (HTML, JSON, CSS, JS, SVG...): las imágenes y demás
+  medios ya vienen comprimidos y no se tocan
+- solo por encima de `COMPRESION_MINIMO` bytes; por debajo la cabecera y el
+  costo de CPU no compensan
+- no toca las respuestas que ya traen Content-Encoding (p. ej. los .gz/.br
+  precomprimidos de estaticos.py) ni los archivos servidos directo
+- las respuestas en streaming se comprimen por partes (cada parte se envía
+  en cuanto llega, sin juntar todo el cuerpo)
+- el nivel se configura con COMPRESION_NIVEL_GZIP (1-9) y
+  COMPRESION_NIVEL_BR (0-11)
+
+`estadisticas()` informa bytes antes/después y la relación de compresión.
+"""
+import gzip
+import os
+import threading
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se usa gzip
+    brotli = None
+
+
+def _entero_env(nombre, defecto):
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+COMPRESION_MINIMO = _entero_env('COMPRESION_MINIMO', 1024)
+NIVEL_GZIP = _entero_env('COMPRESION_NIVEL_GZIP', 6)
+NIVEL_BR = _entero_env('COMPRESION_NIVEL_BR', 5)
+TIPOS_COMPRIMIBLES = (
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+
+class _CompresorGzip:
+    def __init__(self, nivel):
+        # wbits 16 + MAX_WBITS: formato gzip (cabecera y CRC) en lugar de zlib
+        self._z = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def parte(self, datos):
+        return self._z.compress(datos) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def fin(self):
+        return self._z.flush()
+
+
+class _CompresorBrotli:
+    def __init__(self, nivel):
+        self._b = brotli.Compressor(quality=nivel)
+
+    def parte(self, datos):
+        return self._b.process(datos) + self._b.flush()
+
+    def fin(self):
+        return self._b.finish()
+
+
+class CompresorRespuestas:
+    def __init__(self, minimo=COMPRESION_MINIMO, nivel_gzip=NIVEL_GZIP, nivel_br=NIVEL_BR):
+        self.minimo = minimo
+        self.nivel_gzip = nivel_gzip
+        self.nivel_br = nivel_br
+        self.codificaciones = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self._lock = threading.Lock()
+        self.stats = {'comprimidas': 0, 'streaming': 0, 'omitidas': 0,
+                      'bytes_originales': 0, 'bytes_comprimidos': 0, 'por_codificacion': {}}
+
+    def _comprimible(self, response):
+        if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        return response.mimetype in TIPOS_COMPRIMIBLES
+
+    def _comprimir_todo(self, codificacion, datos):
+        if codificacion == 'br':
+            return brotli.compress(datos, quality=self.nivel_br)
+        return gzip.compress(datos, compresslevel=self.nivel_gzip, mtime=0)
+
+    def _compresor(self, codificacion):
+        if codificacion == 'br':
+            return _CompresorBrotli(self.nivel_br)
+        return _CompresorGzip(self.nivel_gzip)
+
+    def _anotar(self, codificacion, originales, comprimidos, streaming=False):
+        with self._lock:
+            self.stats['streaming' if streaming else 'comprimidas'] += 1
+            self.stats['bytes_originales'] += originales
+            self.stats['bytes_comprimidos'] += comprimidos
+            por = self.stats['por_codificacion']
+            por[codificacion] = por.get(codificacion, 0) + 1
+
+    def _en_streaming(self, codificacion, partes):
+        compresor = self._compresor(codificacion)
+        originales = comprimidos = 0
+        for datos in partes:
+            if isinstance(datos, str):
+                datos = datos.encode('utf-8')
+            if not datos:
+                continue
+            originales += len(datos)
+            salida = compresor.parte(datos)
+            comprimidos += len(salida)
+            yield salida
+        salida = compresor.fin()
+        comprimidos += len(salida)
+        self._anotar(codificacion, originales, comprimidos, streaming=True)
+        yield salida
+
+    def comprimir(self, response):
+        """after_request: comprime `response` si el cliente lo acepta y vale la pena"""
+        if not self._comprimible(response):
+            return response
+        # La respuesta cambia según Accept-Encoding, se comprima esta o no
+        response.vary.add('Accept-Encoding')
+        codificacion = request.accept_encodings.best_match(self.codificaciones)
+        if codificacion is None:
+            return response
+
+        if response.is_streamed:
+            original = response.response
+            response.response = self._en_streaming(codificacion, original)
+            if hasattr(original, 'close'):
+                response.call_on_close(original.close)
+            response.headers.pop('Content-Length', None)
+        else:
+            datos = response.get_data()
+            if len(datos) < self.minimo:
+                with self._lock:
+                    self.stats['omitidas'] += 1
+                return response
+            comprimido = self._comprimir_todo(codificacion, datos)
+            if len(comprimido) >= len(datos):
+                with self._lock:
+                    self.stats['omitidas'] += 1
+                return response
+            response.set_data(comprimido)
+            self._anotar(codificacion, len(datos), len(comprimido))
+
+        response.headers['Content-Encoding'] = codificacion
+        # Un ETag fuerte identifica los bytes exactos: el comprimido es otro
+        etag, debil = response.get_etag()
+        if etag and not debil:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self.stats, por_codificacion=dict(self.stats['por_codificacion']))
+        if stats['bytes_originales']:
+            stats['relacion'] = round(stats['bytes_comprimidos'] / stats['bytes_originales'], 3)
+            stats['ahorro_bytes'] = stats['bytes_originales'] - stats['bytes_comprimidos']
+        return stats
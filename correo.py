@@ -0,0 +1,270 @@
+"""
+Buzón de salida de correos.
+
+recuperar_contrasena abría una conexión SMTP nueva (STARTTLS + login) y
+enviaba el correo mientras el usuario esperaba con una conexión a la base
+tomada: un servidor de correo lento frenaba al worker varios segundos.
+Ahora el correo se guarda en la tabla CorreosPendientes, en la misma
+transacción que el código de verificación, y la petición responde enseguida.
+
+Un hilo de cada worker (`BuzonSalida`) envía los pendientes:
+
+- reutiliza la sesión SMTP entre envíos (`SesionSMTP`); la cierra tras
+  `SMTP_INACTIVIDAD` segundos sin uso y la reabre si el servidor la cortó
+- si un envío falla se reintenta con espera creciente (30 s, 1 min, 2 min...
+  hasta `SMTP_ESPERA_MAXIMA`); tras `SMTP_MAX_INTENTOS` o si el servidor
+  rechaza al destinatario queda 'fallido'
+- cada correo se reserva antes de enviarlo, así dos workers no mandan el
+  mismo
+- las métricas se ven en /debug_correos
+
+La configuración sale solo del entorno (SMTP_HOST, SMTP_REMITENTE y, si el
+servidor pide login, SMTP_USUARIO y SMTP_CONTRASENA); sin ella el buzón
+queda deshabilitado y recuperar_contrasena avisa que no puede enviar. Para
+probar sin un servidor real, con aiosmtpd (requirements-dev.txt):
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_STARTTLS=0 SMTP_REMITENTE=soporte@localhost python app.py
+
+tests/test_correo.py hace lo mismo con un servidor aiosmtpd en el proceso.
+"""
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from db import conexion_bd, ERRORES_BD
+from instrumentacion import registrar_consultas
+from repositorio import Repositorio
+
+
+def _entero_env(nombre, defecto):
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+# Sin valores por defecto para el servidor ni las credenciales: nunca en el código
+SMTP_HOST = os.environ.get('SMTP_HOST', '')
+SMTP_PORT = _entero_env('SMTP_PORT', 587)
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1').lower() in ('1', 'true', 'si', 'sí')
+SMTP_USUARIO = os.environ.get('SMTP_USUARIO', '')
+SMTP_CONTRASENA = os.environ.get('SMTP_CONTRASENA', '')
+SMTP_REMITENTE = os.environ.get('SMTP_REMITENTE', SMTP_USUARIO)
+SMTP_TIMEOUT = _entero_env('SMTP_TIMEOUT', 15)
+SMTP_INACTIVIDAD = _entero_env('SMTP_INACTIVIDAD', 60)
+SMTP_MAX_INTENTOS = _entero_env('SMTP_MAX_INTENTOS', 6)
+SMTP_ESPERA_BASE = _entero_env('SMTP_ESPERA_BASE', 30)
+SMTP_ESPERA_MAXIMA = _entero_env('SMTP_ESPERA_MAXIMA', 1800)
+# Cada cuánto se revisa la tabla aunque nadie haya encolado en este worker
+INTERVALO_BUZON = _entero_env('SMTP_INTERVALO', 10)
+LOTE_BUZON = 20
+# Cuánto se reserva un correo para el worker que lo está enviando
+RESERVA_ENVIO = 120
+# Los enviados se guardan una semana (auditoría) y después se borran
+DIAS_ENVIADOS = 7
+
+
+def mensaje(destinatario, asunto, cuerpo, remitente=None):
+    msg = MIMEMultipart()
+    msg['From'] = remitente or SMTP_REMITENTE
+    msg['To'] = destinatario
+    msg['Subject'] = asunto
+    msg.attach(MIMEText(cuerpo, 'plain'))
+    return msg
+
+
+def espera_reintento(intentos):
+    """Segundos hasta el próximo intento tras `intentos` fallidos"""
+    return min(SMTP_ESPERA_BASE * 2 ** (intentos - 1), SMTP_ESPERA_MAXIMA)
+
+
+def es_permanente(error):
+    """Errores que no se arreglan reintentando (destinatario inválido, 5xx)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    codigo = getattr(error, 'smtp_code', None)
+    return isinstance(codigo, int) and 500 <= codigo < 600 and not isinstance(error, smtplib.SMTPAuthenticationError)
+
+
+class SesionSMTP:
+    """Una conexión SMTP abierta que se reutiliza entre envíos"""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, usuario=SMTP_USUARIO, contrasena=SMTP_CONTRASENA,
+                 starttls=SMTP_STARTTLS, timeout=SMTP_TIMEOUT, inactividad=SMTP_INACTIVIDAD):
+        self.host = host
+        self.port = port
+        self.usuario = usuario
+        self.contrasena = contrasena
+        self.starttls = starttls
+        self.timeout = timeout
+        self.inactividad = inactividad
+        self._smtp = None
+        self._ultimo_uso = 0.0
+        self.stats = {'conexiones': 0, 'reconexiones': 0}
+
+    def configurada(self):
+        """Hay servidor y, si se usa login, contraseña"""
+        return bool(self.host) and (not self.usuario or bool(self.contrasena))
+
+    def _conectar(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.contrasena)
+        except Exception:
+            smtp.close()
+            raise
+        self.stats['conexiones'] += 1
+        return smtp
+
+    def enviar(self, msg):
+        if self._smtp is not None and time.monotonic() - self._ultimo_uso > self.inactividad:
+            # El servidor probablemente ya la cerró por inactividad
+            self.cerrar()
+        if self._smtp is None:
+            self._smtp = self._conectar()
+        try:
+            self._smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Conexión vieja cortada por el servidor: un reintento con una nueva
+            self.stats['reconexiones'] += 1
+            self.cerrar()
+            self._smtp = self._conectar()
+            self._smtp.send_message(msg)
+        except (OSError, smtplib.SMTPException) as e:
+            if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                self.cerrar()
+            raise
+        self._ultimo_uso = time.monotonic()
+
+    def cerrar(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (OSError, smtplib.SMTPException):
+            self._smtp.close()
+        self._smtp = None
+
+    def inactiva(self):
+        return self._smtp is not None and time.monotonic() - self._ultimo_uso > self.inactividad
+
+
+class BuzonSalida:
+    """Hilo que envía los correos de CorreosPendientes (uno por worker)"""
+
+    def __init__(self, sesion=None, remitente=SMTP_REMITENTE, intervalo=INTERVALO_BUZON, lote=LOTE_BUZON):
+        self.sesion = sesion or SesionSMTP()
+        self.remitente = remitente
+        self.intervalo = intervalo
+        self.lote = lote
+        self._despertar = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._ultima_purga = 0.0
+        self.stats = {'enviados': 0, 'reintentos': 0, 'fallidos': 0, 'errores_bd': 0,
+                      'tiempo_envio_ms': 0.0, 'ultimo_error': None}
+
+    @property
+    def habilitado(self):
+        """Si hay configuración SMTP completa en el entorno"""
+        return self.sesion.configurada() and bool(self.remitente)
+
+    def despertar(self):
+        """Tras el commit: que el hilo no espere al próximo intervalo"""
+        self.asegurar_en_marcha()
+        self._despertar.set()
+
+    def _enviar_uno(self, repo, fila):
+        id_correo, destinatario, asunto, cuerpo, intentos, _ = fila
+        if not repo.correos.reservar(id_correo, datetime.now() + timedelta(seconds=RESERVA_ENVIO)):
+            return  # lo tomó otro worker
+        repo.commit()
+        intentos += 1
+        inicio = time.perf_counter()
+        try:
+            self.sesion.enviar(mensaje(destinatario, asunto, cuerpo, self.remitente))
+        except (OSError, smtplib.SMTPException) as e:
+            error = f'{type(e).__name__}: {e}'
+            with self._lock:
+                self.stats['ultimo_error'] = error
+            if es_permanente(e) or intentos >= SMTP_MAX_INTENTOS:
+                repo.correos.marcar_fallido(id_correo, intentos, error)
+                with self._lock:
+                    self.stats['fallidos'] += 1
+                print(f"Correo {id_correo} a {destinatario} descartado tras {intentos} intentos: {error}")
+            else:
+                espera = espera_reintento(intentos)
+                repo.correos.reprogramar(id_correo, intentos, datetime.now() + timedelta(seconds=espera), error)
+                with self._lock:
+                    self.stats['reintentos'] += 1
+                print(f"Error al enviar correo {id_correo} a {destinatario}, reintento en {espera} s: {error}")
+            repo.commit()
+            return
+        repo.correos.marcar_enviado(id_correo, intentos)
+        repo.commit()
+        with self._lock:
+            self.stats['enviados'] += 1
+            self.stats['tiempo_envio_ms'] += (time.perf_counter() - inicio) * 1000
+        print(f"Email enviado a {destinatario}")
+
+    def procesar(self):
+        """Envía los correos vencidos; devuelve cuántos intentó"""
+        with registrar_consultas('buzon_correo'), conexion_bd() as conn:
+            repo = Repositorio(conn)
+            filas = repo.correos.vencidos(self.lote)
+            for fila in filas:
+                self._enviar_uno(repo, fila)
+            if time.monotonic() - self._ultima_purga > 3600:
+                repo.correos.purgar_enviados(datetime.now() - timedelta(days=DIAS_ENVIADOS))
+                repo.commit()
+                self._ultima_purga = time.monotonic()
+        return len(filas)
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                # Un lote lleno puede dejar más correos vencidos
+                while self.procesar() >= self.lote:
+                    pass
+            except ERRORES_BD as e:
+                with self._lock:
+                    self.stats['errores_bd'] += 1
+                print(f"Error al leer el buzón de correos: {e}")
+            except Exception as e:
+                print(f"Error en el buzón de correos: {e}")
+            if self.sesion.inactiva():
+                self.sesion.cerrar()
+
+    def asegurar_en_marcha(self):
+        """Arranca el hilo en este proceso (una vez; de nuevo tras un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if not self.habilitado:
+                print("Buzón de correos deshabilitado: faltan SMTP_HOST/SMTP_REMITENTE "
+                      "(y SMTP_CONTRASENA si hay SMTP_USUARIO)")
+                return
+            # La conexión SMTP heredada del proceso padre no se comparte
+            self.sesion._smtp = None
+        threading.Thread(target=self._bucle, name='buzon-correo', daemon=True).start()
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self.stats, **self.sesion.stats, habilitado=self.habilitado)
+        enviados = stats['enviados']
+        total_ms = stats.pop('tiempo_envio_ms')
+        stats['envio_promedio_ms'] = round(total_ms / enviados, 1) if enviados else None
+        return stats
@@ -0,0 +1,738 @@
+"""
+Pool de conexiones a la base de datos.
+
+Cada worker mantiene su propio pool: las conexiones se abren una sola vez y
+se reutilizan entre peticiones en lugar de hacer el handshake TLS + login en
+cada request. Antes de entregar una conexión que lleva tiempo ociosa se le
+hace un ping, y los errores transitorios de Azure (incluida la base serverless
+en pausa) se reintentan con espera exponencial.
+
+El motor se elige con DB_BACKEND: `azure` (por defecto, pyodbc) o `sqlite`
+(backend_sqlite.py, para desarrollo sin conexión y pruebas de carga).
+
+Opcionalmente se configura una réplica de solo lectura (ver
+`backend_lectura_desde_entorno`): las vistas marcadas con `@solo_lectura`
+leen de ella en las peticiones GET, salvo que la sesión haya escrito hace
+poco (lee sus propias escrituras en el primario) o que la réplica esté caída.
+"""
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import pyodbc
+except ImportError:  # sin driver ODBC instalado solo queda el backend SQLite
+    pyodbc = None
+
+# Excepciones de base de datos que las rutas pueden capturar sin importar el motor
+ERRORES_BD = (sqlite3.Error,) if pyodbc is None else (pyodbc.Error, sqlite3.Error)
+
+# Errores de Azure SQL que se consideran transitorios y justifican reintentar
+# https://learn.microsoft.com/azure/azure-sql/database/troubleshoot-common-errors-issues
+ERRORES_TRANSITORIOS = {
+    '233', '4060', '4221', '10053', '10054', '10060', '10928', '10929',
+    '40143', '40197', '40501', '40540', '40613', '42108', '42109',
+    '49918', '49919', '49920',
+}
+
+# Base serverless en pausa automática: la primera conexión la despierta y
+# falla con 40613 hasta que la base vuelve a estar disponible (hasta ~1 min)
+ERRORES_BASE_EN_PAUSA = {'40613'}
+
+# SQLSTATE de errores de conexión (enlace caído, timeout, etc.)
+SQLSTATE_CONEXION = ('08', 'HYT00', 'HYT01')
+
+
+def _codigos_error(error):
+    """Extrae el SQLSTATE y el número de error nativo de una excepción ODBC"""
+    sqlstate = error.args[0] if error.args else ''
+    mensaje = str(error.args[1]) if len(error.args) > 1 else str(error)
+    nativos = {codigo for codigo in ERRORES_TRANSITORIOS if f'({codigo})' in mensaje}
+    return str(sqlstate), nativos
+
+
+def es_error_transitorio(error):
+    """Indica si el error justifica descartar la conexión y reintentar"""
+    if pyodbc is None or not isinstance(error, pyodbc.Error):
+        return False
+    sqlstate, nativos = _codigos_error(error)
+    return bool(nativos) or sqlstate.startswith(SQLSTATE_CONEXION)
+
+
+def es_base_en_pausa(error):
+    """Indica si el error corresponde a una base serverless despertando"""
+    if pyodbc is None or not isinstance(error, pyodbc.Error):
+        return False
+    _, nativos = _codigos_error(error)
+    return bool(nativos & ERRORES_BASE_EN_PAUSA)
+
+
+def cadena_conexion_azure():
+    """Construye la cadena de conexión ODBC a partir de las variables de entorno"""
+    if os.environ.get("AZURE_SQL_CONNECTION_STRING"):
+        return os.environ["AZURE_SQL_CONNECTION_STRING"]
+    driver = os.environ.get("AZURE_SQL_DRIVER", "ODBC Driver 17 for SQL Server")
+    server = os.environ.get("AZURE_SQL_SERVER")
+    database = os.environ.get("AZURE_SQL_DB")
+    username = os.environ.get("AZURE_SQL_USER")
+    password = os.environ.get("AZURE_SQL_PASS")
+
+    return (
+        f"DRIVER={{{driver}}};"
+        f"SERVER={server};"
+        f"DATABASE={database};"
+        f"UID={username};"
+        f"PWD={password};"
+        "Encrypt=yes;"
+        "TrustServerCertificate=no;"
+        "Connection Timeout=30;"
+    )
+
+
+class BackendAzure:
+    """Azure SQL / SQL Server vía pyodbc"""
+    nombre = 'azure'
+    sql_ping = 'SELECT 1'
+    es_transitorio = staticmethod(es_error_transitorio)
+    es_en_pausa = staticmethod(es_base_en_pausa)
+
+    def __init__(self, cadena=None):
+        if pyodbc is None:
+            raise RuntimeError('pyodbc no está disponible; instale el driver ODBC o use DB_BACKEND=sqlite')
+        self.cadena = cadena or cadena_conexion_azure()
+
+    def conectar(self):
+        return pyodbc.connect(self.cadena)
+
+
+def backend_desde_entorno():
+    """Backend indicado por DB_BACKEND (azure por defecto)"""
+    nombre = os.environ.get('DB_BACKEND', 'azure').lower()
+    if nombre == 'sqlite':
+        from backend_sqlite import BackendSQLite
+        return BackendSQLite(os.environ.get('SQLITE_PATH', 'minibodega.db'))
+    if nombre == 'azure':
+        return BackendAzure()
+    raise ValueError(f'DB_BACKEND desconocido: {nombre}')
+
+
+def backend_lectura_desde_entorno():
+    """
+    Backend de la réplica de solo lectura, o None si no hay réplica:
+
+    - AZURE_SQL_READ_CONNECTION_STRING: cadena completa de la réplica
+    - AZURE_SQL_READ_REPLICA=1: la cadena del primario con ApplicationIntent=ReadOnly
+      (réplica de lectura integrada de Azure SQL / grupos de conmutación)
+    - SQLITE_READ_PATH: segunda base SQLite para probar el enrutamiento en local
+    """
+    nombre = os.environ.get('DB_BACKEND', 'azure').lower()
+    if nombre == 'sqlite':
+        ruta = os.environ.get('SQLITE_READ_PATH')
+        if not ruta:
+            return None
+        from backend_sqlite import BackendSQLite
+        return BackendSQLite(ruta)
+    cadena = os.environ.get('AZURE_SQL_READ_CONNECTION_STRING')
+    if not cadena and os.environ.get('AZURE_SQL_READ_REPLICA', '').lower() in ('1', 'true', 'si', 'sí'):
+        cadena = cadena_conexion_azure().rstrip(';') + ';ApplicationIntent=ReadOnly;'
+    return BackendAzure(cadena) if cadena else None
+
+
+class PoolAgotado(Exception):
+    """No se liberó ninguna conexión dentro del tiempo de espera"""
+
+
+class CacheSentencias:
+    """
+    Cursores reutilizables por texto SQL. pyodbc conserva preparada la última
+    sentencia de cada cursor, así que ejecutar siempre el mismo SQL sobre el
+    mismo cursor evita volver a prepararlo en el servidor.
+    """
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self._cursores = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def cursor(self, raw, sql):
+        cursor = self._cursores.get(sql)
+        if cursor is not None:
+            self._cursores.move_to_end(sql)
+            self.aciertos += 1
+            return cursor
+        self.fallos += 1
+        cursor = raw.cursor()
+        self._cursores[sql] = cursor
+        if len(self._cursores) > self.max_size:
+            _, viejo = self._cursores.popitem(last=False)
+            try:
+                viejo.close()
+            except Exception:
+                pass
+        return cursor
+
+    def descartar(self, sql):
+        """Quita un cursor que quedó en mal estado tras un error"""
+        cursor = self._cursores.pop(sql, None)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+class ConexionPooled:
+    """
+    Envoltura de una conexión del pool. Se usa igual que la conexión de
+    pyodbc, pero `close()` la devuelve al pool en lugar de cerrarla.
+    """
+
+    def __init__(self, pool, entrada):
+        self._pool = pool
+        self._entrada = entrada
+        self._raw = entrada.raw
+        self._liberada = False
+        self._descartar = False
+        self._tras_commit = []
+        self.escribio = False
+
+    @property
+    def raw(self):
+        return self._raw
+
+    @property
+    def sentencias(self):
+        """Cache de sentencias preparadas, vive lo mismo que la conexión física"""
+        return self._entrada.sentencias
+
+    def cursor(self):
+        return self._raw.cursor()
+
+    @property
+    def lectura(self):
+        """La conexión pertenece al pool de la réplica de solo lectura"""
+        return self._pool.solo_lectura
+
+    def commit(self):
+        self._raw.commit()
+        self.escribio = True
+        pendientes, self._tras_commit = self._tras_commit, []
+        for funcion in pendientes:
+            funcion()
+
+    def rollback(self):
+        self._raw.rollback()
+        self._tras_commit = []
+
+    def al_confirmar(self, funcion):
+        """
+        Ejecuta `funcion` después del próximo commit (se descarta con el
+        rollback). Para invalidar cachés: si se invalidan antes, otra petición
+        puede volver a cargar las filas viejas, todavía sin confirmar, y
+        guardarlas como vigentes.
+        """
+        if funcion not in self._tras_commit:
+            self._tras_commit.append(funcion)
+
+    def execute(self, *args):
+        return self._raw.execute(*args)
+
+    def marcar_rota(self):
+        """La conexión no debe volver al pool (enlace caído o error grave)"""
+        self._descartar = True
+
+    def close(self):
+        if self._liberada:
+            return
+        self._liberada = True
+        self._tras_commit = []
+        self._pool._devolver(self._entrada, descartar=self._descartar)
+
+    def __getattr__(self, nombre):
+        return getattr(self._raw, nombre)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and self._pool.es_transitorio(exc):
+            self._descartar = True
+        self.close()
+        return False
+
+
+class _Entrada:
+    __slots__ = ('raw', 'creada', 'ultimo_uso', 'sentencias')
+
+    def __init__(self, raw):
+        ahora = time.monotonic()
+        self.raw = raw
+        self.creada = ahora
+        self.ultimo_uso = ahora
+        self.sentencias = CacheSentencias()
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones por proceso.
+
+    - `min_size` conexiones se mantienen abiertas aunque estén ociosas.
+    - Como máximo `max_size` conexiones abiertas a la vez; si están todas en
+      uso, `obtener()` espera hasta `timeout` segundos.
+    - Las conexiones ociosas más de `idle_timeout` segundos se cierran.
+    - Las conexiones ociosas más de `ping_despues` segundos se validan con
+      un `SELECT 1` antes de entregarse.
+    """
+
+    def __init__(self, fabrica, min_size=1, max_size=10, idle_timeout=300,
+                 timeout=30, ping_despues=30, reintentos=3, espera_despertar=60,
+                 sql_ping='SELECT 1', es_transitorio=es_error_transitorio,
+                 es_en_pausa=es_base_en_pausa, solo_lectura=False):
+        self._fabrica = fabrica
+        self.solo_lectura = solo_lectura
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ping_despues = ping_despues
+        self.reintentos = reintentos
+        self.espera_despertar = espera_despertar
+        self.sql_ping = sql_ping
+        self._es_transitorio = es_transitorio
+        self._es_en_pausa = es_en_pausa
+
+        self._libres = []
+        self._en_uso = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'esperas': 0,
+            'tiempo_espera': 0.0,
+            'creadas': 0,
+            'cerradas': 0,
+            'reciclaje_ocioso': 0,
+            'pings': 0,
+            'pings_fallidos': 0,
+            'reintentos': 0,
+            'fallos': 0,
+            'agotado': 0,
+            'sin_espera': 0,
+        }
+
+    # -- Creación de conexiones ------------------------------------------------
+
+    def _crear(self):
+        """Abre una conexión nueva reintentando errores transitorios"""
+        intento = 0
+        inicio = time.monotonic()
+        while True:
+            try:
+                raw = self._fabrica()
+                with self._cond:
+                    self._stats['creadas'] += 1
+                return raw
+            except Exception as e:
+                intento += 1
+                en_pausa = self._es_en_pausa(e)
+                transitorio = en_pausa or self._es_transitorio(e)
+                transcurrido = time.monotonic() - inicio
+                # Una base en pausa tarda en despertar: se reintenta hasta
+                # `espera_despertar` segundos en lugar de `reintentos` veces
+                puede_reintentar = transitorio and (
+                    transcurrido < self.espera_despertar if en_pausa else intento <= self.reintentos
+                )
+                with self._cond:
+                    self._stats['fallos'] += 1
+                    if puede_reintentar:
+                        self._stats['reintentos'] += 1
+                if not puede_reintentar:
+                    raise
+                espera = min(0.5 * (2 ** (intento - 1)), 10)
+                if en_pausa:
+                    print(f"Base de datos en pausa, esperando a que despierte (intento {intento})...")
+                else:
+                    print(f"Error transitorio al conectar ({e}), reintentando en {espera:.1f}s")
+                time.sleep(espera)
+
+    def _cerrar(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats['cerradas'] += 1
+
+    def _ping(self, raw):
+        with self._cond:
+            self._stats['pings'] += 1
+        try:
+            cursor = raw.cursor()
+            cursor.execute(self.sql_ping)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats['pings_fallidos'] += 1
+            return False
+
+    # -- Checkout / devolución ---------------------------------------------
+
+    def _reciclar_ociosas(self):
+        """Cierra las conexiones ociosas que sobran. Requiere el lock."""
+        ahora = time.monotonic()
+        vencidas = []
+        conservar = []
+        # Las más recientes quedan al final; se conservan primero
+        for entrada in reversed(self._libres):
+            total = len(conservar) + self._en_uso
+            if ahora - entrada.ultimo_uso > self.idle_timeout and total >= self.min_size:
+                vencidas.append(entrada)
+            else:
+                conservar.append(entrada)
+        conservar.reverse()
+        self._libres = conservar
+        self._stats['reciclaje_ocioso'] += len(vencidas)
+        return vencidas
+
+    def obtener(self, esperar=True):
+        """
+        Entrega una conexión del pool envuelta en `ConexionPooled`. Con
+        `esperar=False` no espera a que se libere una: si están todas en uso
+        devuelve None.
+        """
+        limite = time.monotonic() + self.timeout
+        esperado = False
+        inicio_espera = None
+        while True:
+            entrada = None
+            crear = False
+            sin_cupo = False
+            with self._cond:
+                vencidas = self._reciclar_ociosas()
+                while not self._libres and self._en_uso >= self.max_size:
+                    if not esperar:
+                        sin_cupo = True
+                        self._stats['sin_espera'] += 1
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._stats['agotado'] += 1
+                        raise PoolAgotado(
+                            f'No hay conexiones libres tras {self.timeout}s '
+                            f'(max_size={self.max_size})'
+                        )
+                    if not esperado:
+                        esperado = True
+                        inicio_espera = time.monotonic()
+                        self._stats['esperas'] += 1
+                    self._cond.wait(restante)
+                if esperado and inicio_espera is not None:
+                    self._stats['tiempo_espera'] += time.monotonic() - inicio_espera
+                    inicio_espera = None
+                if not sin_cupo:
+                    if self._libres:
+                        entrada = self._libres.pop()
+                    else:
+                        crear = True
+                    self._en_uso += 1
+                    self._stats['checkouts'] += 1
+
+            for vieja in vencidas:
+                self._cerrar(vieja.raw)
+
+            if sin_cupo:
+                return None
+
+            if crear:
+                try:
+                    entrada = _Entrada(self._crear())
+                except Exception:
+                    self._liberar_cupo()
+                    raise
+                return ConexionPooled(self, entrada)
+
+            # Validar conexiones que llevan tiempo sin usarse
+            if time.monotonic() - entrada.ultimo_uso >= self.ping_despues and not self._ping(entrada.raw):
+                self._cerrar(entrada.raw)
+                self._liberar_cupo(checkout=True)
+                continue
+            return ConexionPooled(self, entrada)
+
+    def _liberar_cupo(self, checkout=False):
+        with self._cond:
+            self._en_uso -= 1
+            if checkout:
+                self._stats['checkouts'] -= 1
+            self._cond.notify()
+
+    def _devolver(self, entrada, descartar=False):
+        raw = entrada.raw
+        if not descartar:
+            try:
+                # Deshacer cualquier transacción que la ruta haya dejado abierta
+                raw.rollback()
+            except Exception:
+                descartar = True
+        if descartar:
+            self._cerrar(raw)
+            self._liberar_cupo()
+            return
+        with self._cond:
+            entrada.ultimo_uso = time.monotonic()
+            self._libres.append(entrada)
+            self._en_uso -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def conexion(self):
+        """
+        Uso:
+            with pool.conexion() as conn:
+                cursor = conn.cursor()
+                ...
+        La conexión vuelve al pool al salir del bloque, o se descarta si hubo
+        un error de conexión.
+        """
+        conn = self.obtener()
+        with conn:
+            yield conn
+
+    def es_transitorio(self, error):
+        """Indica si el error obliga a descartar la conexión (según el backend)"""
+        return self._es_transitorio(error)
+
+    # -- Mantenimiento -----------------------------------------------------
+
+    def precalentar(self):
+        """Abre `min_size` conexiones por adelantado"""
+        nuevas = []
+        with self._cond:
+            faltan = self.min_size - len(self._libres) - self._en_uso
+        for _ in range(max(faltan, 0)):
+            nuevas.append(_Entrada(self._crear()))
+        with self._cond:
+            self._libres.extend(nuevas)
+
+    def disponibles(self):
+        """Conexiones que se pueden tomar ahora sin esperar (libres + por crear)"""
+        with self._cond:
+            return len(self._libres) + max(self.max_size - self._en_uso - len(self._libres), 0)
+
+    def cerrar_todas(self):
+        with self._cond:
+            libres, self._libres = self._libres, []
+        for entrada in libres:
+            self._cerrar(entrada.raw)
+
+    def estadisticas(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['sentencias_reutilizadas'] = sum(e.sentencias.aciertos for e in self._libres)
+            stats['sentencias_preparadas'] = sum(e.sentencias.fallos for e in self._libres)
+            stats['tiempo_espera'] = round(stats['tiempo_espera'], 4)
+            stats['libres'] = len(self._libres)
+            stats['en_uso'] = self._en_uso
+            stats['min_size'] = self.min_size
+            stats['max_size'] = self.max_size
+        return stats
+
+
+def _entero_env(nombre, defecto):
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+def crear_pool_lectura_desde_entorno():
+    """
+    Pool de la réplica, o None. Falla rápido (sin esperar a que despierte ni
+    reintentar) para que la lectura pase al primario en lugar de bloquearse.
+    """
+    backend = backend_lectura_desde_entorno()
+    if backend is None:
+        return None
+    return PoolConexiones(
+        backend.conectar,
+        sql_ping=backend.sql_ping,
+        es_transitorio=backend.es_transitorio,
+        es_en_pausa=backend.es_en_pausa,
+        solo_lectura=True,
+        min_size=0,
+        max_size=_entero_env('DB_REPLICA_MAX', _entero_env('DB_POOL_MAX', 10)),
+        idle_timeout=_entero_env('DB_POOL_IDLE', 300),
+        timeout=_entero_env('DB_REPLICA_TIMEOUT', 5),
+        ping_despues=_entero_env('DB_POOL_PING', 30),
+        reintentos=0,
+        espera_despertar=0,
+    )
+
+
+def crear_pool_desde_entorno(backend=None):
+    """Pool configurado con las variables DB_POOL_* (valores por defecto razonables)"""
+    backend = backend or backend_desde_entorno()
+    return PoolConexiones(
+        backend.conectar,
+        sql_ping=backend.sql_ping,
+        es_transitorio=backend.es_transitorio,
+        es_en_pausa=backend.es_en_pausa,
+        min_size=_entero_env('DB_POOL_MIN', 1),
+        max_size=_entero_env('DB_POOL_MAX', 10),
+        idle_timeout=_entero_env('DB_POOL_IDLE', 300),
+        timeout=_entero_env('DB_POOL_TIMEOUT', 30),
+        ping_despues=_entero_env('DB_POOL_PING', 30),
+        espera_despertar=_entero_env('DB_POOL_DESPERTAR', 60),
+    )
+
+
+# Un pool por proceso (y otro para la réplica): tras un fork (gunicorn) el
+# hijo crea los suyos propios
+_pools = {}
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+# Segundos que una sesión lee del primario después de escribir, para ver sus
+# propios cambios aunque la réplica vaya con retraso
+VENTANA_LEE_TUS_ESCRITURAS = _entero_env('DB_REPLICA_PEGAJOSO', 10)
+# Segundos que se deja de usar la réplica después de un fallo
+ENFRIAMIENTO_REPLICA = _entero_env('DB_REPLICA_ENFRIAMIENTO', 30)
+_replica_caida_hasta = 0.0
+
+
+def _pools_del_proceso():
+    global _pools, _pool_pid
+    pid = os.getpid()
+    if _pool_pid != pid:
+        with _pool_lock:
+            if _pool_pid != pid:
+                _pools = {'primario': crear_pool_desde_entorno(), 'lectura': crear_pool_lectura_desde_entorno()}
+                _pool_pid = pid
+    return _pools
+
+
+def get_pool():
+    """Pool del primario (lectura y escritura)"""
+    return _pools_del_proceso()['primario']
+
+
+def get_pool_lectura():
+    """Pool de la réplica de solo lectura, o None si no está configurada"""
+    return _pools_del_proceso()['lectura']
+
+
+def replica_disponible():
+    return get_pool_lectura() is not None and time.monotonic() >= _replica_caida_hasta
+
+
+def marcar_replica_caida(error=None):
+    """Deja de usar la réplica durante ENFRIAMIENTO_REPLICA segundos"""
+    global _replica_caida_hasta
+    _replica_caida_hasta = time.monotonic() + ENFRIAMIENTO_REPLICA
+    print(f"Réplica de lectura no disponible ({error}); usando el primario por {ENFRIAMIENTO_REPLICA}s")
+
+
+def obtener_conexion(lectura=False):
+    """
+    Conexión del pool adecuado. Con `lectura=True` se intenta la réplica y,
+    si no hay o falla, se usa el primario.
+    """
+    if lectura and replica_disponible():
+        try:
+            return get_pool_lectura().obtener()
+        except Exception as e:
+            marcar_replica_caida(e)
+    return get_pool().obtener()
+
+
+@contextmanager
+def conexion_bd(lectura=False):
+    """Context manager con una conexión del pool del proceso actual"""
+    conn = obtener_conexion(lectura)
+    with conn:
+        yield conn
+
+
+# Hilos para las consultas independientes de una misma página (en_paralelo),
+# compartidos por todas las peticiones del worker
+CONSULTAS_PARALELAS = _entero_env('DB_PARALELO', 4)
+_ejecutor = None
+_ejecutor_pid = None
+
+
+def _ejecutor_del_proceso():
+    global _ejecutor, _ejecutor_pid
+    pid = os.getpid()
+    if _ejecutor_pid != pid:
+        with _pool_lock:
+            if _ejecutor_pid != pid:
+                _ejecutor = ThreadPoolExecutor(max_workers=CONSULTAS_PARALELAS, thread_name_prefix='consultas')
+                _ejecutor_pid = pid
+    return _ejecutor
+
+
+# Resultado de una consulta que no consiguió conexión en el ejecutor
+_SIN_CONEXION = object()
+
+
+def _con_conexion(pool, consulta):
+    # Sin esperar: las conexiones ocupadas pueden ser de peticiones que a su
+    # vez esperan este resultado
+    conn = pool.obtener(esperar=False)
+    if conn is None:
+        return _SIN_CONEXION
+    with conn:
+        return consulta(conn)
+
+
+def en_paralelo(conn, consultas):
+    """
+    Ejecuta a la vez consultas que no dependen entre sí y devuelve
+    {nombre: resultado}. `consultas` es {nombre: función(conexión)}: la
+    primera corre en este hilo con `conn` y las demás en el ejecutor del
+    worker, cada una con su propia conexión del mismo pool que `conn`
+    (réplica o primario). La página tarda lo que la consulta más lenta en
+    lugar de la suma.
+
+    Si el pool no tiene conexiones libres para todas, las que no alcanzan
+    corren aquí, en orden. Los hilos tampoco esperan: si al empezar ya no
+    hay conexión libre (otra petición la tomó), esa consulta vuelve a
+    correr aquí con `conn`. Así una petición nunca espera conexiones que
+    ella misma, u otra petición que espera a sus hilos, tiene tomadas. Los hilos reciben una copia del contexto, así sus
+    consultas cuentan en el registro de la petición.
+    """
+    nombres = list(consultas)
+    pool = get_pool_lectura() if getattr(conn, 'lectura', False) else get_pool()
+    extra = min(len(nombres) - 1, CONSULTAS_PARALELAS, pool.disponibles()) if len(nombres) > 1 else 0
+    paralelas, locales = nombres[1:1 + extra], [nombres[0]] + nombres[1 + extra:]
+    ejecutor = _ejecutor_del_proceso()
+    futuros = {
+        nombre: ejecutor.submit(contextvars.copy_context().run, _con_conexion, pool, consultas[nombre])
+        for nombre in paralelas
+    }
+    resultados = {nombre: consultas[nombre](conn) for nombre in locales}
+    for nombre, futuro in futuros.items():
+        resultado = futuro.result()
+        resultados[nombre] = consultas[nombre](conn) if resultado is _SIN_CONEXION else resultado
+    return {nombre: resultados[nombre] for nombre in nombres}
+
+
+def solo_lectura(f):
+    """Marca una vista cuyas peticiones GET pueden leer de la réplica"""
+    f.solo_lectura = True
+    return f
+
+
+def estadisticas_pools():
+    stats = get_pool().estadisticas()
+    lectura = get_pool_lectura()
+    if lectura is not None:
+        stats['lectura'] = lectura.estadisticas()
+        stats['lectura']['disponible'] = replica_disponible()
+    return stats
@@ -0,0 +1,232 @@
+"""
+Archivos estáticos con huella de contenido.
+
+Antes se servían sin caché (`SEND_FILE_MAX_AGE_DEFAULT = 0`) y las imágenes
+de productos llevaban `?t=<segundo actual>`: el navegador volvía a bajar todo
+en cada vista. Ahora cada archivo se publica con el hash de su contenido en
+el nombre (`base.css` -> `base.3f9a1c0b2d.css`):
+
+- `url_for('static', filename='base.css')` genera la URL con huella (hook
+  url_defaults en app.py), así las plantillas siguen usando url_for
+- una URL con la huella vigente se sirve con caché de un año `immutable`;
+  si el archivo cambia, cambia su URL
+- si hay variantes `.br`/`.gz` precomprimidas (las genera
+  `python estaticos.py` en el build) se sirven según Accept-Encoding
+- las URLs sin huella (p. ej. las de dentro de los CSS) o con una huella
+  vieja se sirven como antes, pero revalidando (no-cache)
+
+El manifiesto (ruta -> huella) se lee de static/manifest.json si existe y se
+completa recorriendo la carpeta. Cada consulta compara fecha y tamaño del
+archivo (un stat) y recalcula la huella si cambió, p. ej. al subir la imagen
+de un producto.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se generan variantes .gz
+    brotli = None
+
+MANIFIESTO = 'manifest.json'
+LARGO_HUELLA = 10
+UN_ANO = 365 * 24 * 3600
+# Solo se comprimen textos: las imágenes ya vienen comprimidas
+COMPRIMIBLES = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+MINIMO_COMPRIMIR = 512
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+_RE_HUELLA = re.compile(r'^(?P<base>.+)\.(?P<huella>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % LARGO_HUELLA)
+
+
+def hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 16), b''):
+            h.update(bloque)
+    return h.hexdigest()[:LARGO_HUELLA]
+
+
+def _es_generado(nombre):
+    return nombre.endswith(('.gz', '.br')) or nombre == MANIFIESTO
+
+
+def con_huella(nombre, huella):
+    base, ext = os.path.splitext(nombre)
+    return f'{base}.{huella}{ext}'
+
+
+class ManifiestoEstaticos:
+    def __init__(self, carpeta):
+        self.carpeta = carpeta
+        # ruta relativa -> (huella, mtime_ns, tamaño)
+        self._entradas = {}
+        # prefijo -> función que da la huella sin tocar el disco (ver delegar)
+        self._delegados = {}
+        self._lock = threading.Lock()
+        self.stats = {'huellas_calculadas': 0, 'inmutables': 0, 'sin_huella': 0, 'comprimidos': 0}
+
+    def _ruta(self, nombre):
+        """Ruta en disco, o None si `nombre` se sale de la carpeta"""
+        return safe_join(self.carpeta, nombre)
+
+    def archivos(self):
+        """Rutas relativas (separadas por /) de los archivos publicados"""
+        for raiz, carpetas, archivos in os.walk(self.carpeta):
+            carpetas.sort()
+            for nombre in sorted(archivos):
+                if not _es_generado(nombre):
+                    yield os.path.relpath(os.path.join(raiz, nombre), self.carpeta).replace(os.sep, '/')
+
+    def cargar(self):
+        """Lee manifest.json (si existe) y calcula las huellas que falten o hayan cambiado"""
+        entradas = {}
+        try:
+            with open(os.path.join(self.carpeta, MANIFIESTO), encoding='utf-8') as f:
+                entradas = {nombre: tuple(entrada) for nombre, entrada in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Manifiesto de estáticos inválido, se recalcula: {e}")
+        for nombre in self.archivos():
+            ruta = self._ruta(nombre)
+            stat = os.stat(ruta)
+            entrada = entradas.get(nombre)
+            if entrada is None or entrada[1:] != (stat.st_mtime_ns, stat.st_size):
+                entradas[nombre] = (hash_archivo(ruta), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            self._entradas = entradas
+        return self
+
+    def guardar(self):
+        with self._lock:
+            datos = {nombre: list(entrada) for nombre, entrada in sorted(self._entradas.items())}
+        with open(os.path.join(self.carpeta, MANIFIESTO), 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=0)
+
+    def huella(self, nombre):
+        """Huella vigente del archivo, o None si no existe"""
+        ruta = self._ruta(nombre)
+        try:
+            stat = os.stat(ruta) if ruta else None
+        except OSError:
+            stat = None
+        if stat is None:
+            return None
+        entrada = self._entradas.get(nombre)
+        if entrada is not None and entrada[1:] == (stat.st_mtime_ns, stat.st_size):
+            return entrada[0]
+        huella = hash_archivo(ruta)
+        with self._lock:
+            self._entradas[nombre] = (huella, stat.st_mtime_ns, stat.st_size)
+            self.stats['huellas_calculadas'] += 1
+        return huella
+
+    def delegar(self, prefijo, huella):
+        """
+        Las URLs bajo `prefijo` toman la huella de `huella(resto_de_la_ruta)`,
+        un manifiesto en memoria que se mantiene al día por su cuenta (p. ej.
+        el de imágenes de productos): generarlas no hace ningún stat.
+        """
+        self._delegados[prefijo] = huella
+
+    def url(self, nombre):
+        """Nombre con huella para url_for('static', ...); igual si el archivo no existe"""
+        if _es_generado(nombre):
+            return nombre
+        for prefijo, delegado in self._delegados.items():
+            if nombre.startswith(prefijo):
+                huella = delegado(nombre[len(prefijo):])
+                break
+        else:
+            huella = self.huella(nombre)
+        return con_huella(nombre, huella) if huella else nombre
+
+    def _variante(self, nombre):
+        """(archivo, Content-Encoding) precomprimido que acepte el cliente, o None"""
+        if not nombre.endswith(COMPRIMIBLES):
+            return None
+        ruta = self._ruta(nombre)
+        for codificacion, sufijo in CODIFICACIONES:
+            if not request.accept_encodings[codificacion]:
+                continue
+            try:
+                # Una variante más vieja que el original quedó desactualizada
+                if os.stat(ruta + sufijo).st_mtime_ns >= os.stat(ruta).st_mtime_ns:
+                    return nombre + sufijo, codificacion
+            except OSError:
+                continue
+        return None
+
+    def respuesta(self, filename):
+        """Vista para /static/<filename> (reemplaza la de Flask)"""
+        nombre, vigente = filename, False
+        m = _RE_HUELLA.match(filename)
+        ruta = self._ruta(filename)
+        if m and not (ruta and os.path.isfile(ruta)):
+            nombre = m['base'] + m['ext']
+            vigente = m['huella'] == self.huella(nombre)
+
+        if not vigente:
+            # Sin huella o con una vieja: se revalida con ETag/Last-Modified
+            self.stats['sin_huella'] += 1
+            respuesta = send_from_directory(self.carpeta, nombre, max_age=0)
+            respuesta.headers['Cache-Control'] = 'no-cache'
+            return respuesta
+
+        self.stats['inmutables'] += 1
+        variante = self._variante(nombre)
+        if variante is None:
+            respuesta = send_from_directory(self.carpeta, nombre, max_age=UN_ANO)
+        else:
+            archivo, codificacion = variante
+            # El tipo es el del original, no el de .gz/.br
+            tipo = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+            respuesta = send_from_directory(self.carpeta, archivo, max_age=UN_ANO, mimetype=tipo)
+            respuesta.headers['Content-Encoding'] = codificacion
+            self.stats['comprimidos'] += 1
+        respuesta.headers['Cache-Control'] = f'public, max-age={UN_ANO}, immutable'
+        if nombre.endswith(COMPRIMIBLES):
+            respuesta.vary.add('Accept-Encoding')
+        return respuesta
+
+    def generar_variantes(self):
+        """Crea los .gz (y .br si está instalado brotli) de los archivos de texto"""
+        creadas = 0
+        for nombre in self.archivos():
+            if not nombre.endswith(COMPRIMIBLES):
+                continue
+            ruta = self._ruta(nombre)
+            with open(ruta, 'rb') as f:
+                datos = f.read()
+            if len(datos) < MINIMO_COMPRIMIR:
+                continue
+            variantes = [('.gz', gzip.compress(datos, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variantes.append(('.br', brotli.compress(datos, quality=11)))
+            for sufijo, comprimido in variantes:
+                if len(comprimido) < len(datos):
+                    with open(ruta + sufijo, 'wb') as f:
+                        f.write(comprimido)
+                    creadas += 1
+        return creadas
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.stats, archivos=len(self._entradas))
+
+
+if __name__ == '__main__':
+    # Paso de build: variantes precomprimidas + manifest.json
+    manifiesto = ManifiestoEstaticos(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    creadas = manifiesto.generar_variantes()
+    manifiesto.cargar().guardar()
+    if brotli is None:
+        print("brotli no está instalado: solo se generaron variantes .gz")
+    print(f"Estáticos: {creadas} variantes comprimidas, {manifiesto.estadisticas()['archivos']} archivos en {MANIFIESTO}")
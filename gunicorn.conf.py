@@ -0,0 +1,57 @@
+"""
+Configuración de gunicorn para producción (`gunicorn app:app`; gunicorn lee
+este archivo solo desde la carpeta de trabajo).
+
+- workers y threads según los CPU (se pueden fijar con GUNICORN_WORKERS /
+  GUNICORN_THREADS); cada hilo toma a lo sumo una conexión del pool del
+  worker, así que los hilos por defecto no pasan de DB_POOL_MAX
+- preload_app: la app (manifiestos de estáticos e imágenes) se importa una
+  vez en el master; cada worker abre su propio pool de conexiones y carga
+  sus cachés en post_fork, antes de atender
+- los workers se reciclan cada ~1000 peticiones (con jitter para que no
+  reinicien todos juntos) y tienen 30 s para terminar lo que están atendiendo
+- sin modo debug ni recarga de plantillas
+"""
+import multiprocessing
+import os
+
+
+def _entero_env(nombre, defecto):
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+# Antes de importar la app: nada de recargar plantillas en producción
+os.environ['MODO_DESARROLLO'] = '0'
+
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# Las vistas pasan la mayor parte del tiempo esperando a la base: pocos
+# procesos y algunos hilos por proceso
+workers = _entero_env('GUNICORN_WORKERS', min(cpus * 2 + 1, 9))
+worker_class = 'gthread'
+# Un hilo por CPU (mínimo 2, máximo 8) y nunca más que conexiones en el pool
+threads = _entero_env('GUNICORN_THREADS', min(max(2, cpus), 8, _entero_env('DB_POOL_MAX', 10)))
+preload_app = True
+
+max_requests = _entero_env('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = max_requests // 10
+timeout = _entero_env('GUNICORN_TIMEOUT', 60)
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from app import preparar_worker
+    preparar_worker()
+
+
+def worker_exit(server, worker):
+    from app import cerrar_worker
+    cerrar_worker()
@@ -0,0 +1,457 @@
+"""
+Variantes redimensionadas de las imágenes de productos.
+
+static/Paquetes guarda las imágenes tal como se suben (hay PNG de 5000x5000
+y varios MB) y la grilla de /paquetes las mostraba completas en tarjetas de
+300 px. Al subir una imagen se generan copias reducidas en WebP y AVIF
+(si Pillow lo soporta) en static/Paquetes/variantes:
+
+    <nombre>.selector.webp   96 px   (buscadores / selectores)
+    <nombre>.tarjeta.webp   360 px   (tarjetas de la grilla)
+    <nombre>.detalle.webp   720 px   (edición, pantallas 2x)
+
+El lado indicado es el máximo (se conserva la proporción y nunca se agranda).
+Las plantillas arman `<picture>` con `srcset` 1x/2x y la imagen original
+queda como respaldo. Para las imágenes que ya existían:
+
+    python imagenes.py            # genera las variantes que falten
+    python imagenes.py --forzar   # las regenera todas
+
+`ManifiestoImagenes` guarda en memoria qué imágenes y variantes hay (con
+dimensiones, huella y mtime), así renderizar la grilla no lista la carpeta
+ni hace un stat por producto. `BarredorHuerfanas` borra en segundo plano
+las imágenes que ya no corresponden a ningún producto.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from estaticos import hash_archivo
+
+try:
+    from PIL import Image, features
+except ImportError:  # opcional: sin Pillow se sirven solo los originales
+    Image = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso, no hay turno que repartir
+    fcntl = None
+
+CARPETA_VARIANTES = 'variantes'
+# Lado máximo en px, de mayor a menor: cada tamaño se reduce desde el anterior
+TAMANOS = {'detalle': 720, 'tarjeta': 360, 'selector': 96}
+OPCIONES_FORMATO = {
+    'avif': {'quality': 50},
+    'webp': {'quality': 80, 'method': 4},
+}
+# Variantes para 1x y 2x según dónde se muestra la imagen
+DENSIDADES = {
+    'selector': ('selector', 'tarjeta'),
+    'tarjeta': ('tarjeta', 'detalle'),
+    'detalle': ('detalle',),
+}
+EXTENSIONES_ORIGINALES = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+POR_DEFECTO = 'PorDefecto.webp'
+# Cada cuánto se compara el mtime de las carpetas (archivos subidos por otro
+# worker) y cada cuánto se relee todo aunque no haya cambiado
+INTERVALO_REVISION = 2
+TTL_MANIFIESTO = 300
+
+
+def _entero_env(nombre, defecto):
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+# Barrido de imágenes huérfanas: cada cuánto corre (s), cuánto tiene que
+# seguir huérfana una imagen antes de borrarla (s) y si borra de verdad. Por
+# defecto solo informa: el operador lo habilita con BARRIDO_IMAGENES_BORRAR=1
+# después de revisar /debug_imagenes_huerfanas.
+INTERVALO_BARRIDO = _entero_env('BARRIDO_IMAGENES_INTERVALO', 900)
+GRACIA_BARRIDO = _entero_env('BARRIDO_IMAGENES_GRACIA', 3600)
+BORRAR_BARRIDO = os.environ.get('BARRIDO_IMAGENES_BORRAR', '').lower() in ('1', 'true', 'si', 'sí')
+# Archivo de lock que decide qué worker barre (uno solo por máquina)
+LOCK_BARRIDO = os.environ.get('BARRIDO_IMAGENES_LOCK',
+                              os.path.join(tempfile.gettempdir(), 'minibodega-barrido-imagenes.lock'))
+
+
+@lru_cache(maxsize=None)
+def formatos():
+    """Formatos que puede escribir el Pillow instalado, el más liviano primero"""
+    if Image is None:
+        return ()
+    return tuple(formato for formato in OPCIONES_FORMATO if features.check(formato))
+
+
+def nombre_variante(nombre_archivo, tamano, formato):
+    """Ruta de la variante relativa a la carpeta de imágenes"""
+    base = os.path.splitext(nombre_archivo)[0]
+    return f'{CARPETA_VARIANTES}/{base}.{tamano}.{formato}'
+
+
+def _rutas_variantes(carpeta, nombre_archivo):
+    return [os.path.join(carpeta, relativo) for relativo in _variantes_de(nombre_archivo)]
+
+
+def generar_variantes(carpeta, nombre_archivo):
+    """Crea (o reemplaza) las variantes de `carpeta/nombre_archivo`; devuelve cuántas escribió"""
+    disponibles = formatos()
+    if not disponibles:
+        return 0
+    os.makedirs(os.path.join(carpeta, CARPETA_VARIANTES), exist_ok=True)
+    with Image.open(os.path.join(carpeta, nombre_archivo)) as original:
+        # GIF/WebP animados: se usa el primer cuadro
+        imagen = original.convert('RGBA')
+    creadas = 0
+    for tamano, lado in TAMANOS.items():
+        imagen.thumbnail((lado, lado), Image.LANCZOS)
+        for formato in disponibles:
+            destino = os.path.join(carpeta, nombre_variante(nombre_archivo, tamano, formato))
+            # Se escribe aparte y se reemplaza: nunca se sirve una variante a medias
+            temporal = destino + '.tmp'
+            imagen.save(temporal, format=formato.upper(), **OPCIONES_FORMATO[formato])
+            os.replace(temporal, destino)
+            creadas += 1
+    return creadas
+
+
+def borrar_variantes(carpeta, nombre_archivo):
+    for ruta in _rutas_variantes(carpeta, nombre_archivo):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+def renombrar_variantes(carpeta, anterior, nuevo):
+    for origen, destino in zip(_rutas_variantes(carpeta, anterior), _rutas_variantes(carpeta, nuevo)):
+        if os.path.exists(origen):
+            os.replace(origen, destino)
+
+
+def variantes_vigentes(carpeta, nombre_archivo):
+    """Si todas las variantes existen y son más nuevas que el original"""
+    original = os.stat(os.path.join(carpeta, nombre_archivo)).st_mtime_ns
+    for tamano in TAMANOS:
+        for formato in formatos():
+            try:
+                if os.stat(os.path.join(carpeta, nombre_variante(nombre_archivo, tamano, formato))).st_mtime_ns < original:
+                    return False
+            except FileNotFoundError:
+                return False
+    return True
+
+
+def completar_variantes(carpeta, forzar=False):
+    """Backfill: genera las variantes que falten; devuelve (imágenes procesadas, errores)"""
+    procesadas = errores = 0
+    for nombre in sorted(os.listdir(carpeta)):
+        if not nombre.lower().endswith(EXTENSIONES_ORIGINALES) or not os.path.isfile(os.path.join(carpeta, nombre)):
+            continue
+        if not forzar and variantes_vigentes(carpeta, nombre):
+            continue
+        try:
+            generar_variantes(carpeta, nombre)
+            procesadas += 1
+            print(f"Variantes generadas: {nombre}")
+        except (OSError, ValueError) as e:
+            errores += 1
+            print(f"Error al generar variantes de {nombre}: {e}")
+    return procesadas, errores
+
+
+Imagen = namedtuple('Imagen', 'huella mtime tamano ancho alto')
+_SIN_DIMENSIONES = (None, None)
+
+
+def _dimensiones(ruta):
+    """(ancho, alto) leyendo solo la cabecera del archivo"""
+    if Image is None:
+        return _SIN_DIMENSIONES
+    try:
+        with Image.open(ruta) as imagen:
+            return imagen.size
+    except (OSError, ValueError):
+        return _SIN_DIMENSIONES
+
+
+class ManifiestoImagenes:
+    """
+    Imágenes de productos y sus variantes en memoria: ruta relativa a la
+    carpeta ('355ml.png', 'variantes/355ml.tarjeta.webp') -> Imagen.
+
+    Las subidas, renombres y borrados de este worker lo actualizan al
+    momento (`actualizar`, `renombrar`, `quitar`). Los cambios de otros
+    workers se detectan comparando el mtime de las carpetas como mucho cada
+    `INTERVALO_REVISION` segundos; al releer se reutilizan las huellas de
+    los archivos que no cambiaron.
+    """
+
+    def __init__(self, carpeta, nombre_de, intervalo=INTERVALO_REVISION, ttl=TTL_MANIFIESTO):
+        self.carpeta = carpeta
+        self.nombre_de = nombre_de
+        self.intervalo = intervalo
+        self.ttl = ttl
+        self._entradas = {}
+        self._nombres = {}
+        self._mtimes = None
+        self._cargado_en = 0.0
+        self._proxima_revision = 0.0
+        self._lock = threading.RLock()
+        self.stats = {'cargas': 0, 'revisiones': 0, 'huellas_calculadas': 0}
+
+    def _mtimes_carpetas(self):
+        mtimes = []
+        for ruta in (self.carpeta, os.path.join(self.carpeta, CARPETA_VARIANTES)):
+            try:
+                mtimes.append(os.stat(ruta).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _leer(self, relativo, anterior=None):
+        """Imagen para `relativo`, reutilizando `anterior` si el archivo no cambió"""
+        ruta = os.path.join(self.carpeta, relativo)
+        stat = os.stat(ruta)
+        if anterior is not None and (anterior.mtime, anterior.tamano) == (stat.st_mtime_ns, stat.st_size):
+            return anterior
+        self.stats['huellas_calculadas'] += 1
+        ancho, alto = _dimensiones(ruta) if not relativo.startswith(CARPETA_VARIANTES + '/') else _SIN_DIMENSIONES
+        return Imagen(hash_archivo(ruta), stat.st_mtime_ns, stat.st_size, ancho, alto)
+
+    def _relativos(self):
+        for carpeta, prefijo in ((self.carpeta, ''), (os.path.join(self.carpeta, CARPETA_VARIANTES), CARPETA_VARIANTES + '/')):
+            try:
+                nombres = os.listdir(carpeta)
+            except FileNotFoundError:
+                continue
+            for nombre in nombres:
+                if nombre.lower().endswith(EXTENSIONES_ORIGINALES + tuple(OPCIONES_FORMATO)):
+                    yield prefijo + nombre
+
+    def cargar(self):
+        with self._lock:
+            mtimes = self._mtimes_carpetas()
+            anteriores = self._entradas
+            entradas = {}
+            for relativo in self._relativos():
+                try:
+                    entradas[relativo] = self._leer(relativo, anteriores.get(relativo))
+                except OSError:
+                    continue
+            self._entradas = entradas
+            self._mtimes = mtimes
+            self._cargado_en = time.monotonic()
+            self.stats['cargas'] += 1
+        return self
+
+    def _revisar(self):
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return
+        with self._lock:
+            if ahora < self._proxima_revision:
+                return
+            self._proxima_revision = ahora + self.intervalo
+            self.stats['revisiones'] += 1
+            if self._mtimes_carpetas() != self._mtimes or ahora - self._cargado_en > self.ttl:
+                self.cargar()
+
+    def actualizar(self, nombre_archivo):
+        """Tras guardar una imagen (y sus variantes) en este worker"""
+        with self._lock:
+            entradas = dict(self._entradas)
+            for relativo in [nombre_archivo] + _variantes_de(nombre_archivo):
+                try:
+                    entradas[relativo] = self._leer(relativo)
+                except OSError:
+                    entradas.pop(relativo, None)
+            self._entradas = entradas
+
+    def quitar(self, nombre_archivo):
+        with self._lock:
+            entradas = dict(self._entradas)
+            for relativo in [nombre_archivo] + _variantes_de(nombre_archivo):
+                entradas.pop(relativo, None)
+            self._entradas = entradas
+
+    def renombrar(self, anterior, nuevo):
+        with self._lock:
+            entradas = dict(self._entradas)
+            for origen, destino in zip([anterior] + _variantes_de(anterior), [nuevo] + _variantes_de(nuevo)):
+                imagen = entradas.pop(origen, None)
+                if imagen is not None:
+                    entradas[destino] = imagen
+            self._entradas = entradas
+        # El renombre conserva el mtime: se relee para tener el de este stat
+        self.actualizar(nuevo)
+
+    def huella(self, relativo):
+        """Huella de un archivo de la carpeta (None si no está), sin tocar el disco"""
+        self._revisar()
+        imagen = self._entradas.get(relativo)
+        return imagen.huella if imagen else None
+
+    def imagen(self, nombre_archivo):
+        self._revisar()
+        return self._entradas.get(nombre_archivo)
+
+    def archivo_de(self, descripcion):
+        """Archivo de la imagen de un producto: el suyo si existe, si no el de por defecto"""
+        nombre = self._nombres.get(descripcion)
+        if nombre is None:
+            if len(self._nombres) > 4096:
+                self._nombres.clear()
+            nombre = self._nombres[descripcion] = self.nombre_de(descripcion)
+        self._revisar()
+        return nombre if nombre in self._entradas else POR_DEFECTO
+
+    def archivos(self):
+        """Imágenes originales (sin variantes) conocidas"""
+        self._revisar()
+        return {relativo for relativo in self._entradas if '/' not in relativo}
+
+    def estadisticas(self):
+        return dict(self.stats, archivos=len(self._entradas))
+
+
+class BarredorHuerfanas:
+    """
+    Borra en segundo plano las imágenes que no corresponden a ningún producto
+    activo (antes se hacía dentro de cada alta/edición, listando la carpeta).
+
+    Las candidatas salen del manifiesto y de `esperadas()` (los archivos de
+    los productos activos). Una imagen se borra recién cuando lleva
+    `gracia` segundos huérfana en barridos sucesivos: así no se toca una
+    imagen recién subida o renombrada cuyo producto todavía no se guardó.
+    Con `simular` (el valor por defecto) solo se informa qué se borraría
+    (`ultimo_reporte`).
+
+    Todos los workers arrancan el hilo, pero solo barre el que tiene el lock
+    de `ruta_lock` (flock sin espera): los demás lo reintentan en cada
+    intervalo y uno lo toma si el que barría se recicla o muere. El lock es
+    local a la máquina; con varias máquinas sobre la misma carpeta hay que
+    dejar el barrido habilitado en una sola.
+    """
+
+    def __init__(self, manifiesto, esperadas, intervalo=INTERVALO_BARRIDO,
+                 gracia=GRACIA_BARRIDO, simular=not BORRAR_BARRIDO, ruta_lock=LOCK_BARRIDO):
+        self.manifiesto = manifiesto
+        self.esperadas = esperadas
+        self.intervalo = intervalo
+        self.gracia = gracia
+        self.simular = simular
+        self.ruta_lock = ruta_lock
+        # archivo -> time.time() del primer barrido que lo vio huérfano
+        self._huerfanas_desde = {}
+        self._pid = None
+        self._archivo_lock = None
+        self._lock = threading.Lock()
+        self.ultimo_reporte = None
+        self.stats = {'barridos': 0, 'borradas': 0, 'errores': 0}
+
+    def candidatas(self):
+        esperadas = self.esperadas()
+        return sorted(archivo for archivo in self.manifiesto.archivos()
+                      if archivo.endswith('.png') and archivo != POR_DEFECTO and archivo not in esperadas)
+
+    def barrer(self, simular=None):
+        """Un barrido; devuelve el reporte (borradas, en gracia, errores)"""
+        simular = self.simular if simular is None else simular
+        huerfanas = self.candidatas()
+        ahora = time.time()
+        with self._lock:
+            # Una imagen que volvió a tener producto pierde su antigüedad
+            self._huerfanas_desde = {archivo: self._huerfanas_desde.get(archivo, ahora) for archivo in huerfanas}
+            desde = dict(self._huerfanas_desde)
+        reporte = {'fecha': time.strftime('%Y-%m-%d %H:%M:%S'), 'simulado': simular,
+                   'gracia': self.gracia, 'borradas': [], 'en_gracia': [], 'errores': []}
+        for archivo in huerfanas:
+            restante = self.gracia - (ahora - desde[archivo])
+            if restante > 0:
+                reporte['en_gracia'].append({'archivo': archivo, 'restante': round(restante)})
+                continue
+            if not simular:
+                try:
+                    os.remove(os.path.join(self.manifiesto.carpeta, archivo))
+                    borrar_variantes(self.manifiesto.carpeta, archivo)
+                except FileNotFoundError:
+                    pass  # otro worker la borró primero
+                except OSError as e:
+                    reporte['errores'].append({'archivo': archivo, 'error': str(e)})
+                    print(f"Error al eliminar {archivo}: {e}")
+                    continue
+                self.manifiesto.quitar(archivo)
+                print(f"Imagen huérfana eliminada: {archivo}")
+            reporte['borradas'].append(archivo)
+        with self._lock:
+            self.stats['barridos'] += 1
+            self.stats['errores'] += len(reporte['errores'])
+            if not simular:
+                self.stats['borradas'] += len(reporte['borradas'])
+                for archivo in reporte['borradas']:
+                    self._huerfanas_desde.pop(archivo, None)
+            self.ultimo_reporte = reporte
+        return reporte
+
+    def tomar_turno(self):
+        """True si este proceso es el que barre (lo sigue siendo hasta que termina)"""
+        if self._archivo_lock is not None or fcntl is None:
+            return True
+        archivo = open(self.ruta_lock, 'a')
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            return False
+        self._archivo_lock = archivo
+        print(f"Barrido de imágenes huérfanas a cargo del proceso {os.getpid()}")
+        return True
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                if self.tomar_turno():
+                    self.barrer()
+            except Exception as e:
+                print(f"Error en limpieza de imágenes huérfanas: {e}")
+
+    def asegurar_en_marcha(self):
+        """Arranca el hilo del barrido en este proceso (una vez; de nuevo tras un fork)"""
+        if self._pid == os.getpid() or self.intervalo <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # El turno es del proceso que tomó el lock, no de sus hijos
+            self._archivo_lock = None
+        threading.Thread(target=self._bucle, name='barrido-imagenes', daemon=True).start()
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.stats, en_gracia=len(self._huerfanas_desde), simular=self.simular,
+                        intervalo=self.intervalo, gracia=self.gracia,
+                        barre_este_proceso=self._archivo_lock is not None)
+
+
+def _variantes_de(nombre_archivo):
+    return [nombre_variante(nombre_archivo, tamano, formato)
+            for tamano in TAMANOS for formato in OPCIONES_FORMATO]
+
+
+if __name__ == '__main__':
+    if Image is None:
+        sys.exit("Pillow no está instalado: pip install Pillow")
+    carpeta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'Paquetes')
+    procesadas, errores = completar_variantes(carpeta, forzar='--forzar' in sys.argv[1:])
+    print(f"Imágenes: {procesadas} procesadas, {errores} con error (formatos: {', '.join(formatos())})")
+    sys.exit(1 if errores else 0)
@@ -0,0 +1,164 @@
+"""
+Instrumentación de consultas por petición.
+
+Cada sentencia que pasa por el repositorio se mide y se anota en el registro
+de la petición en curso (un ContextVar, así cada hilo/petición tiene el suyo):
+
+- cantidad de sentencias y tiempo total en la base
+- las sentencias más lentas, con el SQL normalizado (literales -> ?)
+- sentencias con la misma forma repetidas muchas veces (patrón N+1)
+
+Las sentencias que superan DB_SLOW_MS se registran siempre, haya o no
+petición activa. Las vistas pueden declarar un presupuesto máximo de
+consultas con `@presupuesto_consultas(n)`; al excederlo se avisa en el log y,
+con `app.config['PRESUPUESTO_CONSULTAS_ESTRICTO'] = True` (pruebas), la
+petición falla con `PresupuestoExcedido`.
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+
+def _entero_env(nombre, defecto):
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+# Umbral de consulta lenta (ms) y repeticiones de una misma forma que se
+# consideran N+1
+UMBRAL_LENTA_MS = _entero_env('DB_SLOW_MS', 500)
+UMBRAL_N_MAS_1 = _entero_env('DB_N_MAS_1', 5)
+MAX_LENTAS = 5
+
+_registro_actual = ContextVar('registro_consultas', default=None)
+
+_RE_CADENA = re.compile(r"N?'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_RE_ESPACIOS = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def normalizar_sql(sql):
+    """Forma de la sentencia: sin literales, listas IN colapsadas y espacios simples"""
+    sql = _RE_CADENA.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(?...)', sql)
+    return _RE_ESPACIOS.sub(' ', sql).strip()
+
+
+class PresupuestoExcedido(Exception):
+    """Una vista ejecutó más consultas de las que declara su presupuesto"""
+
+
+class RegistroConsultas:
+    """Sentencias ejecutadas durante una petición"""
+
+    def __init__(self, etiqueta=''):
+        self.etiqueta = etiqueta
+        self.cantidad = 0
+        self.tiempo = 0.0
+        self.formas = Counter()
+        self._lentas = []
+        # Las consultas en paralelo (db.en_paralelo) anotan desde otros hilos
+        self._lock = threading.Lock()
+
+    def anotar(self, sql, duracion, filas=1):
+        forma = normalizar_sql(sql)
+        with self._lock:
+            self.cantidad += 1
+            self.tiempo += duracion
+            self.formas[forma] += 1
+            self._lentas.append((duracion, forma, filas))
+            if len(self._lentas) > MAX_LENTAS * 4:
+                self._lentas.sort(reverse=True)
+                del self._lentas[MAX_LENTAS:]
+
+    def lentas(self, n=MAX_LENTAS):
+        return [
+            {'sql': forma, 'ms': round(duracion * 1000, 2), 'filas': filas}
+            for duracion, forma, filas in sorted(self._lentas, reverse=True)[:n]
+        ]
+
+    def repetidas(self, umbral=None):
+        """Formas ejecutadas `umbral` veces o más (posible N+1)"""
+        umbral = UMBRAL_N_MAS_1 if umbral is None else umbral
+        return {forma: veces for forma, veces in self.formas.most_common() if veces >= umbral}
+
+    def resumen(self):
+        return {
+            'etiqueta': self.etiqueta,
+            'consultas': self.cantidad,
+            'tiempo_ms': round(self.tiempo * 1000, 2),
+            'lentas': self.lentas(),
+            'n_mas_1': self.repetidas(),
+        }
+
+
+def iniciar_registro(etiqueta=''):
+    registro = RegistroConsultas(etiqueta)
+    return registro, _registro_actual.set(registro)
+
+
+def terminar_registro(token):
+    _registro_actual.reset(token)
+
+
+def registro_actual():
+    return _registro_actual.get()
+
+
+@contextmanager
+def registrar_consultas(etiqueta=''):
+    """Registro fuera de una petición (scripts, pruebas): `with registrar_consultas() as r:`"""
+    registro, token = iniciar_registro(etiqueta)
+    try:
+        yield registro
+    finally:
+        terminar_registro(token)
+
+
+@contextmanager
+def medir(sql, filas=1):
+    """Mide una sentencia y la anota en el registro de la petición actual"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        registro = _registro_actual.get()
+        if registro is not None:
+            registro.anotar(sql, duracion, filas)
+        if duracion * 1000 >= UMBRAL_LENTA_MS:
+            etiqueta = f' [{registro.etiqueta}]' if registro is not None and registro.etiqueta else ''
+            print(f"Consulta lenta{etiqueta} ({duracion * 1000:.0f} ms): {normalizar_sql(sql)}")
+
+
+def presupuesto_consultas(maximo):
+    """Declara cuántas consultas puede ejecutar una vista como máximo"""
+    def decorador(f):
+        f.presupuesto_consultas = maximo
+        return f
+    return decorador
+
+
+# Resúmenes de las últimas peticiones, para /debug_consultas
+_recientes = deque(maxlen=50)
+_recientes_lock = threading.Lock()
+
+
+def guardar_resumen(resumen):
+    with _recientes_lock:
+        _recientes.append(resumen)
+
+
+def resumenes_recientes():
+    with _recientes_lock:
+        return list(_recientes)
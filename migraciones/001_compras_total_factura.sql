@@ -0,0 +1,11 @@
+-- Total de la factura guardado al finalizar la compra.
+-- /compras lo lee directamente en lugar de ejecutar ObtenerTotalFactura por
+-- cada fila; las compras aún abiertas (NULL) suman sus detalles al vuelo.
+IF COL_LENGTH('dbo.Compras', 'TotalFactura') IS NULL
+    ALTER TABLE dbo.Compras ADD TotalFactura DECIMAL(18, 2) NULL;
+GO
+
+-- Índice para sumar los detalles de una compra sin recorrer la tabla
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_DetallesDeCompras_Id_Compra')
+    CREATE INDEX IX_DetallesDeCompras_Id_Compra ON dbo.DetallesDeCompras (Id_Compra) INCLUDE (TotalConIVA);
+GO
@@ -0,0 +1,5 @@
+-- Índice para buscar detalles por venta (número exacto, rango o últimas N)
+-- en /detalles_ventas sin recorrer toda la tabla
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_DetalleVenta_Id_Venta')
+    CREATE INDEX IX_DetalleVenta_Id_Venta ON dbo.DetalleVenta (Id_Venta) INCLUDE (Papelera);
+GO
@@ -0,0 +1,9 @@
+-- Tokens de "recuérdame" revocados al cerrar sesión. Cada worker lee los
+-- vigentes (Expira > ahora) cada minuto junto con la tabla Usuario; las filas
+-- vencidas se borran al revocar nuevos tokens.
+IF OBJECT_ID('dbo.RecuerdameRevocados', 'U') IS NULL
+    CREATE TABLE dbo.RecuerdameRevocados (
+        Jti    NVARCHAR(64) NOT NULL PRIMARY KEY,
+        Expira DATETIME NOT NULL
+    );
+GO
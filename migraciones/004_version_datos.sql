@@ -0,0 +1,122 @@
+-- Versiones de datos para los ETags de los listados (versiones.py): un
+-- contador por tabla que sube con cada INSERT/UPDATE/DELETE. Las vistas
+-- leen esta tabla (9 filas) para decidir si responden 304 Not Modified.
+--
+-- Compras recibe su trigger en 006_version_compras.sql.
+--
+-- Costo: el trigger actualiza la fila de su tabla dentro de la transacción
+-- que escribe, y el lock de esa fila dura hasta el commit. Dos transacciones
+-- que escriben en la misma tabla se esperan una a la otra en ese UPDATE
+-- aunque toquen filas distintas. Con pocas cajas y transacciones cortas la
+-- espera no se nota. Si llegara a notarse, la clave se puede afinar
+-- (p. ej. una fila por tabla y venta/compra) a cambio de que el ETag lea
+-- más filas.
+IF OBJECT_ID('dbo.VersionDatos', 'U') IS NULL
+    CREATE TABLE dbo.VersionDatos (
+        Tabla   NVARCHAR(64) NOT NULL PRIMARY KEY,
+        Version BIGINT NOT NULL DEFAULT 0
+    );
+GO
+
+INSERT INTO dbo.VersionDatos (Tabla, Version)
+SELECT t.Tabla, 0
+FROM (VALUES ('Paquete'), ('Proveedor'), ('Venta'), ('DetalleVenta'), ('Compras'),
+             ('DetallesDeCompras'), ('Empleado'), ('Notas'), ('GananciaDiaria')) AS t (Tabla)
+WHERE NOT EXISTS (SELECT 1 FROM dbo.VersionDatos v WHERE v.Tabla = t.Tabla);
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_Paquete_Version
+ON dbo.Paquete
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'Paquete';
+END;
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_Proveedor_Version
+ON dbo.Proveedor
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'Proveedor';
+END;
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_Venta_Version
+ON dbo.Venta
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'Venta';
+END;
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_DetalleVenta_Version
+ON dbo.DetalleVenta
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'DetalleVenta';
+END;
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_DetallesDeCompras_Version
+ON dbo.DetallesDeCompras
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'DetallesDeCompras';
+END;
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_Empleado_Version
+ON dbo.Empleado
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'Empleado';
+END;
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_Notas_Version
+ON dbo.Notas
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'Notas';
+END;
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_GananciaDiaria_Version
+ON dbo.GananciaDiaria
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'GananciaDiaria';
+END;
+GO
@@ -0,0 +1,22 @@
+-- Buzón de salida de correos (correo.py). recuperar_contrasena guarda el
+-- correo en la misma transacción que el código y responde enseguida; un
+-- hilo de cada worker los envía reutilizando la conexión SMTP y reintenta
+-- con espera creciente. Estado: 'pendiente', 'enviado' o 'fallido'.
+IF OBJECT_ID('dbo.CorreosPendientes', 'U') IS NULL
+    CREATE TABLE dbo.CorreosPendientes (
+        Id_Correo      INT IDENTITY(1,1) NOT NULL PRIMARY KEY,
+        Destinatario   NVARCHAR(320) NOT NULL,
+        Asunto         NVARCHAR(200) NOT NULL,
+        Cuerpo         NVARCHAR(MAX) NOT NULL,
+        Estado         NVARCHAR(16) NOT NULL DEFAULT 'pendiente',
+        Intentos       INT NOT NULL DEFAULT 0,
+        ProximoIntento DATETIME NOT NULL,
+        UltimoError    NVARCHAR(500) NULL,
+        Creado         DATETIME NOT NULL,
+        Enviado        DATETIME NULL
+    );
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_CorreosPendientes_Estado')
+    CREATE INDEX IX_CorreosPendientes_Estado ON dbo.CorreosPendientes (Estado, ProximoIntento);
+GO
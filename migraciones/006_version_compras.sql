@@ -0,0 +1,26 @@
+-- Versión de Compras por trigger, como las demás tablas de VersionDatos.
+-- Antes CompraRepo la subía a mano porque el INSERT usaba OUTPUT INSERTED
+-- sin INTO, que SQL Server no permite en tablas con triggers. Ahora la
+-- compra se crea con CrearCompra, que devuelve el id con SCOPE_IDENTITY.
+-- El procedimiento va primero: el trigger rompe el INSERT ... OUTPUT viejo.
+CREATE OR ALTER PROCEDURE dbo.CrearCompra
+    @Id_Proveedor INT
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO dbo.Compras (Id_Proveedor) VALUES (@Id_Proveedor);
+    SELECT CAST(SCOPE_IDENTITY() AS INT) AS Id_Compra;
+END;
+GO
+
+CREATE OR ALTER TRIGGER dbo.trg_Compras_Version
+ON dbo.Compras
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    UPDATE dbo.VersionDatos SET Version = Version + 1 WHERE Tabla = 'Compras';
+END;
+GO
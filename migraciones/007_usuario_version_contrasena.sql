@@ -0,0 +1,9 @@
+-- Versión de la contraseña para los tokens de "recuérdame" (recuerdame.py).
+-- Sube con cada cambio de contraseña; el token guarda la versión con la que
+-- se emitió y deja de valer cuando no coincide. Antes el token llevaba un
+-- HMAC de la contraseña guardada, que permitía adivinarla fuera de línea con
+-- una cookie robada.
+IF COL_LENGTH('dbo.Usuario', 'VersionContrasena') IS NULL
+    ALTER TABLE dbo.Usuario ADD VersionContrasena INT NOT NULL
+        CONSTRAINT DF_Usuario_VersionContrasena DEFAULT 0;
+GO
@@ -0,0 +1,138 @@
+"""
+Renderizado de páginas por bloques.
+
+Las páginas extienden base.html (sidebar, estilos y scripts: ~800 líneas) y
+solo cambian sus bloques styles, content y modals. En lugar de renderizar el
+layout completo en cada petición:
+
+- la navegación AJAX recibe solo los bloques de la página
+- las cargas completas usan el layout ya renderizado ("capa") de base.html,
+  cacheado por (tipo de usuario, sección del menú), y solo renderizan los
+  bloques de la página entre sus partes
+
+base.html solo puede depender de `seccion` y `session.tipo` (más url_for de
+estáticos); cualquier otra variable tendría que agregarse a la clave. La
+caché se descarta al reiniciar (deploy) y cuando Jinja recarga base.html
+porque cambió el archivo.
+"""
+import threading
+
+from jinja2 import nodes
+
+BLOQUES = ('styles', 'content', 'modals')
+_MARCA = '\x00bloque:{}\x00'
+
+# Sección del menú lateral según el endpoint
+_SECCIONES = (
+    ('paquetes', ('paquete',)),
+    ('ventas', ('venta', 'ganancia')),
+    ('compras', ('compra', 'carrito')),
+    ('empleados', ('empleado', 'nomina', 'nota')),
+)
+
+
+def seccion_de(endpoint):
+    if not endpoint:
+        return ''
+    if endpoint == 'index':
+        return 'inicio'
+    for seccion, claves in _SECCIONES:
+        if any(clave in endpoint for clave in claves):
+            return seccion
+    return ''
+
+
+class RenderizadorPaginas:
+    def __init__(self, app, base='base.html'):
+        self.app = app
+        self.base = base
+        self._plantilla_capa = app.jinja_env.from_string(
+            f"{{% extends '{base}' %}}"
+            + ''.join(f'{{% block {b} %}}{_MARCA.format(b)}{{% endblock %}}' for b in BLOQUES))
+        self._capas = {}
+        self._base_cargada = None
+        self._lock = threading.Lock()
+        self.stats = {'aciertos': 0, 'fallos': 0}
+
+    def _contexto(self, contexto):
+        self.app.update_template_context(contexto)
+        return contexto
+
+    def extiende_base(self, plantilla):
+        """Si la plantilla extiende directamente base.html (se calcula una vez por plantilla cargada)"""
+        extiende = getattr(plantilla, '_extiende_base', None)
+        if extiende is None:
+            entorno = self.app.jinja_env
+            fuente = entorno.loader.get_source(entorno, plantilla.name)[0]
+            extiende = any(
+                isinstance(nodo.template, nodes.Const) and nodo.template.value == self.base
+                for nodo in entorno.parse(fuente).find_all(nodes.Extends)
+            )
+            plantilla._extiende_base = extiende
+        return extiende
+
+    def _bloques(self, plantilla, contexto):
+        """{bloque: html} de la plantilla, sin el layout"""
+        ctx = plantilla.new_context(contexto)
+        resultado = {}
+        for nombre in BLOQUES:
+            render = plantilla.blocks.get(nombre)
+            if render is not None:
+                resultado[nombre] = ''.join(render(ctx))
+            else:
+                # Bloque que la página no define: el contenido por defecto de base.html
+                base = self.app.jinja_env.get_template(self.base)
+                render = base.blocks.get(nombre)
+                resultado[nombre] = ''.join(render(base.new_context(contexto))) if render else ''
+        return resultado
+
+    def fragmentos(self, template, contexto):
+        """(content, modals) envueltos en los contenedores de base.html"""
+        plantilla = self.app.jinja_env.get_or_select_template(template)
+        bloques = self._bloques(plantilla, self._contexto(contexto))
+        content = f'{bloques["styles"]}<div class="content" style="height: 100%;">{bloques["content"]}</div>'
+        modals = f'<div id="dynamic-modals" data-modals>{bloques["modals"]}</div>'
+        return content, modals
+
+    def capa(self, contexto):
+        """Partes del layout renderizado entre las que van los bloques de la página"""
+        base = self.app.jinja_env.get_template(self.base)
+        clave = (contexto.get('session', {}).get('tipo'), contexto.get('seccion', ''))
+        with self._lock:
+            if base is not self._base_cargada:
+                # base.html se recargó (cambió el archivo): se descarta todo
+                self._capas.clear()
+                self._base_cargada = base
+            partes = self._capas.get(clave)
+            if partes is not None:
+                self.stats['aciertos'] += 1
+                return partes
+            self.stats['fallos'] += 1
+        html = self._plantilla_capa.render(contexto)
+        partes = []
+        for nombre in BLOQUES:
+            antes, html = html.split(_MARCA.format(nombre), 1)
+            partes.append(antes)
+        partes.append(html)
+        with self._lock:
+            if base is self._base_cargada:
+                self._capas[clave] = partes
+        return partes
+
+    def pagina(self, template, contexto):
+        """HTML completo: capa cacheada + bloques de la página"""
+        plantilla = self.app.jinja_env.get_or_select_template(template)
+        contexto = self._contexto(contexto)
+        if not self.extiende_base(plantilla):
+            return plantilla.render(contexto)
+        bloques = self._bloques(plantilla, contexto)
+        partes = self.capa(contexto)
+        html = [partes[0]]
+        for nombre, parte in zip(BLOQUES, partes[1:]):
+            html.append(bloques[nombre])
+            html.append(parte)
+        return ''.join(html)
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.stats, capas=len(self._capas))
@@ -0,0 +1,121 @@
+"""
+Sesiones recordadas ("Recuérdame") con tokens firmados.
+
+Antes la cookie guardaba el nombre de usuario en texto plano y cada petición
+sin sesión lo buscaba en la base. Ahora la cookie lleva un token firmado con
+SECRET_KEY (itsdangerous, incluido con Flask) que vence a los 30 días y se
+verifica en memoria:
+
+- la firma y la fecha se comprueban sin tocar la base
+- que el usuario siga existiendo, su tipo actual y que no haya cambiado su
+  contraseña (Usuario.VersionContrasena, que sube con cada cambio) se
+  comprueban contra una copia en memoria de la tabla Usuario. El token no
+  lleva nada derivado de la contraseña
+- los tokens revocados (logout) se guardan en RecuerdameRevocados
+
+Sin secreto (SECRET_KEY sin configurar) no se emiten ni aceptan tokens.
+
+La copia de usuarios y revocados se recarga cada `TTL_REVOCACIONES`
+segundos; en el caso común restaurar una sesión no hace ninguna consulta.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+NOMBRE_COOKIE = 'recuerdame'
+DURACION = timedelta(days=30)
+TTL_REVOCACIONES = 60
+# Tras un error al recargar se reintenta antes que el TTL completo
+REINTENTO_ERROR = 5
+
+
+class Recuerdame:
+    """
+    Emite y verifica tokens. `cargar()` devuelve (usuarios, revocados):
+    filas (Id_Usuario, NUsuario, Tipo, VersionContrasena) y los jti revocados.
+    """
+
+    def __init__(self, secreto, cargar, duracion=DURACION, ttl=TTL_REVOCACIONES):
+        self.habilitado = bool(secreto)
+        self._firmador = URLSafeTimedSerializer(secreto, salt='recuerdame') if secreto else None
+        self._cargar = cargar
+        self.duracion = duracion
+        self.ttl = ttl
+        self._usuarios = None
+        self._revocados = set()
+        self._proxima_carga = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'verificados': 0, 'rechazados': 0, 'cargas': 0, 'errores_carga': 0}
+
+    def emitir(self, id_usuario, version_contrasena):
+        """Token para la cookie; `expira` es la fecha para `set_cookie`"""
+        if not self.habilitado:
+            raise RuntimeError("'Recuérdame' deshabilitado: falta SECRET_KEY")
+        datos = {'id': id_usuario, 'v': int(version_contrasena or 0), 'j': secrets.token_urlsafe(9)}
+        return self._firmador.dumps(datos), datetime.now() + self.duracion
+
+    def _leer(self, token):
+        if not self.habilitado:
+            return None
+        try:
+            datos = self._firmador.loads(token, max_age=self.duracion.total_seconds())
+        except BadSignature:
+            return None
+        return datos if isinstance(datos, dict) else None
+
+    def verificar(self, token):
+        """(Id_Usuario, NUsuario, Tipo) si el token es válido, si no None"""
+        datos = self._leer(token) if token else None
+        if datos is None:
+            self.stats['rechazados'] += 1
+            return None
+        self._asegurar()
+        usuario = (self._usuarios or {}).get(datos.get('id'))
+        # Un cambio de contraseña sube la versión: los tokens anteriores no valen
+        if usuario is None or datos.get('j') in self._revocados or datos.get('v') != usuario[3]:
+            self.stats['rechazados'] += 1
+            return None
+        self.stats['verificados'] += 1
+        return usuario[:3]
+
+    def revocar(self, token, guardar):
+        """
+        Revoca el token en este worker de inmediato y lo persiste con
+        `guardar(jti, expira)` para que los demás lo vean en su próxima recarga.
+        """
+        datos = self._leer(token) if token else None
+        if datos is None or not datos.get('j'):
+            return
+        with self._lock:
+            self._revocados.add(datos['j'])
+        guardar(datos['j'], datetime.now() + self.duracion)
+
+    def invalidar(self):
+        """Fuerza la recarga en la próxima verificación (p. ej. tras cambiar una contraseña)"""
+        self._proxima_carga = 0.0
+
+    def _asegurar(self):
+        if time.monotonic() < self._proxima_carga:
+            return
+        with self._lock:
+            if time.monotonic() < self._proxima_carga:
+                return
+            try:
+                usuarios, revocados = self._cargar()
+            except Exception as e:
+                # Se conserva la copia anterior (si la hay) y se reintenta pronto
+                self.stats['errores_carga'] += 1
+                self._proxima_carga = time.monotonic() + REINTENTO_ERROR
+                print(f"Error al recargar usuarios para 'recuérdame': {e}")
+                return
+            self._usuarios = {fila[0]: (fila[0], fila[1], fila[2], fila[3] or 0) for fila in usuarios}
+            self._revocados = set(revocados)
+            self._proxima_carga = time.monotonic() + self.ttl
+            self.stats['cargas'] += 1
+
+    def estadisticas(self):
+        return dict(self.stats, habilitado=self.habilitado, usuarios=len(self._usuarios or {}),
+                    revocados=len(self._revocados))
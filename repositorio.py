@@ -0,0 +1,1018 @@
+"""
+Capa de acceso a datos.
+
+Todo el SQL de la aplicación vive aquí, agrupado por tabla. Las vistas de
+app.py piden los datos a través de `Repositorio(conn)` en lugar de escribir
+consultas inline, de modo que el acceso a la base se puede medir y ajustar en
+un solo lugar.
+
+- Cada sentencia se ejecuta sobre un cursor cacheado por conexión
+  (`conn.sentencias`), así pyodbc reutiliza la sentencia ya preparada.
+- Las operaciones por lotes usan `fast_executemany`: insertar 200 líneas de
+  venta o de carrito es un solo viaje a la base en lugar de 200.
+- Cada ejecución se mide con `instrumentacion.medir` (conteo por petición,
+  consultas lentas y detección de N+1).
+"""
+import base64
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from db import en_paralelo
+from instrumentacion import medir
+
+
+class _RepoBase:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _tras_commit(self, funcion):
+        """Ejecuta `funcion` cuando se confirme la transacción de la conexión"""
+        al_confirmar = getattr(self.conn, 'al_confirmar', None)
+        if al_confirmar is None:
+            funcion()
+        else:
+            al_confirmar(funcion)
+
+    def _cursor(self, sql):
+        cache = getattr(self.conn, 'sentencias', None)
+        if cache is None:
+            return self.conn.cursor()
+        return cache.cursor(self.conn.raw, sql)
+
+    def _ejecutar(self, sql, params=()):
+        cursor = self._cursor(sql)
+        try:
+            with medir(sql):
+                cursor.execute(sql, params)
+        except Exception:
+            cache = getattr(self.conn, 'sentencias', None)
+            if cache is not None:
+                cache.descartar(sql)
+            raise
+        return cursor
+
+    @staticmethod
+    def _liberar(cursor):
+        """
+        Descarta filas y conjuntos de resultados pendientes. Los cursores se
+        reutilizan (CacheSentencias): sin MARS, SQL Server rechaza la siguiente
+        sentencia de la conexión ("Connection is busy with results for another
+        hstmt") si un cursor vivo quedó con resultados sin leer.
+        """
+        while cursor.nextset():
+            pass
+
+    def _uno(self, sql, params=()):
+        cursor = self._ejecutar(sql, params)
+        fila = cursor.fetchone()
+        self._liberar(cursor)
+        return fila
+
+    def _todos(self, sql, params=()):
+        cursor = self._ejecutar(sql, params)
+        filas = cursor.fetchall()
+        self._liberar(cursor)
+        return filas
+
+    def _sin_resultados(self, sql, params=()):
+        """Procedimientos almacenados: pueden devolver conjuntos que nadie lee"""
+        self._liberar(self._ejecutar(sql, params))
+
+    def _escalar(self, sql, params=(), defecto=None):
+        fila = self._uno(sql, params)
+        if fila is None or fila[0] is None:
+            return defecto
+        return fila[0]
+
+    def _dicts(self, sql, params=()):
+        cursor = self._ejecutar(sql, params)
+        columnas = [col[0] for col in cursor.description]
+        filas = cursor.fetchall()
+        self._liberar(cursor)
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    def _dict(self, sql, params=()):
+        cursor = self._ejecutar(sql, params)
+        fila = cursor.fetchone()
+        columnas = [col[0] for col in cursor.description]
+        self._liberar(cursor)
+        if fila is None:
+            return None
+        return dict(zip(columnas, fila))
+
+    def _pagina_llave(self, select, where, params, columna_id, limit, direccion='s', id_limite=None):
+        """
+        Paginación por llave sobre `columna_id` descendente: busca por índice
+        desde `id_limite` en lugar de saltar filas, así las páginas profundas
+        cuestan lo mismo que la primera. `direccion` 's' trae las siguientes
+        (ids menores) y 'a' las anteriores (mayores). Devuelve (filas, hay_mas),
+        con `hay_mas` en la dirección pedida.
+        """
+        if id_limite is None:
+            condicion, orden = '', 'DESC'
+        elif direccion == 's':
+            condicion, orden = f' AND {columna_id} < ?', 'DESC'
+            params = (*params, id_limite)
+        else:
+            condicion, orden = f' AND {columna_id} > ?', 'ASC'
+            params = (*params, id_limite)
+        filas = self._todos(f'''
+            SELECT TOP {int(limit) + 1} {select}
+            WHERE {where}{condicion}
+            ORDER BY {columna_id} {orden}
+        ''', params)
+        hay_mas = len(filas) > limit
+        filas = filas[:limit]
+        if orden == 'ASC':
+            filas.reverse()
+        return filas, hay_mas
+
+    def _lote(self, sql, filas):
+        """Ejecuta la misma sentencia para todas las filas en un solo viaje"""
+        filas = [tuple(f) for f in filas]
+        if not filas:
+            return 0
+        cursor = self._cursor(sql)
+        if hasattr(cursor, 'fast_executemany'):
+            cursor.fast_executemany = True
+        try:
+            with medir(sql, filas=len(filas)):
+                cursor.executemany(sql, filas)
+        except Exception:
+            cache = getattr(self.conn, 'sentencias', None)
+            if cache is not None:
+                cache.descartar(sql)
+            raise
+        return len(filas)
+
+
+# -----------------------
+# Paquete
+# -----------------------
+COLUMNAS_PAQUETE = ('Id_Paquete, Descripcion, TipoPaquete, Inventario, UnidadesSobrantes, '
+                    'PaquetesCompletos, PrecioVenta_Paq, PrecioCompra_Paq, Papelera')
+
+
+# Tamaños a los que se rellenan las listas IN: así la misma sentencia (y su
+# plan) se reutiliza en lugar de generar un SQL distinto por cada cantidad
+_TAMANOS_LISTA_IN = (8, 32, 128, 512)
+
+
+def filtro_ids(columna, ids):
+    """
+    (WHERE, parámetros) para `columna IN (...)` con los ids que devolvió el
+    índice de búsqueda. Sin ids no hay coincidencias.
+    """
+    ids = list(ids)[:_TAMANOS_LISTA_IN[-1]]
+    if not ids:
+        return '1 = 0', ()
+    tamano = next(t for t in _TAMANOS_LISTA_IN if t >= len(ids))
+    ids += [ids[-1]] * (tamano - len(ids))
+    return f"{columna} IN ({', '.join('?' * tamano)})", tuple(ids)
+
+
+def filtro_paquetes(filtro, busqueda, ids_nombre=None):
+    """
+    Traduce el filtro del buscador de /paquetes a (WHERE, parámetros).
+    Con `ids_nombre` (resultado del índice de búsqueda) el filtro por nombre
+    usa esos ids en lugar de LIKE.
+    Lanza ValueError si la búsqueda por inventario no es numérica.
+    """
+    if not busqueda:
+        return 'Papelera = 0', ()
+    if filtro == 'Nombre':
+        if ids_nombre is not None:
+            where, params = filtro_ids('Id_Paquete', ids_nombre)
+            return f'{where} AND Papelera = 0', params
+        return 'Descripcion LIKE ? AND Papelera = 0', (f'%{busqueda}%',)
+    if filtro == 'TipoPaquete':
+        return 'TipoPaquete LIKE ? AND Papelera = 0', (f'%{busqueda}%',)
+    if filtro == 'Inventario':
+        if busqueda.startswith('='):
+            return 'Inventario = ? AND Papelera = 0', (float(busqueda[1:]),)
+        if busqueda.startswith('>'):
+            return 'Inventario > ? AND Papelera = 0', (float(busqueda[1:]),)
+        if busqueda.startswith('<'):
+            return 'Inventario < ? AND Papelera = 0', (float(busqueda[1:]),)
+        if '-' in busqueda:
+            min_val, max_val = map(int, busqueda.split('-'))
+            return 'Inventario BETWEEN ? AND ? AND Papelera = 0', (min_val, max_val)
+        valor = float(busqueda)
+        return 'Inventario BETWEEN ? AND (? + 5) AND Papelera = 0', (valor, valor)
+    return 'Papelera = 0', ()
+
+
+def codificar_cursor(direccion, id_limite, pagina):
+    """
+    Token opaco de paginación por llave: 's' = siguientes (Id_Paquete menor
+    que `id_limite`), 'a' = anteriores (mayor). Lleva el número de página
+    solo para mostrarlo.
+    """
+    return base64.urlsafe_b64encode(f'{direccion}:{id_limite}:{pagina}'.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """(direccion, id_limite, pagina) o None si el token no es válido"""
+    try:
+        texto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        direccion, id_limite, pagina = texto.split(':')
+        if direccion not in ('s', 'a'):
+            return None
+        return direccion, int(id_limite), max(int(pagina), 1)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class PaqueteRepo(_RepoBase):
+    # Conteos por filtro para la paginación por llave: aproximados (TTL) y
+    # compartidos por el proceso; crear/actualizar los invalidan al confirmar
+    TTL_CONTEOS = 30
+    _conteos = {}
+    _conteos_version = 0
+    _conteos_lock = threading.Lock()
+
+    # Catálogo de paquetes activos para los combos de ventas y el carrito.
+    # Se guarda por proceso con un número de versión: las escrituras que
+    # cambian productos o inventario programan invalidar_catalogo() para
+    # después del commit y la siguiente lectura lo recarga. El TTL recoge lo escrito por otros workers.
+    TTL_CATALOGO = 120
+    _catalogo = None
+    _catalogo_version = 0
+    _catalogo_stats = {'aciertos': 0, 'fallos': 0, 'invalidaciones': 0}
+    _catalogo_lock = threading.Lock()
+
+    def contar(self, where, params):
+        return self._escalar(f'SELECT COUNT(*) FROM Paquete WHERE {where}', params, 0)
+
+    def contar_cacheado(self, where, params):
+        clave = (where, tuple(params))
+        with self._conteos_lock:
+            guardado = self._conteos.get(clave)
+            version = self._conteos_version
+        if guardado and time.monotonic() - guardado[1] < self.TTL_CONTEOS:
+            return guardado[0]
+        total = self.contar(where, params)
+        self._guardar_conteo(clave, total, version)
+        return total
+
+    @classmethod
+    def _guardar_conteo(cls, clave, total, version):
+        with cls._conteos_lock:
+            # Si se invalidó mientras se contaba, el total puede ser viejo
+            if cls._conteos_version != version:
+                return
+            if len(cls._conteos) > 256:
+                cls._conteos.clear()
+            cls._conteos[clave] = (total, time.monotonic())
+
+    @classmethod
+    def invalidar_conteos(cls):
+        with cls._conteos_lock:
+            cls._conteos_version += 1
+            cls._conteos.clear()
+
+    def pagina(self, where, params, offset, limit):
+        """
+        Página por número (OFFSET). Cada fila trae `TotalFiltrado` calculado
+        con COUNT(*) OVER() en la misma sentencia: un solo viaje a la base.
+        """
+        version = self._conteos_version
+        filas = self._todos(f'''
+            SELECT {COLUMNAS_PAQUETE}, COUNT(*) OVER() AS TotalFiltrado
+            FROM Paquete
+            WHERE {where}
+            ORDER BY Id_Paquete DESC
+            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+        ''', (*params, offset, limit))
+        if filas:
+            self._guardar_conteo((where, tuple(params)), filas[0].TotalFiltrado, version)
+        return filas
+
+    def pagina_llave(self, where, params, limit, direccion, id_limite):
+        """Página por llave sobre Id_Paquete DESC (ver `_pagina_llave`)"""
+        return self._pagina_llave(f'{COLUMNAS_PAQUETE} FROM Paquete', where, params,
+                                  'Id_Paquete', limit, direccion, id_limite)
+
+    def obtener(self, id_paquete):
+        return self._uno(f'SELECT {COLUMNAS_PAQUETE} FROM Paquete WHERE Id_Paquete = ? AND Papelera = 0', (id_paquete,))
+
+    def descripcion(self, id_paquete):
+        return self._escalar('SELECT Descripcion FROM Paquete WHERE Id_Paquete = ? AND Papelera = 0', (id_paquete,))
+
+    def descripciones_activas(self):
+        return {fila[0] for fila in self._todos('SELECT Descripcion FROM Paquete WHERE Papelera = 0')}
+
+    def datos_venta(self, id_paquete):
+        return self._uno('SELECT Inventario, TipoPaquete, PrecioVenta_Paq, Descripcion FROM Paquete WHERE Id_Paquete = ?', (id_paquete,))
+
+    def existentes(self, ids):
+        """Subconjunto de `ids` que corresponde a paquetes existentes (una sola consulta)"""
+        ids = list(ids)
+        if not ids:
+            return set()
+        marcas = ', '.join('?' for _ in ids)
+        return {fila[0] for fila in self._todos(f'SELECT Id_Paquete FROM Paquete WHERE Id_Paquete IN ({marcas})', ids)}
+
+    def catalogo(self):
+        """Filas de los paquetes activos (tupla compartida entre peticiones: no modificar)"""
+        cls = PaqueteRepo
+        with cls._catalogo_lock:
+            guardado, version = cls._catalogo, cls._catalogo_version
+            if guardado is not None and time.monotonic() - guardado[1] < self.TTL_CATALOGO:
+                cls._catalogo_stats['aciertos'] += 1
+                return guardado[0]
+            cls._catalogo_stats['fallos'] += 1
+        filas = tuple(self._todos('SELECT Id_Paquete, Descripcion, PaquetesCompletos, UnidadesSobrantes, '
+                                  'Inventario, TipoPaquete, PrecioCompra_Paq FROM Paquete WHERE Papelera = 0'))
+        with cls._catalogo_lock:
+            # Si hubo una escritura mientras se leía, no se guarda
+            if cls._catalogo_version == version:
+                cls._catalogo = (filas, time.monotonic())
+        return filas
+
+    @classmethod
+    def invalidar_catalogo(cls):
+        with cls._catalogo_lock:
+            cls._catalogo_version += 1
+            cls._catalogo = None
+            cls._catalogo_stats['invalidaciones'] += 1
+
+    @classmethod
+    def estadisticas_catalogo(cls):
+        with cls._catalogo_lock:
+            stats = dict(cls._catalogo_stats)
+            stats['version'] = cls._catalogo_version
+            stats['cargado'] = cls._catalogo is not None
+            stats['paquetes'] = len(cls._catalogo[0]) if cls._catalogo else 0
+        return stats
+
+    def combo(self):
+        """Paquetes activos para los selects de ventas"""
+        return list(self.catalogo())
+
+    def combo_dicts(self):
+        columnas = ('Id_Paquete', 'Descripcion', 'PaquetesCompletos', 'UnidadesSobrantes', 'Inventario')
+        return [{c: getattr(fila, c) for c in columnas} for fila in self.catalogo()]
+
+    def para_indice(self, desde_id=0):
+        """Filas (id, descripción, activo) para el índice de búsqueda"""
+        return [tuple(f) for f in self._todos(
+            'SELECT Id_Paquete, Descripcion, CASE WHEN Papelera = 0 THEN 1 ELSE 0 END '
+            'FROM Paquete WHERE Id_Paquete > ?', (desde_id,))]
+
+    def para_compra(self, ids=None):
+        """Paquetes para el carrito (del catálogo); con `ids` (del índice de búsqueda) en ese orden"""
+        if ids is None:
+            return list(self.catalogo())
+        por_id = {fila.Id_Paquete: fila for fila in self.catalogo()}
+        return [por_id[id_paquete] for id_paquete in ids if id_paquete in por_id]
+
+    def crear(self, descripcion, tipo, inventario, unidades_sobrantes, paquetes_completos, precio_venta, precio_compra):
+        self._tras_commit(PaqueteRepo.invalidar_conteos)
+        self._tras_commit(PaqueteRepo.invalidar_catalogo)
+        self._tras_commit(TableroRepo.invalidar)
+        self._ejecutar('''
+            INSERT INTO Paquete (Descripcion, TipoPaquete, Inventario, UnidadesSobrantes, PaquetesCompletos, PrecioVenta_Paq, PrecioCompra_Paq)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (descripcion, tipo, inventario, unidades_sobrantes, paquetes_completos, precio_venta, precio_compra))
+
+    def actualizar(self, id_paquete, descripcion, tipo, inventario, unidades_sobrantes, paquetes_completos, precio_venta, precio_compra):
+        self._tras_commit(PaqueteRepo.invalidar_conteos)
+        self._tras_commit(PaqueteRepo.invalidar_catalogo)
+        self._tras_commit(TableroRepo.invalidar)
+        self._ejecutar('''
+            UPDATE Paquete
+            SET Descripcion = ?, TipoPaquete = ?, Inventario = ?, UnidadesSobrantes = ?, PaquetesCompletos = ?, PrecioVenta_Paq = ?, PrecioCompra_Paq = ?
+            WHERE Id_Paquete = ?
+        ''', (descripcion, tipo, inventario, unidades_sobrantes, paquetes_completos, precio_venta, precio_compra, id_paquete))
+
+
+# -----------------------
+# Venta
+# -----------------------
+class VentaRepo(_RepoBase):
+    def id_desde_ultimas(self, n):
+        """Id de la n-ésima venta más reciente (las últimas n ventas tienen Id >= este)"""
+        return self._escalar('SELECT Id_Venta FROM Venta WHERE Papelera = 0 ORDER BY Id_Venta DESC '
+                             'OFFSET ? ROWS FETCH NEXT ? ROWS ONLY', (n - 1, 1), 0)
+
+    def recientes(self, n):
+        """Las últimas `n` ventas, en orden ascendente"""
+        filas = self._todos(f'SELECT TOP {int(n)} Id_Venta, Fecha, TotalVenta FROM Venta '
+                            'WHERE Papelera = 0 ORDER BY Id_Venta DESC')
+        filas.reverse()
+        return filas
+
+    def ids(self):
+        return self._todos('SELECT Id_Venta FROM Venta WHERE Papelera = 0 ORDER BY Id_Venta ASC')
+
+    def max_id(self):
+        return self._escalar('SELECT MAX(Id_Venta) FROM Venta WHERE Papelera = 0', (), 1)
+
+    def crear(self):
+        """Inserta una venta vacía y devuelve (Id_Venta, Fecha, TotalVenta)"""
+        self._tras_commit(TableroRepo.invalidar)
+        self._ejecutar('INSERT INTO Venta DEFAULT VALUES;')
+        nueva_id = self._escalar('SELECT Top 1 Id_Venta from Venta order by Id_Venta desc', (), 1)
+        return self._uno('SELECT Id_Venta, Fecha, TotalVenta FROM Venta WHERE Id_Venta = ?', (int(nueva_id),))
+
+
+# -----------------------
+# DetalleVenta
+# -----------------------
+# Columnas y origen del listado de detalles (se antepone SELECT TOP n)
+_DETALLE_VENTA_LISTADO = '''
+        dv.Id_DetalleVenta,
+        dv.Id_Venta,
+        p.Descripcion AS DescripcionPaquete,
+        dv.CantidadPaquetes,
+        dv.CantidadUnidades,
+        dv.CantidadVendidaTotal,
+        dv.PrecioUnitario,
+        dv.Subtotal
+    FROM DetalleVenta dv
+    JOIN Paquete p ON dv.Id_Paquete = p.Id_Paquete
+'''
+
+
+_RE_VENTA_EXACTA = re.compile(r'^#?\s*(\d+)$')
+_RE_VENTA_RANGO = re.compile(r'^#?\s*(\d+)\s*(?:-|a|\.\.)\s*#?\s*(\d+)$', re.I)
+_RE_VENTA_ULTIMAS = re.compile(r'^(?:[uú]ltim[ao]s?|last)\s*(\d+)$', re.I)
+
+
+def parsear_busqueda_venta(texto):
+    """
+    Interpreta la búsqueda por venta:
+      '123' o '#123'       -> ('exacta', 123)
+      '100-200', '100 a 200' -> ('rango', 100, 200)
+      'ultimas 10'         -> ('ultimas', 10)
+    Lanza ValueError si el texto no tiene ninguna de esas formas.
+    """
+    texto = texto.strip()
+    m = _RE_VENTA_EXACTA.match(texto)
+    if m:
+        return 'exacta', int(m.group(1))
+    m = _RE_VENTA_RANGO.match(texto)
+    if m:
+        desde, hasta = sorted((int(m.group(1)), int(m.group(2))))
+        return 'rango', desde, hasta
+    m = _RE_VENTA_ULTIMAS.match(texto)
+    if m and int(m.group(1)) > 0:
+        return 'ultimas', int(m.group(1))
+    raise ValueError(f'Búsqueda de venta no válida: "{texto}". Use un número, un rango (100-200) o "ultimas 10"')
+
+
+class DetalleVentaRepo(_RepoBase):
+    def filtro(self, producto='', id_venta='', ids_producto=None):
+        """
+        Traduce la búsqueda de /detalles_ventas a (WHERE, parámetros). La
+        búsqueda por venta compara Id_Venta directamente (búsqueda por índice)
+        en lugar de convertirlo a texto con LIKE; la de producto usa los ids
+        del índice de búsqueda si se pasan en `ids_producto`. Lanza ValueError
+        si la búsqueda por venta no es válida.
+        """
+        if producto:
+            if ids_producto is not None:
+                where, params = filtro_ids('dv.Id_Paquete', ids_producto)
+                return f'{where} AND dv.Papelera = 0', params
+            return 'p.Descripcion LIKE ? AND dv.Papelera = 0', (f'%{producto}%',)
+        if id_venta:
+            busqueda = parsear_busqueda_venta(id_venta)
+            if busqueda[0] == 'exacta':
+                return 'dv.Id_Venta = ? AND dv.Papelera = 0', (busqueda[1],)
+            if busqueda[0] == 'rango':
+                return 'dv.Id_Venta BETWEEN ? AND ? AND dv.Papelera = 0', busqueda[1:]
+            return 'dv.Id_Venta >= ? AND dv.Papelera = 0', (VentaRepo(self.conn).id_desde_ultimas(busqueda[1]),)
+        return 'dv.Papelera = 0', ()
+
+    def pagina(self, where, params, limit, direccion='s', id_limite=None):
+        """Detalles más recientes primero, paginados por llave sobre Id_DetalleVenta"""
+        return self._pagina_llave(_DETALLE_VENTA_LISTADO, where, params,
+                                  'dv.Id_DetalleVenta', limit, direccion, id_limite)
+
+    def obtener_para_editar(self, id_detalle):
+        return self._dict('''SELECT
+                    dv.Id_DetalleVenta,
+                    dv.Id_Paquete,
+                    dv.Id_Venta,
+                    p.TipoPaquete AS TipoPaquete,
+                    p.PaquetesCompletos AS PaquetesCompletos,
+                    p.UnidadesSobrantes AS UnidadesSobrantes,
+                    p.Inventario AS Inventario,
+                    p.Descripcion AS Descripcion,
+                    dv.CantidadPaquetes,
+                    dv.CantidadUnidades
+                    FROM DetalleVenta dv
+                    inner join Paquete p on dv.Id_Paquete = p.Id_Paquete
+                    WHERE Id_DetalleVenta = ? AND dv.Papelera = 0''', (id_detalle,))
+
+    def insertar(self, id_paquete, cantidad_paquetes, cantidad_unidades, id_venta):
+        self.insertar_lote([(id_paquete, cantidad_paquetes, cantidad_unidades, id_venta)])
+
+    def insertar_lote(self, filas):
+        """filas: iterable de (Id_Paquete, CantidadPaquetes, CantidadUnidades, Id_Venta)"""
+        self._tras_commit(PaqueteRepo.invalidar_catalogo)
+        self._tras_commit(TableroRepo.invalidar)
+        return self._lote('''
+            INSERT INTO DetalleVenta (Id_Paquete, CantidadPaquetes, CantidadUnidades, Id_Venta)
+            VALUES (?, ?, ?, ?)
+        ''', filas)
+
+    def ultimo(self):
+        """Último detalle insertado, con los campos calculados por la base"""
+        return self._uno('''
+            SELECT TOP 1
+                CantidadVendidaTotal,
+                PrecioUnitario,
+                Subtotal,
+                CantidadPaquetes,
+                CantidadUnidades,
+                Id_DetalleVenta
+            FROM DetalleVenta
+            WHERE Papelera = 0
+            ORDER BY Id_DetalleVenta DESC;
+        ''')
+
+    def actualizar(self, id_detalle, id_venta, id_paquete, cantidad_paquetes, cantidad_unidades):
+        self._tras_commit(PaqueteRepo.invalidar_catalogo)
+        self._tras_commit(TableroRepo.invalidar)
+        self._ejecutar('''
+            UPDATE DetalleVenta
+            SET Id_Venta = ?, Id_Paquete = ?, CantidadPaquetes = ?, CantidadUnidades = ?
+            WHERE Id_DetalleVenta = ?
+        ''', (id_venta, id_paquete, cantidad_paquetes, cantidad_unidades, id_detalle))
+
+
+# -----------------------
+# Compras / DetallesDeCompras
+# -----------------------
+class CompraRepo(_RepoBase):
+    def pagina(self, offset, limit):
+        """
+        Compras con proveedor y total en una sola sentencia. Las finalizadas
+        leen el total guardado (TotalFactura); las que siguen abiertas lo
+        suman de sus detalles. `TotalFiltrado` trae el conteo para paginar.
+        """
+        return self._todos("""
+            SELECT C.Id_Compra, C.FechaDeCompra, COALESCE(P.NombreProveedor, 'Sin proveedor') AS NombreProveedor,
+                   COALESCE(C.TotalFactura,
+                            (SELECT SUM(DC.TotalConIVA) FROM DetallesDeCompras DC WHERE DC.Id_Compra = C.Id_Compra),
+                            0) AS Total,
+                   COUNT(*) OVER() AS TotalFiltrado
+            FROM Compras C
+            LEFT JOIN Proveedor P ON C.Id_Proveedor = P.Id_Proveedor
+            ORDER BY C.Id_Compra DESC
+            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+        """, (offset, limit))
+
+    def contar(self):
+        return self._escalar("SELECT COUNT(*) FROM Compras", (), 0)
+
+    def obtener(self, id_compra):
+        return self._uno("SELECT Id_Compra, FechaDeCompra, Id_Proveedor FROM Compras WHERE Id_Compra = ?", (id_compra,))
+
+    def total(self, id_compra):
+        """Total de la factura según el procedimiento ObtenerTotalFactura (None si no hay productos)"""
+        resultado = self._uno("EXEC ObtenerTotalFactura @Id_Compra = ?", (id_compra,))
+        if resultado is None or resultado[1] is None:
+            return None
+        return float(resultado[1])
+
+    def crear(self, id_proveedor=1):
+        # Por procedimiento y no con OUTPUT INSERTED: SQL Server no admite OUTPUT
+        # sin INTO en una tabla con triggers (Compras tiene el de VersionDatos)
+        return self._escalar("EXEC CrearCompra @Id_Proveedor = ?", (id_proveedor,))
+
+    def eliminar(self, id_compra):
+        self._ejecutar("DELETE FROM Compras WHERE Id_Compra = ?", (id_compra,))
+
+    def finalizar(self, id_compra, total):
+        """
+        El SP suma PaquetesCompletos (el trigger de Paquete recalcula
+        Inventario) y el total queda guardado: una compra finalizada ya no cambia.
+        """
+        self._tras_commit(PaqueteRepo.invalidar_catalogo)
+        self._tras_commit(TableroRepo.invalidar)
+        self._sin_resultados("EXEC FinalizarCompraSumarInventario @Id_Compra = ?", (id_compra,))
+        self._ejecutar("UPDATE Compras SET TotalFactura = ? WHERE Id_Compra = ?", (total, id_compra))
+
+
+class DetalleCompraRepo(_RepoBase):
+    def contar(self, id_compra):
+        return self._escalar("SELECT COUNT(*) FROM DetallesDeCompras WHERE Id_Compra = ?", (id_compra,), 0)
+
+    def carrito(self, id_compra):
+        return self._todos('''
+            SELECT
+                dc.Id_DetalleDeCompra, p.Descripcion AS Producto, dc.Cantidad, dc.TotalConIVA
+            FROM DetallesDeCompras dc
+            JOIN Paquete p ON dc.Id_Paquete = p.Id_Paquete
+            WHERE dc.Id_Compra = ?
+        ''', (id_compra,))
+
+    def detalles(self, id_compra):
+        return self._todos('''
+            SELECT
+                p.Descripcion AS Producto,
+                dc.Cantidad,
+                dc.PrecioAntDes,
+                dc.TotalAntDes,
+                dc.DescuentoTotal,
+                dc.TotalConDes,
+                dc.TotalConIva
+            FROM DetallesDeCompras dc
+            JOIN Paquete p ON dc.Id_Paquete = p.Id_Paquete
+            WHERE dc.Id_Compra = ?
+        ''', (id_compra,))
+
+    def cantidades(self, id_compra):
+        """{Id_Paquete: (Id_DetalleDeCompra, Cantidad)} de lo que ya está en el carrito"""
+        filas = self._todos("SELECT Id_Paquete, Id_DetalleDeCompra, Cantidad FROM DetallesDeCompras WHERE Id_Compra = ?", (id_compra,))
+        return {fila[0]: (fila[1], fila[2]) for fila in filas}
+
+    def agregar_lote(self, id_compra, items):
+        """
+        Agrega al carrito una lista de (Id_Paquete, Cantidad). Los productos que
+        ya estaban suman su cantidad; los nuevos se insertan. Son dos
+        sentencias por lotes sin importar cuántos productos se agreguen.
+        """
+        existentes = self.cantidades(id_compra)
+        actualizar = []
+        insertar = []
+        acumulado = {}
+        for id_paquete, cantidad in items:
+            acumulado[id_paquete] = acumulado.get(id_paquete, 0) + cantidad
+        for id_paquete, cantidad in acumulado.items():
+            if id_paquete in existentes:
+                id_detalle, actual = existentes[id_paquete]
+                actualizar.append((actual + cantidad, id_detalle))
+            else:
+                insertar.append((id_compra, id_paquete, cantidad))
+        self._lote("UPDATE DetallesDeCompras SET Cantidad = ? WHERE Id_DetalleDeCompra = ?", actualizar)
+        self._lote("""
+            INSERT INTO DetallesDeCompras (Id_Compra, Id_Paquete, Cantidad)
+            VALUES (?, ?, ?)
+        """, insertar)
+        return len(acumulado)
+
+    def eliminar(self, id_detalle):
+        self._ejecutar("DELETE FROM DetallesDeCompras WHERE Id_DetalleDeCompra = ?", (id_detalle,))
+
+
+# -----------------------
+# Empleado
+# -----------------------
+_SELECT_EMPLEADO_LISTADO = '''
+    SELECT
+        e.Id_Empleado,
+        e.PNombre,
+        e.SNombre,
+        e.PApellido,
+        e.SApellido,
+        e.FechaDeNacimiento,
+        e.FechaDeInicioContrato,
+        e.FechaDeFinContrato AS FechaDeFinContrato,
+        e.Direccion,
+        e.Estado,
+        s.PNombre AS SupervisorPNombre,
+        s.SNombre AS SupervisorSNombre,
+        s.PApellido AS SupervisorPApellido,
+        s.SApellido AS SupervisorSApellido,
+        e.NumCedula,
+        e.EstadoCivil,
+        e.Sexo,
+        e.NumInss,
+        e.RUC,
+        e.SalarioBase
+    FROM Empleado e
+    LEFT JOIN Empleado s ON e.Supervisor = s.Id_Empleado
+'''
+
+COLUMNAS_EMPLEADO = ['Id_Empleado', 'PNombre', 'SNombre', 'PApellido', 'SApellido', 'EstadoCivil', 'Sexo',
+                     'FechaDeNacimiento', 'FechaDeInicioContrato', 'FechaDeFinContrato', 'RUC', 'SalarioBase',
+                     'NumCedula', 'NumInss', 'Estado', 'Direccion', 'Supervisor', 'Papelera']
+
+
+class EmpleadoRepo(_RepoBase):
+    def listar(self):
+        """Todos los empleados con su supervisor; la búsqueda se hace en memoria (busqueda.py)"""
+        return self._dicts(_SELECT_EMPLEADO_LISTADO + '''
+            WHERE e.Papelera = 0
+            ORDER BY e.Id_Empleado ASC
+        ''')
+
+    def activos(self):
+        return self._dicts('''
+            SELECT
+                Id_Empleado,
+                PNombre, SNombre, PApellido, SApellido,
+                Estado
+            FROM Empleado
+            WHERE Papelera = 0 AND Estado = 'Activo'
+            ORDER BY PNombre, PApellido
+        ''')
+
+    def obtener(self, id_empleado):
+        fila = self._uno(f'''
+            SELECT {", ".join(COLUMNAS_EMPLEADO)}
+            FROM Empleado
+            WHERE Id_Empleado = ? AND Papelera = 0
+        ''', (id_empleado,))
+        return dict(zip(COLUMNAS_EMPLEADO, fila)) if fila else None
+
+    def supervisores(self, excluir=None):
+        if excluir is not None:
+            return self._todos('SELECT Id_Empleado, PNombre, SNombre, PApellido, SApellido FROM Empleado WHERE Id_Empleado != ? AND Papelera = 0', (excluir,))
+        return self._todos('SELECT Id_Empleado, PNombre, SNombre, PApellido, SApellido FROM Empleado WHERE Papelera = 0')
+
+    def crear(self, datos):
+        """datos: tupla en el orden de las columnas del INSERT"""
+        self._ejecutar('''
+            INSERT INTO Empleado (PNombre, SNombre, PApellido, SApellido, NumCedula, EstadoCivil, Sexo,
+                                 FechaDeNacimiento, FechaDeInicioContrato, FechaDeFinContrato, Direccion,
+                                 NumInss, RUC, SalarioBase, Supervisor, Estado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', datos)
+
+    def actualizar(self, id_empleado, datos):
+        self._ejecutar('''
+            UPDATE Empleado
+            SET PNombre=?, SNombre=?, PApellido=?, SApellido=?, NumCedula=?, EstadoCivil=?, Sexo=?,
+                FechaDeNacimiento=?, FechaDeInicioContrato=?, FechaDeFinContrato=?, Direccion=?,
+                NumInss=?, RUC=?, SalarioBase=?, Supervisor=?, Estado=?
+            WHERE Id_Empleado=?
+        ''', (*datos, id_empleado))
+
+
+# -----------------------
+# Notas
+# -----------------------
+class NotaRepo(_RepoBase):
+    def crear(self, asunto, fecha, id_empleado):
+        self._ejecutar('''
+            INSERT INTO Notas (Asunto, FechaDelAsunto, Id_Empleado)
+            VALUES (?, ?, ?)
+        ''', (asunto, fecha, id_empleado))
+
+    def de_empleado(self, id_empleado):
+        return self._dicts('''
+            SELECT n.Id_Nota, n.Asunto, n.FechaDelAsunto, n.Id_Empleado,
+                   e.PNombre, e.SNombre, e.PApellido, e.SApellido, n.Estado
+            FROM Notas n
+            LEFT JOIN Empleado e ON n.Id_Empleado = e.Id_Empleado
+            WHERE n.Id_Empleado = ?
+            ORDER BY n.FechaDelAsunto DESC, n.Id_Nota DESC
+        ''', (id_empleado,))
+
+    def existe(self, id_nota):
+        return self._uno('SELECT Id_Empleado FROM Notas WHERE Id_Nota = ?', (id_nota,)) is not None
+
+    def cambiar_estado(self, id_nota, estado):
+        self._ejecutar('UPDATE Notas SET Estado = ? WHERE Id_Nota = ?', (estado, id_nota))
+
+    def eliminar(self, id_nota):
+        self._ejecutar('DELETE FROM Notas WHERE Id_Nota = ?', (id_nota,))
+
+
+# -----------------------
+# GananciaDiaria
+# -----------------------
+class GananciaRepo(_RepoBase):
+    def listar(self):
+        return self._todos('''
+            SELECT gd.Id_Venta, gd.Fecha, gd.TotalVenta, gd.GananciaCalculada
+            FROM GananciaDiaria gd
+            WHERE gd.Papelera = 0
+            ORDER BY gd.Id_Venta ASC
+        ''')
+
+    def calcular(self, id_venta):
+        self._sin_resultados('EXEC CalcularGananciaDiaria ?', (id_venta,))
+
+
+# -----------------------
+# Usuario / ResetTokens
+# -----------------------
+class UsuarioRepo(_RepoBase):
+    def autenticar(self, nusuario, contrasena_codificada):
+        return self._uno('SELECT * FROM Usuario WHERE NUsuario = ? AND Contraseña = ?', (nusuario, contrasena_codificada))
+
+    def existe_email(self, email):
+        return self._uno('SELECT Email FROM Usuario WHERE Email = ?', (email,)) is not None
+
+    def nombre_por_email(self, email):
+        return self._escalar('SELECT NombreCompleto FROM Usuario WHERE Email = ?', (email,))
+
+    def cambiar_contrasena(self, email, contrasena_codificada):
+        # La versión invalida los tokens de "recuérdame" emitidos antes (recuerdame.py)
+        self._ejecutar('UPDATE Usuario SET Contraseña = ?, VersionContrasena = VersionContrasena + 1 WHERE Email = ?',
+                       (contrasena_codificada, email))
+
+    def guardar_token(self, email, token, expiry):
+        self._ejecutar('INSERT INTO ResetTokens (Email, Token, Expiry) VALUES (?, ?, ?)', (email, token, expiry))
+
+    def ultimo_token(self, email):
+        return self._uno('SELECT Token, Expiry FROM ResetTokens WHERE Email = ? ORDER BY Expiry DESC', (email,))
+
+    def para_recuerdame(self):
+        """Usuarios para verificar tokens de "recuérdame" en memoria (recuerdame.py)"""
+        return self._todos('SELECT Id_Usuario, NUsuario, Tipo, VersionContrasena FROM Usuario')
+
+    def recuerdame_revocados(self):
+        return [fila[0] for fila in self._todos(
+            'SELECT Jti FROM RecuerdameRevocados WHERE Expira > ?', (datetime.now(),))]
+
+    def revocar_recuerdame(self, jti, expira):
+        self._ejecutar('DELETE FROM RecuerdameRevocados WHERE Expira <= ?', (datetime.now(),))
+        self._ejecutar('INSERT INTO RecuerdameRevocados (Jti, Expira) VALUES (?, ?)', (jti, expira))
+
+
+# -----------------------
+# Buzón de salida de correos (ver correo.py)
+# -----------------------
+class CorreoRepo(_RepoBase):
+    def encolar(self, destinatario, asunto, cuerpo):
+        """Se guarda en la misma transacción que lo que origina el correo"""
+        ahora = datetime.now()
+        self._ejecutar(
+            "INSERT INTO CorreosPendientes (Destinatario, Asunto, Cuerpo, Estado, Intentos, ProximoIntento, Creado) "
+            "VALUES (?, ?, ?, 'pendiente', 0, ?, ?)",
+            (destinatario, asunto, cuerpo, ahora, ahora))
+
+    def vencidos(self, limite):
+        """Pendientes cuyo próximo intento ya llegó, los más viejos primero"""
+        return self._todos(f'''
+            SELECT TOP {int(limite)} Id_Correo, Destinatario, Asunto, Cuerpo, Intentos, ProximoIntento
+            FROM CorreosPendientes
+            WHERE Estado = 'pendiente' AND ProximoIntento <= ?
+            ORDER BY ProximoIntento, Id_Correo
+        ''', (datetime.now(),))
+
+    def reservar(self, id_correo, hasta):
+        """
+        Corre el próximo intento a `hasta` solo si el correo sigue vencido:
+        el worker que lo toma primero lo deja en el futuro y el UPDATE de
+        otro worker ya no lo encuentra. True si este worker se quedó con el
+        correo. (No se compara ProximoIntento por igualdad: DATETIME redondea
+        a 1/300 s y el valor leído no siempre coincide con el enviado.)
+        """
+        cursor = self._ejecutar(
+            "UPDATE CorreosPendientes SET ProximoIntento = ? "
+            "WHERE Id_Correo = ? AND Estado = 'pendiente' AND ProximoIntento <= ?",
+            (hasta, id_correo, datetime.now()))
+        return cursor.rowcount == 1
+
+    def marcar_enviado(self, id_correo, intentos):
+        self._ejecutar(
+            "UPDATE CorreosPendientes SET Estado = 'enviado', Intentos = ?, Enviado = ?, UltimoError = NULL "
+            "WHERE Id_Correo = ?", (intentos, datetime.now(), id_correo))
+
+    def reprogramar(self, id_correo, intentos, proximo_intento, error):
+        self._ejecutar(
+            'UPDATE CorreosPendientes SET Intentos = ?, ProximoIntento = ?, UltimoError = ? WHERE Id_Correo = ?',
+            (intentos, proximo_intento, error[:500], id_correo))
+
+    def marcar_fallido(self, id_correo, intentos, error):
+        self._ejecutar(
+            "UPDATE CorreosPendientes SET Estado = 'fallido', Intentos = ?, UltimoError = ? WHERE Id_Correo = ?",
+            (intentos, error[:500], id_correo))
+
+    def conteo_por_estado(self):
+        return {fila[0]: fila[1] for fila in self._todos(
+            'SELECT Estado, COUNT(*) FROM CorreosPendientes GROUP BY Estado')}
+
+    def purgar_enviados(self, antes_de):
+        self._ejecutar("DELETE FROM CorreosPendientes WHERE Estado = 'enviado' AND Enviado < ?", (antes_de,))
+
+
+# -----------------------
+# Versiones de datos (ETags, ver versiones.py)
+# -----------------------
+class VersionDatosRepo(_RepoBase):
+    def todas(self):
+        """{tabla: versión}: un contador por tabla que suben los triggers"""
+        return {fila[0]: fila[1] for fila in self._todos('SELECT Tabla, Version FROM VersionDatos')}
+
+
+# -----------------------
+# Tablero de la página principal
+# -----------------------
+class TableroRepo(_RepoBase):
+    """
+    Resumen para la página principal: stock bajo, últimas ventas, totales de
+    hoy y de la semana y conteo de productos. Se guarda por proceso durante
+    `TTL_TABLERO` segundos y se invalida en cada escritura que lo afecta
+    (productos, ventas, detalles de venta y compras finalizadas), así la
+    portada no recorre tablas completas en cada visita.
+    """
+    TTL_TABLERO = 60
+    STOCK_MINIMO = 30
+    MAX_STOCK_BAJO = 50
+    VENTAS_RECIENTES = 5
+
+    _guardado = None
+    _version = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def invalidar(cls):
+        with cls._lock:
+            cls._version += 1
+            cls._guardado = None
+
+    @classmethod
+    def vigente(cls):
+        """El resumen guardado si no venció, o None (no necesita conexión)"""
+        guardado = cls._guardado
+        if guardado and time.monotonic() - guardado[1] < cls.TTL_TABLERO:
+            return guardado[0]
+        return None
+
+    def resumen(self):
+        with self._lock:
+            version = self._version
+        guardado = self.vigente()
+        if guardado is not None:
+            return guardado
+        resumen = self._calcular()
+        with self._lock:
+            # Una escritura durante el cálculo lo deja sin guardar
+            if self._version == version:
+                type(self)._guardado = (resumen, time.monotonic())
+        return resumen
+
+    def _calcular(self):
+        ahora = datetime.now()
+        hoy = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+        semana = hoy - timedelta(days=hoy.weekday())
+        # Las tres consultas son independientes: se ejecutan a la vez
+        datos = en_paralelo(self.conn, {
+            'totales': lambda conn: TableroRepo(conn)._totales(hoy, semana),
+            'stock_bajo': lambda conn: TableroRepo(conn)._stock_bajo(),
+            'ventas_recientes': lambda conn: VentaRepo(conn).recientes(self.VENTAS_RECIENTES),
+        })
+        totales = datos['totales']
+        return {
+            'stock_bajo': datos['stock_bajo'],
+            'ventas_recientes': datos['ventas_recientes'][::-1],
+            'productos': totales.Productos,
+            'productos_stock_bajo': totales.ProductosStockBajo,
+            'ventas_hoy': totales.VentasHoy,
+            'total_hoy': totales.TotalHoy,
+            'ventas_semana': totales.VentasSemana,
+            'total_semana': totales.TotalSemana,
+            'calculado_en': ahora,
+        }
+
+    def _totales(self, hoy, semana):
+        return self._uno('''
+            SELECT
+                (SELECT COUNT(*) FROM Paquete WHERE Papelera = 0) AS Productos,
+                (SELECT COUNT(*) FROM Paquete WHERE Papelera = 0 AND Inventario < ?) AS ProductosStockBajo,
+                (SELECT COUNT(*) FROM Venta WHERE Papelera = 0 AND Fecha >= ?) AS VentasHoy,
+                (SELECT COALESCE(SUM(TotalVenta), 0) FROM Venta WHERE Papelera = 0 AND Fecha >= ?) AS TotalHoy,
+                (SELECT COUNT(*) FROM Venta WHERE Papelera = 0 AND Fecha >= ?) AS VentasSemana,
+                (SELECT COALESCE(SUM(TotalVenta), 0) FROM Venta WHERE Papelera = 0 AND Fecha >= ?) AS TotalSemana
+        ''', (self.STOCK_MINIMO, hoy, hoy, semana, semana))
+
+    def _stock_bajo(self):
+        return self._todos(f'''
+            SELECT TOP {self.MAX_STOCK_BAJO} Descripcion, Inventario
+            FROM Paquete
+            WHERE Papelera = 0 AND Inventario < ?
+            ORDER BY Inventario ASC
+        ''', (self.STOCK_MINIMO,))
+
+
+class Repositorio:
+    """
+    Punto de entrada a la capa de datos para una conexión:
+
+        repo = Repositorio(conn)
+        paquetes = repo.paquetes.combo()
+        repo.detalles_venta.insertar_lote(filas)
+        conn.commit()
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.paquetes = PaqueteRepo(conn)
+        self.ventas = VentaRepo(conn)
+        self.detalles_venta = DetalleVentaRepo(conn)
+        self.compras = CompraRepo(conn)
+        self.detalles_compra = DetalleCompraRepo(conn)
+        self.empleados = EmpleadoRepo(conn)
+        self.notas = NotaRepo(conn)
+        self.ganancias = GananciaRepo(conn)
+        self.usuarios = UsuarioRepo(conn)
+        self.tablero = TableroRepo(conn)
+        self.versiones = VersionDatosRepo(conn)
+        self.correos = CorreoRepo(conn)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
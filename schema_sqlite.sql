@@ -0,0 +1,439 @@
+-- Esquema SQLite equivalente a la base de Azure SQL de MiniBodega.
+-- Se usa para correr la aplicación sin conexión y para pruebas de carga.
+-- Los triggers replican los campos que en Azure calcula la base
+-- (inventario, subtotales de venta y totales de compra).
+
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE IF NOT EXISTS Paquete (
+    Id_Paquete        INTEGER PRIMARY KEY AUTOINCREMENT,
+    Descripcion       TEXT    NOT NULL,
+    TipoPaquete       INTEGER NOT NULL DEFAULT 1,
+    Inventario        REAL    NOT NULL DEFAULT 0,
+    UnidadesSobrantes INTEGER NOT NULL DEFAULT 0,
+    PaquetesCompletos INTEGER NOT NULL DEFAULT 0,
+    PrecioVenta_Paq   REAL    NOT NULL DEFAULT 0,
+    PrecioCompra_Paq  REAL    NOT NULL DEFAULT 0,
+    Papelera          INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS Proveedor (
+    Id_Proveedor    INTEGER PRIMARY KEY AUTOINCREMENT,
+    NombreProveedor TEXT
+);
+
+CREATE TABLE IF NOT EXISTS Venta (
+    Id_Venta   INTEGER PRIMARY KEY AUTOINCREMENT,
+    Fecha      DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+    TotalVenta REAL     NOT NULL DEFAULT 0,
+    Papelera   INTEGER  NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS DetalleVenta (
+    Id_DetalleVenta      INTEGER PRIMARY KEY AUTOINCREMENT,
+    Id_Venta             INTEGER NOT NULL REFERENCES Venta (Id_Venta),
+    Id_Paquete           INTEGER NOT NULL REFERENCES Paquete (Id_Paquete),
+    CantidadPaquetes     INTEGER NOT NULL DEFAULT 0,
+    CantidadUnidades     INTEGER NOT NULL DEFAULT 0,
+    CantidadVendidaTotal REAL,
+    PrecioUnitario       REAL,
+    Subtotal             REAL,
+    Papelera             INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS Compras (
+    Id_Compra     INTEGER PRIMARY KEY AUTOINCREMENT,
+    FechaDeCompra DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+    Id_Proveedor  INTEGER REFERENCES Proveedor (Id_Proveedor),
+    TotalFactura  REAL
+);
+
+CREATE TABLE IF NOT EXISTS DetallesDeCompras (
+    Id_DetalleDeCompra INTEGER PRIMARY KEY AUTOINCREMENT,
+    Id_Compra          INTEGER NOT NULL REFERENCES Compras (Id_Compra) ON DELETE CASCADE,
+    Id_Paquete         INTEGER NOT NULL REFERENCES Paquete (Id_Paquete),
+    Cantidad           INTEGER NOT NULL DEFAULT 1,
+    PrecioAntDes       REAL,
+    TotalAntDes        REAL,
+    DescuentoTotal     REAL NOT NULL DEFAULT 0,
+    TotalConDes        REAL,
+    TotalConIVA        REAL
+);
+
+CREATE TABLE IF NOT EXISTS Empleado (
+    Id_Empleado           INTEGER PRIMARY KEY AUTOINCREMENT,
+    PNombre               TEXT NOT NULL,
+    SNombre               TEXT,
+    PApellido             TEXT NOT NULL,
+    SApellido             TEXT,
+    NumCedula             TEXT,
+    EstadoCivil           TEXT,
+    Sexo                  TEXT,
+    FechaDeNacimiento     DATE,
+    FechaDeInicioContrato DATE,
+    FechaDeFinContrato    DATE,
+    Direccion             TEXT,
+    NumInss               TEXT,
+    RUC                   TEXT,
+    SalarioBase           REAL NOT NULL DEFAULT 0,
+    Supervisor            INTEGER REFERENCES Empleado (Id_Empleado),
+    Estado                TEXT NOT NULL DEFAULT 'Activo',
+    Papelera              INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS Notas (
+    Id_Nota        INTEGER PRIMARY KEY AUTOINCREMENT,
+    Asunto         TEXT NOT NULL,
+    FechaDelAsunto DATE,
+    Id_Empleado    INTEGER REFERENCES Empleado (Id_Empleado),
+    Estado         TEXT NOT NULL DEFAULT 'Pendiente'
+);
+
+CREATE TABLE IF NOT EXISTS GananciaDiaria (
+    Id_Ganancia       INTEGER PRIMARY KEY AUTOINCREMENT,
+    Id_Venta          INTEGER NOT NULL REFERENCES Venta (Id_Venta),
+    Fecha             DATETIME,
+    TotalVenta        REAL,
+    GananciaCalculada REAL,
+    Papelera          INTEGER NOT NULL DEFAULT 0
+);
+
+-- El orden de columnas importa: login() lee NUsuario en [2] y Tipo en [5]
+CREATE TABLE IF NOT EXISTS Usuario (
+    Id_Usuario     INTEGER PRIMARY KEY AUTOINCREMENT,
+    NombreCompleto TEXT,
+    NUsuario       TEXT NOT NULL UNIQUE,
+    Contraseña     TEXT NOT NULL,
+    Email          TEXT,
+    Tipo           TEXT NOT NULL DEFAULT 'Empleado',
+    VersionContrasena INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS ResetTokens (
+    Id_Token INTEGER PRIMARY KEY AUTOINCREMENT,
+    Email    TEXT NOT NULL,
+    Token    TEXT NOT NULL,
+    Expiry   DATETIME NOT NULL
+);
+
+-- Tokens de "recuérdame" revocados al cerrar sesión (hasta que vencen)
+CREATE TABLE IF NOT EXISTS RecuerdameRevocados (
+    Jti    TEXT PRIMARY KEY,
+    Expira DATETIME NOT NULL
+);
+
+-- Buzón de salida de correos (correo.py): 'pendiente', 'enviado' o 'fallido'
+CREATE TABLE IF NOT EXISTS CorreosPendientes (
+    Id_Correo      INTEGER PRIMARY KEY AUTOINCREMENT,
+    Destinatario   TEXT NOT NULL,
+    Asunto         TEXT NOT NULL,
+    Cuerpo         TEXT NOT NULL,
+    Estado         TEXT NOT NULL DEFAULT 'pendiente',
+    Intentos       INTEGER NOT NULL DEFAULT 0,
+    ProximoIntento DATETIME NOT NULL,
+    UltimoError    TEXT,
+    Creado         DATETIME NOT NULL,
+    Enviado        DATETIME
+);
+
+-- Un contador por tabla para los ETags (versiones.py)
+CREATE TABLE IF NOT EXISTS VersionDatos (
+    Tabla   TEXT PRIMARY KEY,
+    Version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO VersionDatos (Tabla, Version) VALUES
+    ('Paquete', 0), ('Proveedor', 0), ('Venta', 0), ('DetalleVenta', 0), ('Compras', 0),
+    ('DetallesDeCompras', 0), ('Empleado', 0), ('Notas', 0), ('GananciaDiaria', 0);
+
+CREATE INDEX IF NOT EXISTS IX_DetalleVenta_Venta ON DetalleVenta (Id_Venta);
+CREATE INDEX IF NOT EXISTS IX_DetalleVenta_Paquete ON DetalleVenta (Id_Paquete);
+CREATE INDEX IF NOT EXISTS IX_DetallesDeCompras_Compra ON DetallesDeCompras (Id_Compra, Id_Paquete);
+CREATE INDEX IF NOT EXISTS IX_Venta_Fecha ON Venta (Fecha);
+CREATE INDEX IF NOT EXISTS IX_ResetTokens_Email ON ResetTokens (Email, Expiry);
+CREATE INDEX IF NOT EXISTS IX_CorreosPendientes_Estado ON CorreosPendientes (Estado, ProximoIntento);
+
+-- -----------------------
+-- Inventario de Paquete
+-- -----------------------
+-- Inventario expresado en paquetes: completos + fracción de unidades sueltas
+CREATE TRIGGER IF NOT EXISTS trg_Paquete_Inventario_Insert
+AFTER INSERT ON Paquete
+BEGIN
+    UPDATE Paquete
+    SET Inventario = PaquetesCompletos + CAST(UnidadesSobrantes AS REAL) / MAX(TipoPaquete, 1)
+    WHERE Id_Paquete = NEW.Id_Paquete;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Paquete_Inventario_Update
+AFTER UPDATE OF PaquetesCompletos, UnidadesSobrantes, TipoPaquete, Inventario ON Paquete
+BEGIN
+    UPDATE Paquete
+    SET Inventario = PaquetesCompletos + CAST(UnidadesSobrantes AS REAL) / MAX(TipoPaquete, 1)
+    WHERE Id_Paquete = NEW.Id_Paquete;
+END;
+
+-- -----------------------
+-- DetalleVenta: campos calculados, descuento de stock y total de la venta
+-- -----------------------
+CREATE TRIGGER IF NOT EXISTS trg_DetalleVenta_Stock_Check
+BEFORE INSERT ON DetalleVenta
+WHEN (SELECT PaquetesCompletos * MAX(TipoPaquete, 1) + UnidadesSobrantes FROM Paquete WHERE Id_Paquete = NEW.Id_Paquete)
+     < NEW.CantidadPaquetes * (SELECT MAX(TipoPaquete, 1) FROM Paquete WHERE Id_Paquete = NEW.Id_Paquete) + NEW.CantidadUnidades
+BEGIN
+    SELECT RAISE(ABORT, 'Inventario insuficiente para registrar la venta');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetalleVenta_Insert
+AFTER INSERT ON DetalleVenta
+BEGIN
+    UPDATE DetalleVenta
+    SET CantidadVendidaTotal = NEW.CantidadPaquetes + CAST(NEW.CantidadUnidades AS REAL)
+            / (SELECT MAX(TipoPaquete, 1) FROM Paquete WHERE Id_Paquete = NEW.Id_Paquete),
+        PrecioUnitario = (SELECT PrecioVenta_Paq FROM Paquete WHERE Id_Paquete = NEW.Id_Paquete)
+    WHERE Id_DetalleVenta = NEW.Id_DetalleVenta;
+
+    UPDATE DetalleVenta
+    SET Subtotal = ROUND(CantidadVendidaTotal * PrecioUnitario, 2)
+    WHERE Id_DetalleVenta = NEW.Id_DetalleVenta;
+
+    UPDATE Paquete
+    SET PaquetesCompletos = (PaquetesCompletos * MAX(TipoPaquete, 1) + UnidadesSobrantes
+                             - (NEW.CantidadPaquetes * MAX(TipoPaquete, 1) + NEW.CantidadUnidades)) / MAX(TipoPaquete, 1),
+        UnidadesSobrantes = (PaquetesCompletos * MAX(TipoPaquete, 1) + UnidadesSobrantes
+                             - (NEW.CantidadPaquetes * MAX(TipoPaquete, 1) + NEW.CantidadUnidades)) % MAX(TipoPaquete, 1)
+    WHERE Id_Paquete = NEW.Id_Paquete;
+
+    UPDATE Venta
+    SET TotalVenta = (SELECT COALESCE(SUM(Subtotal), 0) FROM DetalleVenta
+                      WHERE Id_Venta = NEW.Id_Venta AND Papelera = 0)
+    WHERE Id_Venta = NEW.Id_Venta;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetalleVenta_Update
+AFTER UPDATE OF Id_Venta, Id_Paquete, CantidadPaquetes, CantidadUnidades ON DetalleVenta
+BEGIN
+    -- Devolver al inventario lo vendido antes del cambio
+    UPDATE Paquete
+    SET PaquetesCompletos = (PaquetesCompletos * MAX(TipoPaquete, 1) + UnidadesSobrantes
+                             + (OLD.CantidadPaquetes * MAX(TipoPaquete, 1) + OLD.CantidadUnidades)) / MAX(TipoPaquete, 1),
+        UnidadesSobrantes = (PaquetesCompletos * MAX(TipoPaquete, 1) + UnidadesSobrantes
+                             + (OLD.CantidadPaquetes * MAX(TipoPaquete, 1) + OLD.CantidadUnidades)) % MAX(TipoPaquete, 1)
+    WHERE Id_Paquete = OLD.Id_Paquete;
+
+    -- Descontar la nueva cantidad
+    UPDATE Paquete
+    SET PaquetesCompletos = (PaquetesCompletos * MAX(TipoPaquete, 1) + UnidadesSobrantes
+                             - (NEW.CantidadPaquetes * MAX(TipoPaquete, 1) + NEW.CantidadUnidades)) / MAX(TipoPaquete, 1),
+        UnidadesSobrantes = (PaquetesCompletos * MAX(TipoPaquete, 1) + UnidadesSobrantes
+                             - (NEW.CantidadPaquetes * MAX(TipoPaquete, 1) + NEW.CantidadUnidades)) % MAX(TipoPaquete, 1)
+    WHERE Id_Paquete = NEW.Id_Paquete;
+
+    UPDATE DetalleVenta
+    SET CantidadVendidaTotal = NEW.CantidadPaquetes + CAST(NEW.CantidadUnidades AS REAL)
+            / (SELECT MAX(TipoPaquete, 1) FROM Paquete WHERE Id_Paquete = NEW.Id_Paquete),
+        PrecioUnitario = (SELECT PrecioVenta_Paq FROM Paquete WHERE Id_Paquete = NEW.Id_Paquete)
+    WHERE Id_DetalleVenta = NEW.Id_DetalleVenta;
+
+    UPDATE DetalleVenta
+    SET Subtotal = ROUND(CantidadVendidaTotal * PrecioUnitario, 2)
+    WHERE Id_DetalleVenta = NEW.Id_DetalleVenta;
+
+    UPDATE Venta
+    SET TotalVenta = (SELECT COALESCE(SUM(Subtotal), 0) FROM DetalleVenta
+                      WHERE Id_Venta = Venta.Id_Venta AND Papelera = 0)
+    WHERE Id_Venta IN (OLD.Id_Venta, NEW.Id_Venta);
+END;
+
+-- -----------------------
+-- DetallesDeCompras: precio de compra, descuento e IVA (15 %)
+-- -----------------------
+CREATE TRIGGER IF NOT EXISTS trg_DetallesDeCompras_Insert
+AFTER INSERT ON DetallesDeCompras
+BEGIN
+    UPDATE DetallesDeCompras
+    SET PrecioAntDes = (SELECT PrecioCompra_Paq FROM Paquete WHERE Id_Paquete = NEW.Id_Paquete)
+    WHERE Id_DetalleDeCompra = NEW.Id_DetalleDeCompra;
+
+    UPDATE DetallesDeCompras
+    SET TotalAntDes = ROUND(Cantidad * PrecioAntDes, 2),
+        TotalConDes = ROUND(Cantidad * PrecioAntDes - DescuentoTotal, 2),
+        TotalConIVA = ROUND((Cantidad * PrecioAntDes - DescuentoTotal) * 1.15, 2)
+    WHERE Id_DetalleDeCompra = NEW.Id_DetalleDeCompra;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetallesDeCompras_Update
+AFTER UPDATE OF Cantidad, DescuentoTotal ON DetallesDeCompras
+BEGIN
+    UPDATE DetallesDeCompras
+    SET TotalAntDes = ROUND(Cantidad * PrecioAntDes, 2),
+        TotalConDes = ROUND(Cantidad * PrecioAntDes - DescuentoTotal, 2),
+        TotalConIVA = ROUND((Cantidad * PrecioAntDes - DescuentoTotal) * 1.15, 2)
+    WHERE Id_DetalleDeCompra = NEW.Id_DetalleDeCompra;
+END;
+
+-- -----------------------
+-- VersionDatos: cada escritura sube la versión de su tabla. También cuentan
+-- los cambios hechos por otros triggers.
+-- -----------------------
+CREATE TRIGGER IF NOT EXISTS trg_Paquete_Version_Insert
+AFTER INSERT ON Paquete
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Paquete';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Paquete_Version_Update
+AFTER UPDATE ON Paquete
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Paquete';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Paquete_Version_Delete
+AFTER DELETE ON Paquete
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Paquete';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Proveedor_Version_Insert
+AFTER INSERT ON Proveedor
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Proveedor';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Proveedor_Version_Update
+AFTER UPDATE ON Proveedor
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Proveedor';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Proveedor_Version_Delete
+AFTER DELETE ON Proveedor
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Proveedor';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Venta_Version_Insert
+AFTER INSERT ON Venta
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Venta';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Venta_Version_Update
+AFTER UPDATE ON Venta
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Venta';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Venta_Version_Delete
+AFTER DELETE ON Venta
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Venta';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetalleVenta_Version_Insert
+AFTER INSERT ON DetalleVenta
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'DetalleVenta';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetalleVenta_Version_Update
+AFTER UPDATE ON DetalleVenta
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'DetalleVenta';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetalleVenta_Version_Delete
+AFTER DELETE ON DetalleVenta
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'DetalleVenta';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Compras_Version_Insert
+AFTER INSERT ON Compras
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Compras';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Compras_Version_Update
+AFTER UPDATE ON Compras
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Compras';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Compras_Version_Delete
+AFTER DELETE ON Compras
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Compras';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetallesDeCompras_Version_Insert
+AFTER INSERT ON DetallesDeCompras
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'DetallesDeCompras';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetallesDeCompras_Version_Update
+AFTER UPDATE ON DetallesDeCompras
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'DetallesDeCompras';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_DetallesDeCompras_Version_Delete
+AFTER DELETE ON DetallesDeCompras
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'DetallesDeCompras';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Empleado_Version_Insert
+AFTER INSERT ON Empleado
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Empleado';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Empleado_Version_Update
+AFTER UPDATE ON Empleado
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Empleado';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Empleado_Version_Delete
+AFTER DELETE ON Empleado
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Empleado';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Notas_Version_Insert
+AFTER INSERT ON Notas
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Notas';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Notas_Version_Update
+AFTER UPDATE ON Notas
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Notas';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_Notas_Version_Delete
+AFTER DELETE ON Notas
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'Notas';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_GananciaDiaria_Version_Insert
+AFTER INSERT ON GananciaDiaria
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'GananciaDiaria';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_GananciaDiaria_Version_Update
+AFTER UPDATE ON GananciaDiaria
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'GananciaDiaria';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_GananciaDiaria_Version_Delete
+AFTER DELETE ON GananciaDiaria
+BEGIN
+    UPDATE VersionDatos SET Version = Version + 1 WHERE Tabla = 'GananciaDiaria';
+END;
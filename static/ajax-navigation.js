@@ -3,6 +3,9 @@ class AjaxNavigation {
     constructor() {
         this.contentContainer = document.querySelector('.content');
         this.currentUrl = window.location.pathname;
+        // Última respuesta de cada URL con su ETag, para revalidar con If-None-Match
+        this.pageCache = new Map();
+        this.pageCacheMax = 30;
         this.init();
     }
 
@@ -215,6 +218,57 @@ class AjaxNavigation {
         return stats;
     }
 
+    // Pide una página para la navegación AJAX. Si ya se tiene una copia con
+    // ETag se envía If-None-Match: con 304 se reutiliza la copia sin volver a
+    // descargarla (el servidor ni siquiera ejecuta las consultas de la vista)
+    async fetchPage(url, init = {}) {
+        const headers = { 'X-Custom-Ajax-Navigation': 'true' };
+        const cached = this.pageCache.get(url);
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+
+        // cache: 'no-store' para que el navegador no revalide por su cuenta y el 304 llegue aquí
+        const response = await fetch(url, { ...init, headers, cache: 'no-store' });
+
+        if (response.status === 304 && cached) {
+            console.log('♻️ Sin cambios (304), usando copia guardada de:', url);
+            // Mover al final: la menos usada es la primera en salir
+            this.pageCache.delete(url);
+            this.pageCache.set(url, cached);
+            return { response, data: cached.data, contentType: cached.contentType };
+        }
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const contentType = response.headers.get('content-type');
+        let data;
+
+        if (contentType && contentType.includes('application/json')) {
+            // Respuesta JSON con content y modals
+            data = await response.json();
+            console.log('📄 Respuesta JSON recibida:', data);
+        } else {
+            // Respuesta HTML tradicional (fallback)
+            const html = await response.text();
+            console.log('📄 HTML recibido (primeros 500 caracteres):', html.substring(0, 500));
+            data = { content: html, modals: '' };
+        }
+
+        const etag = response.headers.get('ETag');
+        this.pageCache.delete(url);
+        if (etag && !response.redirected) {
+            this.pageCache.set(url, { etag, data, contentType });
+            if (this.pageCache.size > this.pageCacheMax) {
+                this.pageCache.delete(this.pageCache.keys().next().value);
+            }
+        }
+
+        return { response, data, contentType };
+    }
+
     async loadContent(url, updateHistory = true) {
         try {
             console.log('🔄 Cargando contenido AJAX para:', url);
@@ -233,31 +287,7 @@ class AjaxNavigation {
             // Mostrar indicador de carga
             this.showLoading();
 
-            const response = await fetch(url + (url.includes('?') ? '&' : '?') + '_t=' + Date.now(), {
-                headers: {
-                    'X-Custom-Ajax-Navigation': 'true',
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache'
-                }
-            });
-
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-
-            const contentType = response.headers.get('content-type');
-            let data;
-
-            if (contentType && contentType.includes('application/json')) {
-                // Respuesta JSON con content y modals
-                data = await response.json();
-                console.log('📄 Respuesta JSON recibida:', data);
-            } else {
-                // Respuesta HTML tradicional (fallback)
-                const html = await response.text();
-                console.log('📄 HTML recibido (primeros 500 caracteres):', html.substring(0, 500));
-                data = { content: html, modals: '' };
-            }
+            const { data } = await this.fetchPage(url);
 
             // Extraer contenido
             const parser = new DOMParser();
@@ -350,33 +380,8 @@ class AjaxNavigation {
             if (method.toLowerCase() === 'get') {
                 const params = new URLSearchParams(new FormData(form)).toString();
                 const urlWithParams = url + (url.includes('?') ? '&' : '?') + params;
-                const response = await fetch(urlWithParams + (urlWithParams.includes('?') ? '&' : '?') + '_t=' + Date.now(), {
-                    method: 'GET',
-                    headers: {
-                        'X-Custom-Ajax-Navigation': 'true',
-                        'Cache-Control': 'no-cache, no-store, must-revalidate',
-                        'Pragma': 'no-cache'
-                    }
-                });
-                console.log('📤 Respuesta cruda - Status:', response.status, 'OK:', response.ok, 'Redirected:', response.redirected, 'URL:', response.url, 'Content-Type:', response.headers.get('content-type'));
-
-                if (!response.ok) {
-                    throw new Error(`HTTP error! status: ${response.status}`);
-                }
-
-                const contentType = response.headers.get('content-type');
-                let data;
-
-                if (contentType && contentType.includes('application/json')) {
-                    // Respuesta JSON con content y modals
-                    data = await response.json();
-                    console.log('📄 Respuesta JSON recibida:', data);
-                } else {
-                    // Respuesta HTML tradicional (fallback)
-                    const html = await response.text();
-                    console.log('📄 HTML recibido (primeros 500 caracteres):', html.substring(0, 500));
-                    data = { content: html, modals: '' };
-                }
+                const { response, data, contentType } = await this.fetchPage(urlWithParams, { method: 'GET' });
+                console.log('📤 Respuesta cruda - Status:', response.status, 'OK:', response.ok, 'Redirected:', response.redirected, 'URL:', response.url, 'Content-Type:', contentType);
 
                 // Buscar redirecciones en el contenido si es HTML
                 if (!contentType || !contentType.includes('application/json')) {
@@ -735,7 +740,8 @@ class AjaxNavigation {
     getStylePathForPage(url) {
         // Mapear URLs a rutas de estilos específicos
         if (url.includes('bienvenida') || url === '/') {
-            return '/static/CSS Bienvenida/style_Bienvenida.css';
+            const meta = document.querySelector('meta[name="estilos-bienvenida"]');
+            return meta ? meta.content : '/static/CSS Bienvenida/style_Bienvenida.css';
         }
         // Agregar más mappings según sea necesario
         return null;
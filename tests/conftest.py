@@ -0,0 +1,30 @@
+"""
+Las pruebas corren contra SQLite (backend_sqlite.py): cada una con su propia
+base en un directorio temporal y sin servidor SQL ni ODBC.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('MODO_DESARROLLO', '0')
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def base_sqlite(tmp_path, monkeypatch):
+    """Base SQLite nueva para la prueba; los pools del proceso se recrean"""
+    ruta = str(tmp_path / 'minibodega.db')
+    monkeypatch.setenv('DB_BACKEND', 'sqlite')
+    monkeypatch.setenv('SQLITE_PATH', ruta)
+    monkeypatch.delenv('SQLITE_READ_PATH', raising=False)
+    monkeypatch.setattr(db, '_pool_pid', None)
+    monkeypatch.setattr(db, '_replica_caida_hasta', 0.0)
+    yield ruta
+    for pool in (db._pools or {}).values():
+        if pool is not None:
+            pool.cerrar_todas()
+    db._pool_pid = None
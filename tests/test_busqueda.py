@@ -0,0 +1,50 @@
+"""Búsqueda de productos: lo que encontraba el LIKE '%texto%' y además lo parecido"""
+import pytest
+
+from busqueda import IndiceTrigramas
+
+PRODUCTOS = [
+    '355ml', '500ml', 'Litro', '1.25 Litros', '2Litros cc', '3Litros cc', '1/2Litro',
+    '2Litros Sabor', '3Litros Sabor', 'Té', 'Té Litro', '2Litros Té', '355ml Hic Té', 'Hic',
+    'Valle 500ml', 'Valle 12 Onza', '3Litros Valle', '500ml Fuze', 'Power', 'Fury Energy',
+    'Alpina Litro', 'Alpina 600ml', 'Alpina 2Litros', 'Mini latas', 'Lata', 'Retornable',
+    '12 Onzas', '6.5 Onzas', 'Litro Termo', 'Coca Cola 355ml', 'Minicoca',
+]
+
+
+@pytest.fixture
+def indice():
+    indice = IndiceTrigramas()
+    indice.construir((i, descripcion, True) for i, descripcion in enumerate(PRODUCTOS, 1))
+    return indice
+
+
+def _nombres(indice, consulta):
+    return {PRODUCTOS[i - 1] for i in indice.ids(consulta)}
+
+
+def _contienen(consulta):
+    return {d for d in PRODUCTOS if consulta in d.lower()}
+
+
+@pytest.mark.parametrize('consulta', ['ml', 'coca', 'litro'])
+def test_incluye_todo_lo_que_contiene_el_texto(indice, consulta):
+    esperados = _contienen(consulta)
+    assert esperados
+    assert esperados <= _nombres(indice, consulta)
+
+
+def test_ml_encuentra_las_medidas_pegadas_al_numero(indice):
+    assert {'355ml', '500ml', 'Alpina 600ml'} <= _nombres(indice, 'ml')
+
+
+def test_litro_encuentra_litros_pegado_al_numero(indice):
+    assert {'2Litros cc', '2Litros Sabor', '1/2Litro'} <= _nombres(indice, 'litro')
+
+
+def test_las_subcadenas_van_primero_y_se_suman_los_parecidos(indice):
+    resultados = indice.buscar('litro', limite=None)
+    contienen = _contienen('litro')
+    assert {r[1] for r in resultados[:len(contienen)]} == contienen
+    # Errores de tipeo: "litrp" no es subcadena de nada pero se parece
+    assert 'Litro' in {r[1] for r in indice.buscar('litrp', limite=None)}
@@ -0,0 +1,99 @@
+"""Buzón de salida contra un servidor SMTP local (aiosmtpd)"""
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+from aiosmtpd.handlers import Message  # noqa: E402
+
+from correo import BuzonSalida, SesionSMTP  # noqa: E402
+from db import conexion_bd  # noqa: E402
+from repositorio import Repositorio  # noqa: E402
+
+
+class _Recibidos(Message):
+    def __init__(self):
+        super().__init__()
+        self.mensajes = []
+
+    def handle_message(self, message):
+        self.mensajes.append(message)
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def servidor_smtp():
+    recibidos = _Recibidos()
+    controlador = aiosmtpd_controller.Controller(recibidos, hostname='127.0.0.1', port=_puerto_libre())
+    controlador.start()
+    yield controlador.hostname, controlador.port, recibidos
+    controlador.stop()
+
+
+def _buzon(host, port):
+    sesion = SesionSMTP(host=host, port=port, usuario='', contrasena='', starttls=False, timeout=5)
+    return BuzonSalida(sesion=sesion, remitente='soporte@localhost')
+
+
+def _encolar(*correos):
+    with conexion_bd() as conn:
+        repo = Repositorio(conn)
+        for destinatario, asunto in correos:
+            repo.correos.encolar(destinatario, asunto, 'cuerpo')
+        conn.commit()
+
+
+def test_envia_los_pendientes_con_una_sola_conexion(base_sqlite, servidor_smtp):
+    host, port, recibidos = servidor_smtp
+    _encolar(('a@ejemplo.com', 'Uno'), ('b@ejemplo.com', 'Dos'), ('c@ejemplo.com', 'Tres'))
+    buzon = _buzon(host, port)
+
+    assert buzon.procesar() == 3
+
+    assert sorted(m['Subject'] for m in recibidos.mensajes) == ['Dos', 'Tres', 'Uno']
+    assert all(m['From'] == 'soporte@localhost' for m in recibidos.mensajes)
+    assert buzon.estadisticas()['conexiones'] == 1
+    with conexion_bd() as conn:
+        assert Repositorio(conn).correos.conteo_por_estado() == {'enviado': 3}
+    buzon.sesion.cerrar()
+
+
+def test_servidor_caido_reprograma_el_correo(base_sqlite):
+    _encolar(('a@ejemplo.com', 'Uno'))
+    # Nadie escucha en este puerto
+    buzon = _buzon('127.0.0.1', 1)
+
+    buzon.procesar()
+
+    with conexion_bd() as conn:
+        repo = Repositorio(conn)
+        assert repo.correos.conteo_por_estado() == {'pendiente': 1}
+        assert repo.correos.vencidos(10) == []
+    assert buzon.estadisticas()['reintentos'] == 1
+
+
+def test_reservar_solo_una_vez(base_sqlite):
+    _encolar(('a@ejemplo.com', 'Uno'))
+    hasta = datetime.now() + timedelta(minutes=2)
+    with conexion_bd() as conn:
+        repo = Repositorio(conn)
+        id_correo = repo.correos.vencidos(10)[0][0]
+        assert repo.correos.reservar(id_correo, hasta)
+        # Otro worker que leyó la misma fila ya no lo toma
+        assert not repo.correos.reservar(id_correo, hasta)
+        conn.commit()
+
+
+def test_sin_configuracion_el_buzon_queda_deshabilitado():
+    assert not BuzonSalida(sesion=SesionSMTP(host=''), remitente='soporte@localhost').habilitado
+    assert not BuzonSalida(sesion=SesionSMTP(host='smtp.ejemplo.com', usuario='u', contrasena=''),
+                           remitente='u@ejemplo.com').habilitado
+    assert not BuzonSalida(sesion=SesionSMTP(host='smtp.ejemplo.com'), remitente='').habilitado
+    assert BuzonSalida(sesion=SesionSMTP(host='smtp.ejemplo.com', usuario='u', contrasena='c'),
+                       remitente='u@ejemplo.com').habilitado
@@ -0,0 +1,41 @@
+"""Pool de conexiones y consultas en paralelo (en_paralelo)"""
+import threading
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def pool(base_sqlite, monkeypatch):
+    monkeypatch.setenv('DB_POOL_MAX', '2')
+    monkeypatch.setenv('DB_POOL_TIMEOUT', '1')
+    return db.get_pool()
+
+
+def _hilo(conn):
+    return conn.execute('SELECT 1').fetchone()[0], threading.current_thread().name
+
+
+def test_obtener_sin_esperar_devuelve_none_si_no_hay_cupo(pool):
+    with pool.obtener(), pool.obtener():
+        assert pool.obtener(esperar=False) is None
+        assert pool.estadisticas()['sin_espera'] == 1
+    assert pool.obtener(esperar=False) is not None
+
+
+def test_en_paralelo_usa_otra_conexion_si_hay_cupo(pool):
+    with pool.obtener() as conn:
+        resultados = db.en_paralelo(conn, {'a': _hilo, 'b': _hilo})
+    assert resultados['a'] == (1, threading.current_thread().name)
+    assert resultados['b'][1].startswith('consultas')
+
+
+def test_en_paralelo_no_espera_si_otra_peticion_toma_la_conexion(pool, monkeypatch):
+    # Entre la consulta de cupos y el checkout del hilo, otra petición se
+    # llevó la última conexión libre: la consulta corre con la del llamador
+    with pool.obtener() as conn, pool.obtener():
+        monkeypatch.setattr(pool, 'disponibles', lambda: 1)
+        resultados = db.en_paralelo(conn, {'a': _hilo, 'b': _hilo})
+    assert resultados['b'] == (1, threading.current_thread().name)
+    assert pool.estadisticas()['agotado'] == 0
@@ -0,0 +1,51 @@
+"""Barrido de imágenes huérfanas: simulado por defecto y en un solo proceso"""
+import pytest
+
+from imagenes import BarredorHuerfanas, ManifiestoImagenes, fcntl
+
+
+@pytest.fixture
+def carpeta(tmp_path):
+    ruta = tmp_path / 'Paquetes'
+    ruta.mkdir()
+    for nombre in ('Coca.png', 'Vieja.png'):
+        (ruta / nombre).write_bytes(b'png')
+    return ruta
+
+
+def _barredor(carpeta, **opciones):
+    manifiesto = ManifiestoImagenes(str(carpeta), lambda d: f'{d}.png').cargar()
+    return BarredorHuerfanas(manifiesto, lambda: {'Coca.png'}, gracia=0,
+                             ruta_lock=str(carpeta.parent / 'barrido.lock'), **opciones)
+
+
+def test_por_defecto_solo_informa(carpeta):
+    barredor = _barredor(carpeta)
+
+    reporte = barredor.barrer()
+
+    assert barredor.simular
+    assert reporte['simulado'] and reporte['borradas'] == ['Vieja.png']
+    assert (carpeta / 'Vieja.png').exists()
+
+
+def test_borra_cuando_se_habilita(carpeta):
+    reporte = _barredor(carpeta, simular=False).barrer()
+
+    assert reporte['borradas'] == ['Vieja.png']
+    assert not (carpeta / 'Vieja.png').exists()
+    assert (carpeta / 'Coca.png').exists()
+
+
+@pytest.mark.skipif(fcntl is None, reason='flock no disponible')
+def test_un_solo_proceso_barre(carpeta):
+    primero, segundo = _barredor(carpeta), _barredor(carpeta)
+
+    assert primero.tomar_turno()
+    assert not segundo.tomar_turno()
+    assert primero.estadisticas()['barre_este_proceso']
+    assert not segundo.estadisticas()['barre_este_proceso']
+
+    # Si el que barría termina, el lock queda libre para otro
+    primero._archivo_lock.close()
+    assert segundo.tomar_turno()
@@ -0,0 +1,80 @@
+"""
+Las vistas con @presupuesto_consultas no pasan de su presupuesto: con
+PRESUPUESTO_CONSULTAS_ESTRICTO la petición que lo excede falla con
+PresupuestoExcedido en lugar de solo imprimir el aviso.
+"""
+import pytest
+
+from db import conexion_bd
+from instrumentacion import PresupuestoExcedido
+
+
+@pytest.fixture
+def cliente(base_sqlite):
+    from app import app
+    with conexion_bd() as conn:
+        conn.execute("INSERT INTO Proveedor (NombreProveedor) VALUES ('Distribuidora')")
+        for descripcion in ('Coca Cola 355ml', 'Fanta 2L', 'Sprite 600ml'):
+            conn.execute(
+                'INSERT INTO Paquete (Descripcion, TipoPaquete, UnidadesSobrantes, PaquetesCompletos, '
+                'PrecioVenta_Paq, PrecioCompra_Paq) VALUES (?, 12, 0, 20, 300, 250)', (descripcion,))
+        conn.execute("INSERT INTO Empleado (PNombre, PApellido, SalarioBase) VALUES ('Ana', 'López', 9000)")
+        conn.commit()
+    app.config.update(TESTING=True, PRESUPUESTO_CONSULTAS_ESTRICTO=True)
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion.update(usuario='admin', tipo='Administrador', user_id=1)
+    yield cliente
+    app.config.update(TESTING=False, PRESUPUESTO_CONSULTAS_ESTRICTO=False)
+
+
+def test_presupuesto_estricto_falla_al_excederlo(cliente):
+    from app import app, index
+    presupuesto = index.presupuesto_consultas
+    index.presupuesto_consultas = 0
+    try:
+        with pytest.raises(PresupuestoExcedido):
+            cliente.get('/')
+    finally:
+        index.presupuesto_consultas = presupuesto
+    assert app.view_functions['index'] is index
+
+
+@pytest.mark.parametrize('ruta', [
+    '/', '/paquetes', '/paquetes?busqueda=coca&Filtros=Nombre', '/paquetes/sugerencias?q=co',
+    '/editar_paquete/1', '/detalles_ventas', '/compras', '/ver_nomina', '/empleados',
+    '/editar_empleado/1',
+])
+def test_vistas_dentro_del_presupuesto(cliente, ruta):
+    # Página completa y fragmento de la navegación AJAX (ajax-navigation.js)
+    for cabeceras in ({}, {'X-Custom-Ajax-Navigation': 'true'}):
+        respuesta = cliente.get(ruta, headers=cabeceras)
+        assert respuesta.status_code in (200, 302), ruta
+        if cabeceras and respuesta.status_code == 200:
+            assert respuesta.is_json, ruta
+
+
+def test_flujo_de_venta_dentro_del_presupuesto(cliente):
+    assert cliente.post('/crear_venta').status_code == 302
+    respuesta = cliente.post('/detalles_ventas', data={
+        'dv_id_venta': '1', 'dv_paquete_id': '2', 'dv_paquetes_finales': '1', 'dv_unidades_finales': '1'})
+    assert respuesta.status_code in (200, 302)
+    assert cliente.get('/detalles_ventas?id_venta=1').status_code == 200
+    assert cliente.get('/editar_detalle_venta/1').status_code == 200
+    assert cliente.post('/calcular_ganancia/1').status_code in (200, 302)
+    assert cliente.get('/ganancia_diaria').status_code == 200
+
+
+def test_flujo_de_compra_dentro_del_presupuesto(cliente):
+    respuesta = cliente.post('/crear_compra/confirmar')
+    assert '/carrito/1' in respuesta.headers['Location']
+    respuesta = cliente.post('/carrito/1/agregar', data={'id_paquete': ['1', '2'], 'cantidad': ['2', '3']})
+    assert respuesta.status_code == 302
+    assert cliente.get('/carrito/1').status_code == 200
+
+    respuesta = cliente.get('/carrito/1/finalizar')
+    assert respuesta.headers['Location'].endswith('/compras')
+    assert int(respuesta.headers['X-DB-Consultas']) <= 4
+    with conexion_bd() as conn:
+        assert conn.execute('SELECT PaquetesCompletos FROM Paquete WHERE Id_Paquete = 1').fetchone()[0] == 22
+    assert cliente.get('/detalles_compras/1').status_code == 200
@@ -0,0 +1,60 @@
+"""Tokens de "recuérdame": firmados con SECRET_KEY y sin datos de la contraseña"""
+import pytest
+from itsdangerous import URLSafeTimedSerializer
+
+from recuerdame import Recuerdame
+
+SECRETO = 'secreto-de-prueba'
+
+
+class _Usuarios:
+    def __init__(self):
+        self.filas = {1: (1, 'admin', 'Administrador', 0)}
+        self.revocados = []
+
+    def __call__(self):
+        return list(self.filas.values()), self.revocados
+
+
+@pytest.fixture
+def usuarios():
+    return _Usuarios()
+
+
+def test_emite_y_verifica(usuarios):
+    tokens = Recuerdame(SECRETO, usuarios)
+    token, _ = tokens.emitir(1, 0)
+    assert tokens.verificar(token) == (1, 'admin', 'Administrador')
+
+
+def test_sin_secreto_no_emite_ni_acepta(usuarios):
+    tokens = Recuerdame('', usuarios)
+    assert not tokens.habilitado
+    with pytest.raises(RuntimeError):
+        tokens.emitir(1, 0)
+    token, _ = Recuerdame(SECRETO, usuarios).emitir(1, 0)
+    assert tokens.verificar(token) is None
+
+
+def test_rechaza_token_firmado_con_otra_clave(usuarios):
+    tokens = Recuerdame(SECRETO, usuarios)
+    # La clave que antes estaba en el código
+    falso = URLSafeTimedSerializer('clave_super_secreta_1234', salt='recuerdame').dumps({'id': 1, 'v': 0, 'j': 'x'})
+    assert tokens.verificar(falso) is None
+
+
+def test_el_token_no_lleva_datos_de_la_contrasena(usuarios):
+    tokens = Recuerdame(SECRETO, usuarios)
+    token, _ = tokens.emitir(1, 0)
+    datos = URLSafeTimedSerializer(SECRETO, salt='recuerdame').loads(token)
+    assert set(datos) == {'id', 'v', 'j'}
+
+
+def test_cambiar_la_contrasena_invalida_los_tokens(usuarios):
+    tokens = Recuerdame(SECRETO, usuarios)
+    token, _ = tokens.emitir(1, 0)
+    usuarios.filas[1] = (1, 'admin', 'Administrador', 1)
+    tokens.invalidar()
+    assert tokens.verificar(token) is None
+    nuevo, _ = tokens.emitir(1, 1)
+    assert tokens.verificar(nuevo) == (1, 'admin', 'Administrador')
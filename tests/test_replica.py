@@ -0,0 +1,85 @@
+"""
+Enrutamiento a la réplica de lectura con dos bases SQLite (SQLITE_PATH y
+SQLITE_READ_PATH): los GET de vistas @solo_lectura van a la réplica, salvo
+justo después de escribir o si la réplica no responde.
+"""
+import time
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def cliente(base_sqlite, tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_READ_PATH', str(tmp_path / 'replica.db'))
+    from app import app
+    app.config.update(TESTING=True)
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion.update(usuario='admin', tipo='Administrador', user_id=1)
+    yield cliente
+    app.config.update(TESTING=False)
+
+
+def _checkouts():
+    """(checkouts del primario, checkouts de la réplica)"""
+    return db.get_pool().estadisticas()['checkouts'], db.get_pool_lectura().estadisticas()['checkouts']
+
+
+def test_get_de_solo_lectura_va_a_la_replica(cliente):
+    _, replica = _checkouts()
+
+    assert cliente.get('/compras').status_code == 200
+
+    assert _checkouts()[1] > replica
+
+
+def test_despues_de_escribir_lee_del_primario(cliente):
+    assert cliente.post('/crear_venta').status_code == 302
+    with cliente.session_transaction() as sesion:
+        assert sesion['ultima_escritura']
+    primario, replica = _checkouts()
+
+    assert cliente.get('/compras').status_code == 200
+
+    primario_despues, replica_despues = _checkouts()
+    assert replica_despues == replica
+    assert primario_despues > primario
+
+    # Pasada la ventana vuelve a la réplica
+    with cliente.session_transaction() as sesion:
+        sesion['ultima_escritura'] = time.time() - db.VENTANA_LEE_TUS_ESCRITURAS - 1
+    assert cliente.get('/compras').status_code == 200
+    assert _checkouts()[1] > replica
+
+
+def test_replica_marcada_caida_usa_el_primario(cliente):
+    db.marcar_replica_caida('prueba')
+    assert not db.replica_disponible()
+    primario, replica = _checkouts()
+
+    assert cliente.get('/compras').status_code == 200
+
+    primario_despues, replica_despues = _checkouts()
+    assert replica_despues == replica
+    assert primario_despues > primario
+
+
+def test_replica_inalcanzable_usa_el_primario(base_sqlite, tmp_path, monkeypatch):
+    # La carpeta no existe: SQLite no puede abrir la réplica
+    monkeypatch.setenv('SQLITE_READ_PATH', str(tmp_path / 'no-existe' / 'replica.db'))
+    from app import app
+    app.config.update(TESTING=True)
+    try:
+        cliente = app.test_client()
+        with cliente.session_transaction() as sesion:
+            sesion.update(usuario='admin', tipo='Administrador', user_id=1)
+        primario = db.get_pool().estadisticas()['checkouts']
+
+        assert cliente.get('/compras').status_code == 200
+
+        assert db.get_pool().estadisticas()['checkouts'] > primario
+        assert not db.replica_disponible()
+    finally:
+        app.config.update(TESTING=False)
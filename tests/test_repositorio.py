@@ -0,0 +1,64 @@
+"""Cachés de proceso del repositorio: se invalidan después del commit"""
+import pytest
+
+from db import conexion_bd
+from repositorio import PaqueteRepo, Repositorio, TableroRepo
+
+
+@pytest.fixture
+def paquete(base_sqlite):
+    PaqueteRepo.invalidar_catalogo()
+    with conexion_bd() as conn:
+        conn.execute("INSERT INTO Paquete (Descripcion, TipoPaquete, PaquetesCompletos, PrecioVenta_Paq, "
+                     "PrecioCompra_Paq) VALUES ('Coca', 12, 20, 300, 250)")
+        conn.commit()
+    yield 1
+    PaqueteRepo.invalidar_catalogo()
+
+
+def _actualizar(repo, descripcion):
+    repo.paquetes.actualizar(1, descripcion, 12, 240, 0, 20, 300, 250)
+
+
+def _descripciones(repo):
+    return [fila.Descripcion for fila in repo.paquetes.catalogo()]
+
+
+def test_catalogo_leido_antes_del_commit_no_queda_vigente(paquete):
+    with conexion_bd() as escritor, conexion_bd() as lector:
+        _actualizar(Repositorio(escritor), 'Coca Cola')
+        # Otra petición recarga mientras la escritura no está confirmada
+        assert _descripciones(Repositorio(lector)) == ['Coca']
+        escritor.commit()
+        assert _descripciones(Repositorio(lector)) == ['Coca Cola']
+
+
+def test_rollback_no_invalida_el_catalogo(paquete):
+    with conexion_bd() as conn:
+        repo = Repositorio(conn)
+        _descripciones(repo)
+        version = PaqueteRepo.estadisticas_catalogo()['version']
+        _actualizar(repo, 'Coca Cola')
+        conn.rollback()
+    assert PaqueteRepo.estadisticas_catalogo()['version'] == version
+
+
+def test_tablero_calculado_antes_del_commit_no_queda_vigente(paquete):
+    TableroRepo.invalidar()
+    with conexion_bd() as escritor, conexion_bd() as lector:
+        repo = Repositorio(escritor)
+        # Entra mercadería: el paquete deja de estar con stock bajo
+        repo.paquetes.actualizar(1, 'Coca', 12, 480, 0, 40, 300, 250)
+        assert [fila.Descripcion for fila in Repositorio(lector).tablero.resumen()['stock_bajo']] == ['Coca']
+        escritor.commit()
+        assert Repositorio(lector).tablero.resumen()['stock_bajo'] == []
+    TableroRepo.invalidar()
+
+
+def test_conteo_leido_antes_del_commit_no_queda_vigente(paquete):
+    PaqueteRepo.invalidar_conteos()
+    with conexion_bd() as escritor, conexion_bd() as lector:
+        Repositorio(escritor).paquetes.crear('Fanta', 12, 0, 0, 0, 300, 250)
+        assert Repositorio(lector).paquetes.contar_cacheado('Papelera = 0', ()) == 1
+        escritor.commit()
+        assert Repositorio(lector).paquetes.contar_cacheado('Papelera = 0', ()) == 2
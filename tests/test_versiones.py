@@ -0,0 +1,26 @@
+"""VersionDatos: cada escritura sube una vez la versión de su tabla (triggers)"""
+from db import conexion_bd
+from repositorio import Repositorio
+
+
+def _version(repo, tabla):
+    return repo.versiones.todas()[tabla]
+
+
+def test_compras_sube_una_vez_por_escritura(base_sqlite):
+    with conexion_bd() as conn:
+        repo = Repositorio(conn)
+        conn.execute("INSERT INTO Proveedor (NombreProveedor) VALUES ('Distribuidora')")
+        conn.execute("INSERT INTO Paquete (Descripcion, PrecioVenta_Paq, PrecioCompra_Paq) VALUES ('Coca', 300, 250)")
+        inicial = _version(repo, 'Compras')
+
+        id_compra = repo.compras.crear(1)
+        assert _version(repo, 'Compras') == inicial + 1
+
+        repo.detalles_compra.agregar_lote(id_compra, [(1, 2)])
+        repo.compras.finalizar(id_compra, repo.compras.total(id_compra))
+        assert _version(repo, 'Compras') == inicial + 2
+
+        repo.compras.eliminar(id_compra)
+        assert _version(repo, 'Compras') == inicial + 3
+        conn.rollback()
@@ -0,0 +1,91 @@
+"""
+Versiones de datos y ETags para las vistas de listado.
+
+La tabla VersionDatos guarda un contador por tabla que sube con cada INSERT,
+UPDATE o DELETE (triggers, también en Compras). Una vista declara con `@depende_de(...)` las tablas que muestra
+y su ETag se calcula con esos contadores, sin ejecutar la vista:
+
+- si el navegador ya tiene esa versión (If-None-Match) se responde 304 con
+  una sola consulta barata
+- si no, la vista se ejecuta normalmente y la respuesta lleva el ETag
+
+Como todos los workers leen los mismos contadores, el ETag sirve para
+cualquier worker. Además, ver un contador distinto al último observado
+indica que otro worker escribió: las cachés en memoria de esa tabla se
+invalidan para no responder datos viejos con un ETag nuevo.
+
+Hay un contador por tabla, no por fila. Por eso las escrituras concurrentes
+en una misma tabla se esperan en el UPDATE del contador hasta el commit (ver
+migraciones/004_version_datos.sql). El costo se acepta a cambio de que el
+ETag cueste una sola consulta.
+"""
+import hashlib
+import os
+import threading
+from collections import defaultdict
+
+def depende_de(*tablas):
+    """Declara de qué tablas salen los datos de una vista (habilita ETag y 304)"""
+    def decorador(f):
+        f.depende_de = tablas
+        return f
+    return decorador
+
+
+def calcular_etag(tablas, versiones, *extra):
+    """ETag débil: versiones de las tablas + lo que cambie la respuesta (usuario, URL...)"""
+    partes = [f'{tabla}:{versiones.get(tabla, 0)}' for tabla in tablas]
+    partes.extend(str(valor) for valor in extra)
+    return hashlib.sha1('|'.join(partes).encode()).hexdigest()[:20]
+
+
+def huella_archivos(*rutas):
+    """Huella de nombres y fechas de modificación de archivos o carpetas completas"""
+    huella = hashlib.sha1()
+    for ruta in rutas:
+        if os.path.isfile(ruta):
+            huella.update(f'{ruta}:{os.stat(ruta).st_mtime_ns}'.encode())
+            continue
+        for raiz, carpetas, archivos in os.walk(ruta):
+            carpetas.sort()
+            for nombre in sorted(archivos):
+                archivo = os.path.join(raiz, nombre)
+                huella.update(f'{archivo}:{os.stat(archivo).st_mtime_ns}'.encode())
+    return huella.hexdigest()[:12]
+
+
+class VersionesObservadas:
+    """
+    Últimas versiones vistas por el worker y las cachés a invalidar cuando
+    cambian. La primera observación también cuenta como cambio: lo que se
+    precargó al arrancar pudo quedar viejo antes de la primera consulta.
+    """
+
+    def __init__(self):
+        self._ultimas = {}
+        self._al_cambiar = defaultdict(list)
+        self._lock = threading.Lock()
+        self.stats = {'observaciones': 0, 'cambios': 0}
+
+    def al_cambiar(self, tabla, *funciones):
+        self._al_cambiar[tabla].extend(funciones)
+
+    def observar(self, versiones):
+        with self._lock:
+            self.stats['observaciones'] += 1
+            cambiadas = [tabla for tabla, version in versiones.items()
+                         if self._ultimas.get(tabla) != version]
+            self._ultimas.update(versiones)
+            self.stats['cambios'] += len(cambiadas)
+        funciones = []
+        for tabla in cambiadas:
+            for funcion in self._al_cambiar.get(tabla, ()):
+                if funcion not in funciones:
+                    funciones.append(funcion)
+        for funcion in funciones:
+            funcion()
+        return cambiadas
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.stats, versiones=dict(self._ultimas))